@@ -0,0 +1,151 @@
+"""
+A per-process index of what each add-on's current version works with.
+
+For every add-on we keep its type, a bitmask of the platforms its current
+files are for, and the {app id: (min version_int, max version_int)} ranges of
+the current version.  addon_filter() asks the index instead of walking
+current_version.all_files and compatible_apps on transformed add-ons.
+
+Entries are loaded from the db a batch at a time the first time anybody asks
+about an add-on, and loaded again after TIMEOUT seconds.  Saving an add-on,
+version, file or compatible app range notes the time in memcache, and every
+process reloads that add-on the next time it's asked about.  Add-ons that
+changed in the last REPLICATION_LAG seconds come from the master, the slaves
+might not have the change yet.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+import multidb
+
+import amo
+
+CHANGED_KEY = 'addons:compat-index:%s'
+TIMEOUT = 60 * 10
+REPLICATION_LAG = 10
+# Forget everything when the index gets bigger than this.
+MAX_SIZE = 100000
+
+PLATFORMS = """
+    SELECT addons.id, addons.addontype_id, files.platform_id
+    FROM addons
+    LEFT JOIN files ON files.version_id = addons.current_version
+    WHERE addons.id IN (%s)"""
+
+APPS = """
+    SELECT addons.id, av.application_id, min.version_int, max.version_int
+    FROM addons
+    INNER JOIN applications_versions AS av
+        ON av.version_id = addons.current_version
+    INNER JOIN appversions AS min ON min.id = av.min
+    INNER JOIN appversions AS max ON max.id = av.max
+    WHERE addons.id IN (%s)"""
+
+
+def platform_mask(platforms):
+    """Turn platform ids into a bitmask."""
+    mask = 0
+    for platform in platforms:
+        mask |= 1 << platform
+    return mask
+
+
+class CompatIndex(object):
+
+    def __init__(self):
+        # {addon id: (when it was loaded,
+        #             (type, platform mask, {app id: (min, max)}))}
+        self.entries = {}
+
+    def load(self, ids, using):
+        entries = {}
+        connection = connections[using]
+        cursor = connection.cursor()
+        loaded = time.time()
+        for addon in ids:
+            # The ones that don't come back are gone.
+            self.entries.pop(addon, None)
+        ids = ','.join(map(str, ids))
+
+        cursor.execute(PLATFORMS % ids)
+        platforms = {}
+        for addon, type_, platform in cursor.fetchall():
+            entries[addon] = type_
+            if platform is not None:
+                platforms.setdefault(addon, []).append(platform)
+
+        cursor.execute(APPS % ids)
+        apps = {}
+        for addon, app, min_, max_ in cursor.fetchall():
+            if app in amo.APP_IDS:
+                apps.setdefault(addon, {})[app] = (min_, max_)
+
+        for addon, type_ in entries.items():
+            entry = (type_, platform_mask(platforms.get(addon, [])),
+                     apps.get(addon, {}))
+            self.entries[addon] = loaded, entry
+
+    def get(self, ids):
+        """Get a mapping of {addon id: entry} for the add-ons that exist."""
+        if len(self.entries) > MAX_SIZE:
+            self.entries.clear()
+        now = time.time()
+        keys = dict((CHANGED_KEY % i, i) for i in ids)
+        changed = dict((keys[k], v) for k, v in cache.get_many(keys).items())
+        slave, master = [], []
+        for i in ids:
+            since = max(now - TIMEOUT, changed.get(i, 0))
+            if i in self.entries and self.entries[i][0] > since:
+                continue
+            if changed.get(i, 0) > now - REPLICATION_LAG:
+                master.append(i)
+            else:
+                slave.append(i)
+        if slave:
+            self.load(slave, multidb.get_slave())
+        if master:
+            self.load(master, 'default')
+        return dict((i, self.entries[i][1]) for i in ids
+                    if i in self.entries)
+
+    def compatible(self, ids, app=None, platform=None, version=None):
+        """
+        Return the ids that work with the app and version_int `version` on
+        `platform`, in the same order.  Platforms and apps are objects from
+        amo, like addon_filter() gets.
+
+        Personas always pass, and search engines pass unless there's a
+        version since they don't list app versions.
+        """
+        entries = self.get(ids)
+        if platform:
+            wanted = platform_mask([platform.id, amo.PLATFORM_ALL.id])
+        rv = []
+        for i in ids:
+            if i not in entries:
+                continue
+            type_, mask, apps = entries[i]
+            if type_ == amo.ADDON_PERSONA:
+                rv.append(i)
+                continue
+            if platform and not mask & wanted:
+                continue
+            if version is not None:
+                if type_ in amo.NO_COMPAT or app.id not in apps:
+                    continue
+                min_, max_ = apps[app.id]
+                if not min_ <= version <= max_:
+                    continue
+            rv.append(i)
+        return rv
+
+
+index = CompatIndex()
+
+
+def invalidate(ids):
+    """Make every process reload the add-ons in `ids`."""
+    now = time.time()
+    cache.set_many(dict((CHANGED_KEY % i, now) for i in ids), TIMEOUT)
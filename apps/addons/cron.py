@@ -1,6 +1,8 @@
 import array
+import heapq
 import itertools
 import logging
+import multiprocessing
 import operator
 import os
 import subprocess
@@ -14,18 +16,22 @@ from django.db.models import Q, F, Avg
 import multidb
 import path
 import recommend
+import recommend.index
 from celery.task.sets import TaskSet
 from celeryutils import task
+import elasticutils
 
 import amo
 import cronjobs
-from amo.utils import chunked
+from amo.search import swap_alias
+from amo.utils import chunked, taskset_succeeded
 from addons import search
 from addons.models import Addon, FrozenAddon, AppSupport
 from addons.utils import ReverseNameLookup
 from files.models import File
 from stats.models import UpdateCount
 from translations.models import Translation
+from versions.models import Version
 
 log = logging.getLogger('z.cron')
 task_log = logging.getLogger('z.task')
@@ -233,6 +239,19 @@ def _update_appsupport(ids, **kw):
     update_appsupport(ids)
 
 
+@cronjobs.register
+def update_all_update_candidates():
+    """Rebuild update_candidates for every add-on with a version."""
+    from .tasks import update_candidates
+    ids = sorted(set(Version.objects.values_list('addon', flat=True)))
+    task_log.info('Updating update candidates for %s addons.' % len(ids))
+    for idx, chunk in enumerate(chunked(ids, 100)):
+        if idx % 10 == 0:
+            task_log.info('[%s/%s] Updating update candidates.'
+                          % (idx * 100, len(ids)))
+        update_candidates(chunk)
+
+
 @cronjobs.register
 def addons_add_slugs():
     """Give slugs to any slugless addons."""
@@ -325,8 +344,8 @@ def deliver_hotness():
 
 
 @cronjobs.register
-def recs():
-    start = time.time()
+def recs(processes=None):
+    timer = _RecsTimer()
     cursor = connections[multidb.get_slave()].cursor()
     cursor.execute("""
         SELECT addon_id, collection_id
@@ -337,50 +356,128 @@ def recs():
         ORDER BY addon_id, collection_id
     """)
     qs = cursor.fetchall()
-    recs_log.info('%.2fs (query) : %s rows' % (time.time() - start, len(qs)))
+    timer.log('query', '%s rows' % len(qs))
     addons = _group_addons(qs)
-    recs_log.info('%.2fs (groupby) : %s addons' %
-                  ((time.time() - start), len(addons)))
-
-    # Check our memory usage.
-    try:
-        p = subprocess.Popen('%s -p%s -o rss' % (settings.PS_BIN, os.getpid()),
-                             shell=True, stdout=subprocess.PIPE)
-        recs_log.info('%s bytes' % ' '.join(p.communicate()[0].split()))
-    except Exception:
-        log.error('Could not call ps', exc_info=True)
-
-    sim = recommend.similarity  # Locals are faster.
-    sims, start, timers = {}, [time.time()], {'calc': [], 'sql': []}
+    del qs
+    timer.log('groupby', '%s addons' % len(addons))
+
+    _recs_state.update(_recs_index(addons))
+    timer.log('index', '%s collections' % len(_recs_state['index']))
+
+    # Workers are forked after the index is built so they share it.
+    processes = int(processes or settings.RECS_PROCESSES)
+    ids = sorted(addons)
+    chunks = chunked(ids, settings.RECS_CHUNK_SIZE)
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(_recs_chunk, chunks)
+    else:
+        pool, results = None, itertools.imap(_recs_chunk, chunks)
 
-    def write_recs():
-        calc = time.time()
-        timers['calc'].append(calc - start[0])
+    calc, sql, all_sims = 0, 0, {}
+    while True:
+        t = time.time()
+        try:
+            sims = results.next()
+        except StopIteration:
+            break
+        calc += time.time() - t
+        all_sims.update(sims)
+        t = time.time()
         try:
             _dump_recs(sims)
         except Exception:
             recs_log.error('SQL issue', exc_info=True)
-            print idx, 'Error dumping recommendations.'
-        sims.clear()
-        timers['sql'].append(time.time() - calc)
-        start[0] = time.time()
-
-    for idx, (addon, collections) in enumerate(addons.iteritems(), 1):
-        xs = [(other, sim(collections, cs))
-              for other, cs in addons.iteritems()]
-        # Sort by similarity and keep the top N.
-        others = sorted(xs, key=operator.itemgetter(1), reverse=True)
-        sims[addon] = [(k, v) for k, v in others[:11] if k != addon]
-
-        if idx % 50 == 0:
-            write_recs()
-    else:
-        write_recs()
+        sql += time.time() - t
+    if pool:
+        pool.close()
+        pool.join()
+    _recs_state.clear()
+    timer.log('calc', '%.2fs waiting for %s processes' % (calc, processes))
+    timer.log('sql', '%.2fs writing' % sql)
+    recommend.index.write(settings.RECS_INDEX_PATH, all_sims)
+    timer.log('index', 'wrote %s' % settings.RECS_INDEX_PATH)
 
     avg_len = sum(len(v) for v in addons.itervalues()) / float(len(addons))
     recs_log.info('%s addons: average length: %.2f' % (len(addons), avg_len))
-    recs_log.info('Processing time: %.2fs' % sum(timers['calc']))
-    recs_log.info('SQL time: %.2fs' % sum(timers['sql']))
+
+
+class _RecsTimer(object):
+    """Logs the time and memory use at the end of each phase of recs()."""
+
+    def __init__(self):
+        self.start = self.last = time.time()
+
+    def log(self, phase, msg):
+        now = time.time()
+        recs_log.info('%.2fs (%s) %.2fs : %s : %s' %
+                      (now - self.start, phase, now - self.last, msg,
+                       self.rss()))
+        self.last = now
+
+    def rss(self):
+        try:
+            p = subprocess.Popen('%s -p%s -o rss' % (settings.PS_BIN,
+                                                      os.getpid()),
+                                 shell=True, stdout=subprocess.PIPE)
+            return '%s bytes' % ' '.join(p.communicate()[0].split())
+        except Exception:
+            log.error('Could not call ps', exc_info=True)
+            return 'unknown rss'
+
+
+# What the recs workers need, set before they're forked.
+_recs_state = {}
+
+
+def _recs_index(addons):
+    """Build the lookups used to score add-ons against each other.
+
+    addons is a dict of {addon_id: [collection_id]}. Returns a dict of:
+        addons: the same dict.
+        index: {collection_id: [addon_id]} for finding add-ons that share a
+            collection.
+        order: {addon_id: position in addons}, which is how the old loop
+            over every pair broke ties between equal scores.
+        by_size: add-on ids, smallest collection list first.
+    """
+    index = {}
+    for addon, collections in addons.iteritems():
+        for c in collections:
+            index.setdefault(c, []).append(addon)
+    order = dict((addon, i) for i, addon in enumerate(addons))
+    by_size = sorted(addons, key=lambda a: (len(addons[a]), order[a]))
+    return dict(addons=addons, index=index, order=order, by_size=by_size)
+
+
+def _recs_chunk(ids, n=11):
+    """Find the top recommendations for each add-on in ids.
+
+    Returns {addon: [(other_addon, score)]}, the same as scoring every
+    add-on against every other and keeping the top n.
+
+    The similarity only depends on the symmetric difference of the
+    collections, so add-ons sharing a collection are scored exactly and
+    of the rest only the n with the fewest collections can make the cut.
+    """
+    addons, index, order, by_size = (
+        _recs_state['addons'], _recs_state['index'], _recs_state['order'],
+        _recs_state['by_size'])
+    sim = recommend.similarity  # Locals are faster.
+    key = lambda x: (x[1], -order[x[0]])
+    rv = {}
+    for addon in ids:
+        collections = addons[addon]
+        shared = set()
+        for c in collections:
+            shared.update(index[c])
+        xs = [(other, sim(collections, addons[other])) for other in shared]
+        rest = (other for other in by_size if other not in shared)
+        xs.extend((other, sim(collections, addons[other]))
+                  for other in itertools.islice(rest, n))
+        rv[addon] = [(k, v) for k, v in heapq.nlargest(n, xs, key=key)
+                     if k != addon]
+    return rv
 
 
 def _dump_recs(sims):
@@ -390,6 +487,8 @@ def _dump_recs(sims):
     addons = sims.keys()
     vals = [(addon, other, score) for addon, others in sims.items()
                                   for other, score in others]
+    if not addons:
+        return
     cursor.execute('BEGIN')
     cursor.execute('DELETE FROM addon_recommendations WHERE addon_id IN %s',
                    [addons])
@@ -429,14 +528,53 @@ def give_personas_versions():
 
 
 @cronjobs.register
-def reindex_addons():
+def reindex_addons(swap=False):
+    """
+    Index all the valid add-ons.
+
+    With `swap` the add-ons are indexed here, into a new index that takes over
+    the settings.ES_INDEX alias once it's complete, so searches never see a
+    half-built index.
+    """
     from . import tasks
-    # Make sure our mapping is up to date.
-    search.setup_mapping()
-    ids = (Addon.objects.values_list('id', flat=True)
-           .filter(_current_version__isnull=False,
-                   status__in=amo.VALID_STATUSES,
-                   disabled_by_user=False))
-    ts = [tasks.index_addons.subtask(args=[chunk])
-          for chunk in chunked(sorted(list(ids)), 150)]
-    TaskSet(ts).apply_async()
+    valid_ids = lambda: (Addon.uncached.values_list('id', flat=True)
+                         .filter(_current_version__isnull=False,
+                                 status__in=amo.VALID_STATUSES,
+                                 disabled_by_user=False))
+    ids = valid_ids()
+    if not swap:
+        # Make sure our mapping is up to date.
+        search.setup_mapping()
+        ts = [tasks.index_addons.subtask(args=[chunk])
+              for chunk in chunked(sorted(list(ids)), 150)]
+        TaskSet(ts).apply_async()
+        return
+
+    from bandwagon.cron import collection_ids
+    from bandwagon.tasks import index_collections
+    start = datetime.now()
+    index = '%s-%s' % (settings.ES_INDEX, start.strftime('%Y%m%d%H%M%S'))
+    search.setup_mapping(index)
+    indexed = sorted(list(ids))
+    ts = [tasks.index_addons.subtask(args=[chunk], kwargs={'index': index})
+          for chunk in chunked(indexed, 150)]
+    # Collections live in the same index.
+    ts += [index_collections.subtask(args=[chunk], kwargs={'index': index})
+           for chunk in chunked(sorted(list(collection_ids())), 150)]
+    if not taskset_succeeded(ts):
+        log.error('Indexing into %s failed, keeping the old index.' % index)
+        elasticutils.get_es().delete_index(index)
+        return
+    swap_alias(settings.ES_INDEX, index)
+
+    # Catch up on the add-ons that were saved while we were busy, and drop
+    # the ones that were deleted or stopped being valid.
+    changed = set(Addon.uncached.filter(modified__gte=start)
+                  .values_list('id', flat=True))
+    valid = set(valid_ids())
+    if changed & valid:
+        tasks.index_addons(sorted(changed & valid))
+    gone = set(indexed) - valid
+    if gone:
+        tasks.unindex_addons(sorted(gone))
+    log.info('Reindexed %s add-ons into %s.' % (len(ids), index))
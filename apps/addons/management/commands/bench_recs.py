@@ -0,0 +1,60 @@
+import os
+import random
+import tempfile
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+import recommend.index
+
+from addons.models import AddonRecommendation
+from bandwagon.models import RecommendedCollection
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--loops', action='store', type='int', default=50,
+                    help='Lookups to time for each size.'),
+        make_option('--sizes', action='store', default='10,50,200',
+                    help='Numbers of installed add-ons to look up.'),
+    )
+    help = ('Compare recommendation lookups from the db and from the recs '
+            'index for users with different numbers of add-ons.')
+
+    def handle(self, *args, **options):
+        # Build an index from what's in the db so both sides agree.
+        recs = {}
+        qs = AddonRecommendation.objects.values_list('addon', 'other_addon',
+                                                     'score')
+        for addon, other, score in qs.iterator():
+            recs.setdefault(addon, []).append((other, score))
+        if not recs:
+            print 'No addon_recommendations to look up.'
+            return
+        path = os.path.join(tempfile.mkdtemp(), 'recs.idx')
+        recommend.index.write(path, recs)
+        index = recommend.index.load(path)
+        print '%s add-ons with recommendations, index is %s bytes.' % (
+            len(recs), os.path.getsize(path))
+
+        addons = recs.keys()
+        for size in map(int, options['sizes'].split(',')):
+            users = [random.sample(addons, min(size, len(addons)))
+                     for i in range(options['loops'])]
+            for ids in users:
+                if index.scores(ids) != AddonRecommendation.db_scores(ids):
+                    print 'MISMATCH for %s' % ids
+                    return
+            db = self.time(users, AddonRecommendation.db_scores)
+            idx = self.time(users, index.scores)
+            print ('%4s add-ons: db %7.2fms, index %7.2fms, %6.1fx'
+                   % (size, db, idx, db / idx if idx else 0))
+        os.remove(path)
+
+    def time(self, users, scores):
+        """Average ms to build a user's recs with scores from `scores`."""
+        start = time.time()
+        for ids in users:
+            RecommendedCollection.rank(ids, scores(ids))
+        return (time.time() - start) * 1000 / len(users)
@@ -1,4 +1,5 @@
 import collections
+import hashlib
 import itertools
 import json
 import os
@@ -7,14 +8,18 @@ import time
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models, transaction
 from django.dispatch import receiver
 from django.db.models import Q, Max, signals as dbsignals
+from django.utils.encoding import smart_str
 from django.utils.translation import trans_real as translation
 
 import caching.base as caching
 import commonware.log
 import json_field
+import recommend.index
+from statsd import statsd
 from tower import ugettext_lazy as _
 
 import amo.models
@@ -33,9 +38,9 @@ from translations.fields import (TranslatedField, PurifiedField,
 from translations.query import order_by_translation
 from users.models import UserProfile, PersonaAuthor, UserForeignKey
 from versions.compare import version_int
-from versions.models import Version
+from versions.models import ApplicationsVersions, Version
 
-from . import query, signals
+from . import compat_index, query, signals
 
 log = commonware.log.getLogger('z.addons')
 
@@ -245,9 +250,6 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
             db_column='backup_version', null=True, on_delete=models.SET_NULL)
     _latest_version = None
 
-    # This gets overwritten in the transformer.
-    share_counts = collections.defaultdict(int)
-
     objects = AddonManager()
 
     class Meta:
@@ -386,6 +388,7 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
 
     @amo.cached_property(writable=True)
     def listed_authors(self):
+        self._lazy_load('authors')
         return UserProfile.objects.filter(addons=self,
                 addonuser__listed=True).order_by('addonuser__position')
 
@@ -400,6 +403,8 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
     def get_category(self, app):
         if app in getattr(self, '_first_category', {}):
             return self._first_category[app]
+        if app == amo.FIREFOX.id:
+            self._lazy_load('first_category')
         categories = list(self.categories.filter(application=app))
         return categories[0] if categories else None
 
@@ -495,6 +500,9 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         "Returns the current_version field or updates it if needed."
         if self.type == amo.ADDON_PERSONA:
             return
+        cache_name = self._meta.get_field('_current_version').get_cache_name()
+        if not hasattr(self, cache_name):
+            self._lazy_load('versions')
         if not self._current_version:
             self.update_version()
         return self._current_version
@@ -573,8 +581,20 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
                 self.update(status=amo.STATUS_UNREVIEWED)
                 logit('no reviewed files')
 
+    # The relations Addon.transformer can attach, and the named sets of them
+    # that a queryset can ask for with qs.profile(name).
+    TRANSFORM_STEPS = ('versions', 'personas', 'authors', 'creatured',
+                       'share_counts', 'previews', 'first_category')
+    TRANSFORM_PROFILES = {
+        'minimal': (),
+        'listing': ('versions', 'personas', 'authors', 'creatured',
+                    'share_counts'),
+        'api': ('versions', 'personas', 'authors', 'previews'),
+        'detail': TRANSFORM_STEPS,
+    }
+
     @staticmethod
-    def transformer(addons):
+    def transformer(addons, steps=TRANSFORM_STEPS):
         if not addons:
             return
 
@@ -582,6 +602,39 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         personas = [a for a in addons if a.type == amo.ADDON_PERSONA]
         addons = [a for a in addons if a.type != amo.ADDON_PERSONA]
 
+        if 'versions' in steps:
+            Addon.attach_versions(addons, addon_dict)
+
+        if 'authors' in steps:
+            Addon.attach_listed_authors(addons, addon_dict)
+
+        if 'personas' in steps:
+            Addon.attach_personas(personas, addon_dict)
+
+        if 'creatured' in steps:
+            # Store creatured apps on the add-on.
+            creatured = AddonCategory.creatured()
+            for addon in addons:
+                addon._creatured_apps = creatured.get(addon.id, [])
+
+        if 'share_counts' in steps:
+            sharing.attach_share_counts(AddonShareCountTotal, 'addon',
+                                        addon_dict)
+
+        if 'previews' in steps:
+            Addon.attach_previews(addons, addon_dict)
+
+        if 'first_category' in steps:
+            Addon.attach_first_category(addons, addon_dict)
+
+    @staticmethod
+    def profile_transformer(name):
+        """A transformer that only attaches the relations in profile `name`."""
+        steps = Addon.TRANSFORM_PROFILES[name]
+        return lambda addons: Addon.transformer(addons, steps)
+
+    @staticmethod
+    def attach_versions(addons, addon_dict):
         version_ids = filter(None, (a._current_version_id for a in addons))
         backup_ids = filter(None, (a._backup_version_id for a in addons))
         all_ids = set(version_ids) | set(backup_ids)
@@ -595,7 +648,8 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
                 addon._backup_version = version
             version.addon = addon
 
-        # Attach listed authors.
+    @staticmethod
+    def attach_listed_authors(addons, addon_dict):
         q = (UserProfile.objects.no_cache()
              .filter(addons__in=addons, addonuser__listed=True)
              .extra(select={'addon_id': 'addons_users.addon_id',
@@ -604,6 +658,8 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         for addon_id, users in itertools.groupby(q, key=lambda u: u.addon_id):
             addon_dict[addon_id].listed_authors = list(users)
 
+    @staticmethod
+    def attach_personas(personas, addon_dict):
         for persona in Persona.objects.no_cache().filter(addon__in=personas):
             addon = addon_dict[persona.addon_id]
             addon.persona = persona
@@ -613,21 +669,16 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         # Personas need categories for the JSON dump.
         Category.transformer(personas)
 
-        # Store creatured apps on the add-on.
-        creatured = AddonCategory.creatured()
-        for addon in addons:
-            addon._creatured_apps = creatured.get(addon.id, [])
-
-        # Attach sharing stats.
-        sharing.attach_share_counts(AddonShareCountTotal, 'addon', addon_dict)
-
-        # Attach previews.
+    @staticmethod
+    def attach_previews(addons, addon_dict):
         qs = Preview.objects.filter(addon__in=addons).order_by()
         qs = sorted(qs, key=lambda x: (x.addon_id, x.position, x.created))
         for addon, previews in itertools.groupby(qs, lambda x: x.addon_id):
             addon_dict[addon].all_previews = list(previews)
 
-        # Attach _first_category for Firefox.
+    @staticmethod
+    def attach_first_category(addons, addon_dict):
+        """Attach _first_category for Firefox."""
         cats = dict(AddonCategory.objects.values_list('addon', 'category')
                     .filter(addon__in=addon_dict,
                             category__application=amo.FIREFOX.id))
@@ -637,6 +688,17 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
             category = categories[cats[addon.id]] if addon.id in cats else None
             addon._first_category[amo.FIREFOX.id] = category
 
+    def _lazy_load(self, step):
+        """
+        Count a relation that had to be fetched for just this add-on because
+        the transformer profile it came from didn't load it.
+        """
+        profile = getattr(self, '_transform_profile', None)
+        if profile and step not in self.TRANSFORM_PROFILES.get(profile, ()):
+            statsd.incr('addons.transformer.%s.%s' % (profile, step))
+            log.debug(u'Profile %s loaded %s for add-on %s.'
+                      % (profile, step, self.id))
+
     @property
     def show_beta(self):
         return self.status == amo.STATUS_PUBLIC and self.current_beta_version
@@ -799,6 +861,7 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
         """Return a list of the apps where this add-on is creatured."""
         # This exists outside of is_category_featured so we can write the list
         # in the transformer and avoid repeated .creatured() calls.
+        self._lazy_load('creatured')
         return AddonCategory.creatured().get(self.id, [])
 
     @amo.cached_property
@@ -895,8 +958,21 @@ class Addon(amo.models.OnChangeMixin, amo.models.ModelBase):
 
     @amo.cached_property(writable=True)
     def all_previews(self):
+        self._lazy_load('previews')
         return list(self.previews.all())
 
+    @amo.cached_property(writable=True)
+    def share_counts(self):
+        # Add-ons that didn't go through a profile (no_transforms(),
+        # only_translations()) don't get share counts, same as before the
+        # profiles, so looking at them doesn't cost a query.
+        if not self.id or not getattr(self, '_transform_profile', None):
+            return collections.defaultdict(int)
+        self._lazy_load('share_counts')
+        sharing.attach_share_counts(AddonShareCountTotal, 'addon',
+                                    {self.id: self})
+        return self.share_counts
+
     @property
     def app_categories(self):
         categories = sorted_groupby(order_by_translation(self.categories.all(),
@@ -937,6 +1013,25 @@ def version_changed(sender, **kw):
     tasks.version_changed.delay(sender.id)
 
 
+def compat_index_changed(sender, instance, **kw):
+    if sender is Addon:
+        ids = [instance.id]
+    elif sender is Version:
+        ids = [instance.addon_id]
+    else:
+        ids = (Version.objects.filter(id=instance.version_id)
+               .values_list('addon', flat=True))
+    compat_index.invalidate(list(ids))
+
+
+# Anything that changes an add-on's type, current version, platforms or app
+# versions makes its compat index entry stale.
+for sender in (Addon, Version, File, ApplicationsVersions):
+    for signal in (dbsignals.post_save, dbsignals.post_delete):
+        signal.connect(compat_index_changed, sender=sender,
+                       dispatch_uid='addons.compat_index.%s' % sender.__name__)
+
+
 @receiver(dbsignals.post_save, sender=Addon,
           dispatch_uid='addons.search.index')
 def update_search_index(sender, instance, **kw):
@@ -997,6 +1092,45 @@ def watch_disabled(old_attr={}, new_attr={}, instance=None, sender=None, **kw):
             f.hide_disabled_file()
 
 
+def flush_update_cache(guid):
+    """
+    The update service caches lookups in each worker, bump the time it
+    checks them against so the add-on's next ping goes to the db.
+    """
+    if guid:
+        # Lowercase like services/utils.py, pings can use any case.
+        guid = smart_str(guid).lower()
+        key = amo.UPDATE_FLUSH_KEY % hashlib.md5(guid).hexdigest()
+        cache.set(key, time.time(), settings.UPDATE_CACHE_TIMEOUT)
+
+
+def update_service_changed(sender, instance, **kw):
+    if kw.get('raw'):
+        return
+    try:
+        if isinstance(instance, Addon):
+            addon = instance
+        elif isinstance(instance, Version):
+            addon = instance.addon
+        else:
+            addon = instance.version.addon
+    except models.ObjectDoesNotExist:
+        return
+    if sender is not Addon:
+        from . import tasks
+        # Wait for the transaction to commit so the task sees the new rows.
+        tasks.candidates_changed.apply_async(
+            args=[[addon.id]], countdown=settings.UPDATE_CANDIDATES_DELAY)
+    flush_update_cache(addon.guid)
+
+for model in (Addon, Version, File, ApplicationsVersions):
+    uid = 'update.service.changed.%s' % model.__name__
+    dbsignals.post_save.connect(update_service_changed, sender=model,
+                                dispatch_uid=uid)
+    dbsignals.post_delete.connect(update_service_changed, sender=model,
+                                  dispatch_uid=uid)
+
+
 class MiniAddonManager(AddonManager):
 
     def get_query_set(self):
@@ -1183,7 +1317,26 @@ class AddonRecommendation(models.Model):
 
     @classmethod
     def scores(cls, addon_ids):
-        """Get a mapping of {addon: {other_addon: score}} for each add-on."""
+        """
+        Get a mapping of {addon: {other_addon: score}} for each add-on.
+
+        They come from the index the recs cron writes to RECS_INDEX_PATH,
+        without touching the db, if there is one.
+        """
+        try:
+            index = recommend.index.load(settings.RECS_INDEX_PATH,
+                                         settings.RECS_INDEX_LOCAL_PATH,
+                                         settings.RECS_INDEX_INTERVAL)
+        except (EnvironmentError, ValueError):
+            log.error('Could not load recs index %s.'
+                      % settings.RECS_INDEX_PATH, exc_info=True)
+            index = None
+        if index is not None:
+            return index.scores(addon_ids)
+        return cls.db_scores(addon_ids)
+
+    @classmethod
+    def db_scores(cls, addon_ids):
         d = {}
         q = (AddonRecommendation.objects.filter(addon__in=addon_ids)
              .values('addon', 'other_addon', 'score'))
@@ -1401,6 +1554,32 @@ class AppSupport(amo.models.ModelBase):
         unique_together = ('addon', 'app')
 
 
+class UpdateCandidate(models.Model):
+    """
+    Every file an add-on could offer in an update, with the app versions it
+    works with. This is a denormalized copy of versions, files and
+    applications_versions for services/update.py.
+    """
+    addon = models.ForeignKey(Addon)
+    application = models.ForeignKey('applications.Application')
+    platform_id = models.PositiveIntegerField()
+    file_status = models.PositiveSmallIntegerField()
+    version_id = models.PositiveIntegerField()
+    version = models.CharField(max_length=255, default='')
+    releasenotes = models.PositiveIntegerField(null=True)
+    file_id = models.PositiveIntegerField()
+    filename = models.CharField(max_length=255, default='')
+    hash = models.CharField(max_length=255, default='')
+    datestatuschanged = models.DateTimeField(null=True)
+    min = models.CharField(max_length=255)
+    max = models.CharField(max_length=255)
+    min_int = models.BigIntegerField()
+    max_int = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'update_candidates'
+
+
 class Charity(amo.models.ModelBase):
     name = models.CharField(max_length=255)
     url = models.URLField(verify_exists=False)
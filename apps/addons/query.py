@@ -18,6 +18,23 @@ class IndexQuerySet(caching.CachingQuerySet):
         q.query.index_map.update(kw)
         return q
 
+    def profile(self, name):
+        """
+        Only attach the relations in Addon.TRANSFORM_PROFILES[name].
+
+        Anything else is fetched per add-on when somebody asks for it, and
+        counted in statsd so we can tell when a profile is missing something.
+        """
+        from translations import transformer
+        if name not in self.model.TRANSFORM_PROFILES:
+            raise ValueError('Unknown transformer profile: %s' % name)
+        # The extra select caches these separately and tags every add-on with
+        # its profile.
+        return (self.no_transforms()
+                .extra(select={'_transform_profile': '"%s"' % name})
+                .transform(transformer.get_trans)
+                .transform(self.model.profile_transformer(name)))
+
     def fetch_missed(self, pks):
         # Remove the indexes before doing the id query.
         if hasattr(self.query, 'index_map'):
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from operator import attrgetter
 
 from django.conf import settings
@@ -5,32 +6,72 @@ from django.conf import settings
 import elasticutils
 import pyes.exceptions as pyes
 
-from .models import Addon, Feature
+import amo
+from versions.models import ApplicationsVersions
+from .models import Addon, AddonCategory, Feature
 
 
 def extract(addon):
     """Extract indexable attributes from an add-on."""
+    return extract_many([addon])[0]
+
+
+def extract_many(addons):
+    """
+    Extract indexable attributes from a list of add-ons.
+
+    Categories, features and compatible apps are fetched for all the add-ons
+    at once instead of with a few queries per add-on.
+    """
+    ids = [a.id for a in addons]
+    categories = defaultdict(list)
+    for addon, category in (AddonCategory.objects.no_cache()
+                            .filter(addon__in=ids)
+                            .values_list('addon', 'category')):
+        categories[addon].append(category)
+
+    features = defaultdict(list)
+    for addon, locale, app in (Feature.objects.no_cache()
+                               .filter(addon__in=ids)
+                               .values_list('addon', 'locale', 'application')):
+        features[addon].append((locale, app))
+
+    # Search providers and personas don't list their supported apps.
+    versions = [a._current_version_id for a in addons
+                if a.type not in amo.NO_COMPAT and a._current_version_id]
+    apps = defaultdict(list)
+    for version, app in (ApplicationsVersions.objects.no_cache()
+                         .filter(version__in=versions)
+                         .values_list('version', 'application')):
+        if app in amo.APP_IDS:
+            apps[version].append(app)
+
     attrs = ('id', 'name', 'created', 'last_updated', 'weekly_downloads',
              'bayesian_rating', 'average_daily_users', 'status', 'type',
              'is_disabled', 'hotness')
-    d = dict(zip(attrs, attrgetter(*attrs)(addon)))
-    # Coerce the Translation into a string.
-    d['name'] = unicode(d['name'])
-    d['app'] = [a.id for a in addon.compatible_apps]
-    # This is an extra query, not good for perf.
-    d['category'] = list(addon.categories.values_list('id', flat=True))
-    # Another extra query.
-    features = (Feature.objects.filter(addon=addon)
-                .values_list('locale', 'application'))
-    d['featured'] = [app for locale, app in features if locale is None]
-    # Guard `app not in featured` so we don't get dupes. Global featured takes
-    # precedent over locale-featured.
-    d['featured_locale'] = [{locale: app} for locale, app in features
-                            if locale is not None and app not in d['featured']]
-    return d
-
-
-def setup_mapping():
+    rv = []
+    for addon in addons:
+        d = dict(zip(attrs, attrgetter(*attrs)(addon)))
+        # Coerce the Translation into a string.
+        d['name'] = unicode(d['name'])
+        if addon.type in amo.NO_COMPAT:
+            d['app'] = [a.id for a in amo.APP_TYPE_SUPPORT[addon.type]]
+        else:
+            d['app'] = apps[addon._current_version_id]
+        d['category'] = categories[addon.id]
+        d['featured'] = [app for locale, app in features[addon.id]
+                         if locale is None]
+        # Guard `app not in featured` so we don't get dupes. Global featured
+        # takes precedent over locale-featured.
+        d['featured_locale'] = [{locale: app}
+                                for locale, app in features[addon.id]
+                                if locale is not None and
+                                   app not in d['featured']]
+        rv.append(d)
+    return rv
+
+
+def setup_mapping(index=None):
     """Set up the addons index mapping."""
     # Mapping describes how elasticsearch handles a document during indexing.
     # Most fields are detected and mapped automatically.
@@ -38,10 +79,10 @@ def setup_mapping():
         # Turn off analysis on name so we can sort by it.
         'name': {'index': 'not_analyzed', 'type': 'string'},
     }
+    index = index or settings.ES_INDEX
     es = elasticutils.get_es()
     try:
-        es.create_index_if_missing(settings.ES_INDEX)
-        es.put_mapping(Addon._meta.app_label, {'properties': m},
-                       settings.ES_INDEX)
+        es.create_index_if_missing(index)
+        es.put_mapping(Addon._meta.app_label, {'properties': m}, index)
     except pyes.ElasticSearchException:
         pass
@@ -11,7 +11,7 @@ import amo
 from amo.decorators import write
 from . import cron, search  # Pull in tasks from cron.
 from .forms import get_satisfaction
-from .models import Addon, Preview
+from .models import Addon, Preview, flush_update_cache
 
 log = logging.getLogger('z.task')
 
@@ -71,6 +71,48 @@ def update_appsupport(ids):
     Addon.objects.invalidate(*addons)
 
 
+@task
+@write
+def candidates_changed(ids, **kw):
+    update_candidates(ids)
+
+
+@transaction.commit_on_success
+def update_candidates(ids):
+    """Rebuild the update_candidates rows services/update.py reads."""
+    log.info('[%s@None] Updating update candidates for %s.' % (len(ids), ids))
+    delete = 'DELETE FROM update_candidates WHERE addon_id IN (%s)'
+    insert = """
+        INSERT INTO update_candidates
+            (addon_id, application_id, platform_id, file_status, version_id,
+             version, releasenotes, file_id, filename, hash,
+             datestatuschanged, min, max, min_int, max_int)
+        SELECT versions.addon_id, applications_versions.application_id,
+            files.platform_id, files.status, versions.id, versions.version,
+            versions.releasenotes, files.id, files.filename, files.hash,
+            files.datestatuschanged, appmin.version, appmax.version,
+            appmin.version_int, appmax.version_int
+        FROM versions
+        INNER JOIN applications_versions
+            ON applications_versions.version_id = versions.id
+        INNER JOIN appversions appmin
+            ON appmin.id = applications_versions.min
+        INNER JOIN appversions appmax
+            ON appmax.id = applications_versions.max
+        INNER JOIN files
+            ON files.version_id = versions.id
+        WHERE versions.addon_id IN (%s)"""
+
+    cursor = connection.cursor()
+    cursor.execute(delete % ','.join(map(str, ids)))
+    cursor.execute(insert % ','.join(map(str, ids)))
+
+    # Anything the update service cached from the old rows is stale.
+    guids = Addon.uncached.filter(id__in=ids).values_list('guid', flat=True)
+    for guid in guids:
+        flush_update_cache(guid)
+
+
 @task
 def fix_get_satisfaction(ids, **kw):
     log.info('[%s@None] Fixing get satisfaction starting with id: %s...' %
@@ -98,14 +140,17 @@ def delete_preview_files(id, **kw):
             log.error('Error deleting preview file (%s): %s' % (f, e))
 
 
-@task
-def index_addons(ids, **kw):
+@task(ignore_result=False)
+def index_addons(ids, index=None, **kw):
     if not settings.USE_ELASTIC:
         return
     es = elasticutils.get_es()
     log.info('Indexing addons %s-%s. [%s]' % (ids[0], ids[-1], len(ids)))
-    for addon in Addon.objects.filter(id__in=ids):
-        Addon.index(search.extract(addon), bulk=True, id=addon.id)
+    # The search document only needs the names, not the full transformer.
+    addons = list(Addon.objects.no_cache().filter(id__in=ids)
+                  .only_translations())
+    for addon, doc in zip(addons, search.extract_many(addons)):
+        Addon.index(doc, bulk=True, id=addon.id, index=index)
     es.flush_bulk(forced=True)
 
 
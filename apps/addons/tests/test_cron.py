@@ -1,9 +1,19 @@
+import array
+from datetime import datetime, timedelta
+import operator
+import random
+
+from django.conf import settings
+
 from nose.tools import eq_
 import mock
+import pyes
+import recommend
 import test_utils
 
 import amo
-from addons import cron
+import amo.tests
+from addons import cron, search
 from addons.models import Addon, AppSupport
 from addons.utils import ReverseNameLookup
 from addons.tasks import fix_get_satisfaction
@@ -230,3 +240,114 @@ class TestHideDisabledFiles(test_utils.TestCase):
         # It should have been removed from mirror stagins.
         os_mock.remove.assert_called_with(f1.mirror_file_path)
         eq_(os_mock.remove.call_count, 1)
+
+
+class TestRecs(test_utils.TestCase):
+
+    def setUp(self):
+        # Lots of overlap, some add-ons sharing nothing and some ties.
+        rand = random.Random(42)
+        self.addons = {}
+        for addon in range(1, 120):
+            cs = rand.sample(range(40), rand.randint(4, 12))
+            self.addons[addon] = array.array('l', sorted(cs))
+        for addon in range(200, 215):
+            self.addons[addon] = array.array('l', range(1000 + addon,
+                                                         1004 + addon))
+
+    def tearDown(self):
+        cron._recs_state.clear()
+
+    def brute_force(self):
+        # The old loop over every pair of add-ons.
+        rv = {}
+        for addon, collections in self.addons.iteritems():
+            xs = [(other, recommend.similarity(collections, cs))
+                  for other, cs in self.addons.iteritems()]
+            others = sorted(xs, key=operator.itemgetter(1), reverse=True)
+            rv[addon] = [(k, v) for k, v in others[:11] if k != addon]
+        return rv
+
+    def test_same_as_brute_force(self):
+        cron._recs_state.update(cron._recs_index(self.addons))
+        eq_(cron._recs_chunk(self.addons.keys()), self.brute_force())
+
+
+class TestReindexSwap(amo.tests.ESTestCase):
+    es = True
+
+    def setUp(self):
+        super(TestReindexSwap, self).setUp()
+        self.addCleanup(self.cleanup)
+        # Start with a plain index, like before the first swap.
+        self.cleanup()
+        search.setup_mapping()
+        cron.reindex_addons()
+        self.refresh()
+
+    def cleanup(self):
+        for index in self.aliased(settings.ES_INDEX):
+            self.es.delete_index(index)
+
+    def aliased(self, name):
+        """The indexes behind `name`, or [name] if it's a real index."""
+        try:
+            return self.es.get_alias(name)
+        except pyes.IndexMissingException:
+            return []
+
+    def swap(self, when):
+        with mock.patch('addons.cron.datetime') as dt:
+            dt.now.return_value = when
+            cron.reindex_addons(swap=True)
+        self.refresh()
+        return '%s-%s' % (settings.ES_INDEX, when.strftime('%Y%m%d%H%M%S'))
+
+    def valid(self):
+        return (Addon.objects.filter(_current_version__isnull=False,
+                                     status__in=amo.VALID_STATUSES,
+                                     disabled_by_user=False).count())
+
+    def test_first_run(self):
+        eq_(self.aliased(settings.ES_INDEX), [settings.ES_INDEX])
+        index = self.swap(datetime.now())
+        eq_(self.aliased(settings.ES_INDEX), [index])
+        eq_(Addon.search().count(), self.valid())
+
+    def test_second_run(self):
+        first = self.swap(datetime.now() - timedelta(seconds=10))
+        second = self.swap(datetime.now())
+        eq_(self.aliased(settings.ES_INDEX), [second])
+        eq_(self.aliased(first), [])
+        eq_(Addon.search().count(), self.valid())
+
+    @mock.patch('addons.cron.taskset_succeeded')
+    def test_failed_run(self, succeeded):
+        succeeded.return_value = False
+        index = self.swap(datetime.now())
+        # The half-built index is gone and searches still use the old one.
+        eq_(self.aliased(index), [])
+        eq_(self.aliased(settings.ES_INDEX), [settings.ES_INDEX])
+        eq_(Addon.search().count(), self.valid())
+
+    @mock.patch('addons.cron.taskset_succeeded')
+    def test_catch_up(self, succeeded):
+        changed, gone = Addon.objects.filter(disabled_by_user=False,
+                                             status=amo.STATUS_PUBLIC)[:2]
+
+        def run(subtasks):
+            for subtask in subtasks:
+                subtask.apply()
+            # These change while the new index is being built, without
+            # telling the search index.
+            Addon.objects.filter(id=changed.id).update(
+                type=amo.ADDON_THEME, modified=datetime.now())
+            Addon.objects.filter(id=gone.id).update(
+                disabled_by_user=True, modified=datetime.now())
+            return True
+        succeeded.side_effect = run
+
+        self.swap(datetime.now())
+        eq_(Addon.search().count(), self.valid())
+        eq_(Addon.search().filter(type=amo.ADDON_THEME).count(), 1)
+
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime, timedelta
 import itertools
+import os
 from urlparse import urlparse
 
 from django import forms
@@ -11,11 +12,13 @@ from django.utils import translation
 
 from mock import patch, Mock
 from nose.tools import eq_, assert_not_equal
+import recommend.index
 import test_utils
 
 import amo
 import amo.tests
 import addons.search
+from addons import compat_index
 from amo import set_user
 from amo.helpers import absolutify
 from amo.signals import _connect, _disconnect
@@ -106,6 +109,30 @@ class TestAddonManager(test_utils.TestCase):
         addon.update(status=amo.STATUS_DISABLED)
         eq_(Addon.objects.valid_and_disabled().count(), 3)
 
+    def test_profile_minimal(self):
+        addon = Addon.objects.filter(id=5299).profile('minimal')[0]
+        eq_(addon._transform_profile, 'minimal')
+        assert 'all_previews' not in addon.__dict__
+        with patch('addons.models.statsd') as statsd:
+            addon.all_previews
+        statsd.incr.assert_called_with('addons.transformer.minimal.previews')
+
+    def test_profile_detail(self):
+        addon = Addon.objects.filter(id=5299).profile('detail')[0]
+        assert '_creatured_apps' in addon.__dict__
+        with patch('addons.models.statsd') as statsd:
+            addon.all_previews
+            addon.current_version
+            addon.share_counts
+        assert not statsd.incr.called
+
+    def test_untransformed_share_counts(self):
+        addon = Addon.objects.no_transforms().get(id=5299)
+        self.assertNumQueries(0, lambda: addon.share_counts)
+
+    def test_profile_unknown(self):
+        self.assertRaises(ValueError, Addon.objects.all().profile, 'xxx')
+
 
 class TestAddonManagerFeatured(test_utils.TestCase):
     # TODO(cvan): Once we migrate the featured add-ons to featured collections
@@ -1179,6 +1206,17 @@ class TestAddonRecommendations(test_utils.TestCase):
             for rec in recs:
                 eq_(scores[addon][rec.other_addon_id], rec.score)
 
+    def test_scores_from_index(self):
+        ids = [5299, 1843, 2464, 7661, 5369]
+        expected = AddonRecommendation.db_scores(ids)
+        recommend.index.write(settings.RECS_INDEX_PATH, dict(
+            (addon, others.items()) for addon, others in expected.items()))
+        try:
+            self.assertNumQueries(0, AddonRecommendation.scores, ids)
+            eq_(AddonRecommendation.scores(ids), expected)
+        finally:
+            os.remove(settings.RECS_INDEX_PATH)
+
 
 class TestAddonDependencies(test_utils.TestCase):
     fixtures = ['base/addon_5299_gcal',
@@ -1415,6 +1453,52 @@ class TestAddonWatchDisabled(test_utils.TestCase):
         assert not mock.hide_disabled_file.called
 
 
+class TestExtract(test_utils.TestCase):
+    fixtures = ['base/apps', 'base/category', 'base/featured',
+                'addons/featured', 'addons/persona']
+
+    def test_extract_many(self):
+        addons_ = list(Addon.objects.all())
+        docs = addons.search.extract_many(addons_)
+        eq_(len(docs), len(addons_))
+        for addon, doc in zip(addons_, docs):
+            eq_(doc, addons.search.extract(addon))
+            eq_(doc['id'], addon.id)
+            eq_(doc['name'], unicode(addon.name))
+            eq_(sorted(doc['app']),
+                sorted(a.id for a in addon.compatible_apps))
+            eq_(sorted(doc['category']),
+                sorted(addon.categories.values_list('id', flat=True)))
+            features = Feature.objects.filter(addon=addon)
+            eq_(sorted(doc['featured']),
+                sorted(f.application_id for f in features
+                       if f.locale is None))
+
+    def test_queries(self):
+        addons_ = list(Addon.objects.all())
+        self.assertNumQueries(3, addons.search.extract_many, addons_)
+
+
+class TestCompatIndex(test_utils.TestCase):
+    fixtures = ['base/apps', 'base/platforms', 'base/addon_3615',
+                'base/addon_5299_gcal']
+
+    def setUp(self):
+        cache.clear()
+        self.index = compat_index.CompatIndex()
+
+    def test_change_reloads_addon(self):
+        self.index.get([3615, 5299])
+        other = self.index.entries[5299]
+        for f in File.objects.filter(version__addon=3615):
+            f.platform_id = amo.PLATFORM_MAC.id
+            f.save()
+        mac = compat_index.platform_mask([amo.PLATFORM_MAC.id])
+        eq_(self.index.get([3615])[3615][1], mac)
+        # Nothing happened to the other add-on, so it's not loaded again.
+        eq_(self.index.entries[5299], other)
+
+
 class TestSearchSignals(amo.tests.ESTestCase):
     es = True
 
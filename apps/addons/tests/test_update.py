@@ -1,12 +1,15 @@
 from datetime import datetime, timedelta
 from email import utils
+import json
+import time
 
 from django.db import connection
 
 import test_utils
 from nose.tools import eq_
 
-from addons.models import Addon
+from addons.models import Addon, UpdateCandidate
+from addons.tasks import update_candidates
 import amo
 from applications.models import Application, AppVersion
 from files.models import File
@@ -21,6 +24,8 @@ class TestDataValidate(test_utils.TestCase):
                 'base/appversion']
 
     def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
         self.good_data = {
             'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
             'version': '2.0.58',
@@ -93,8 +98,11 @@ class TestDataValidate(test_utils.TestCase):
 class TestLookup(test_utils.TestCase):
     fixtures = ['addons/update',
                 'base/platforms']
+    engine = 'sql'
 
     def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
         self.addon = Addon.objects.get(id=1865)
         self.platform = None
         self.version_int = 3069900200100
@@ -114,7 +122,7 @@ class TestLookup(test_utils.TestCase):
             'appVersion': 1,  # this is going to be overridden
             'appOS': args[3].api_name if args[3] else '',
             'reqVersion': '',
-            })
+            }, engine=self.engine)
         up.cursor = connection.cursor()
         assert up.is_valid()
         up.data['version_int'] = args[1]
@@ -353,12 +361,29 @@ class TestLookup(test_utils.TestCase):
             eq_(version, self.version_1_2_1)
 
 
+class TestLookupIndex(TestLookup):
+    """The same lookups, answered from update_candidates."""
+    engine = 'index'
+
+    def setUp(self):
+        super(TestLookupIndex, self).setUp()
+        update_candidates([self.addon.id])
+
+    def test_candidates(self):
+        files = File.objects.filter(version__addon=self.addon,
+                                    version__apps__isnull=False)
+        candidates = UpdateCandidate.objects.filter(addon=self.addon)
+        eq_(set(c.file_id for c in candidates), set(f.id for f in files))
+
+
 class TestResponse(test_utils.TestCase):
     fixtures = ['base/addon_3615',
                 'base/platforms',
                 'base/seamonkey']
 
     def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
         self.addon_one = Addon.objects.get(pk=3615)
         self.good_data = {
             'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
@@ -583,3 +608,189 @@ class TestResponse(test_utils.TestCase):
         data['appVersion'] = '5.0.1'
         upd = self.get(data)
         eq_(upd.get_rdf(), upd.get_no_updates_rdf())
+
+
+class TestUpdateCache(test_utils.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
+        self.good_data = {
+            'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+            'version': '2.0.58',
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+
+    def get(self, data):
+        up = update.Update(data)
+        up.cursor = connection.cursor()
+        return up
+
+    def test_hit(self):
+        rdf = self.get(self.good_data).get_rdf()
+        eq_(update.update_cache.stats()['misses'], 2)
+
+        up = update.Update(self.good_data)
+        eq_(up.get_rdf(), rdf)
+        # Everything came from the cache, so no cursor was needed.
+        eq_(up.cursor, None)
+        eq_(update.update_cache.stats()['hits'], 2)
+
+    def test_no_updates_cached(self):
+        data = self.good_data.copy()
+        data['appVersion'] = '5.0.1'
+        self.get(data).get_rdf()
+        up = update.Update(data)
+        eq_(up.get_rdf(), up.get_no_updates_rdf())
+        eq_(up.cursor, None)
+
+    def test_file_change_flushes(self):
+        self.get(self.good_data).get_rdf()
+        File.objects.get(pk=67442).update(hash='')
+        rdf = self.get(self.good_data).get_rdf()
+        eq_(rdf.find('updateHash'), -1)
+
+    def test_addon_change_flushes(self):
+        self.get(self.good_data).get_rdf()
+        Addon.objects.get(pk=3615).update(disabled_by_user=True)
+        assert not self.get(self.good_data).is_valid()
+
+    def test_change_flushes_any_case(self):
+        data = dict(self.good_data, id=self.good_data['id'].upper())
+        self.get(data).get_rdf()
+        File.objects.get(pk=67442).update(hash='')
+        rdf = self.get(data).get_rdf()
+        eq_(rdf.find('updateHash'), -1)
+
+    def test_size(self):
+        cache = update.UpdateCache(2, 60)
+        for key in range(3):
+            cache.set(key, key)
+        eq_(cache.get(0), None)
+        eq_(cache.get(2), 2)
+
+    def test_expired(self):
+        cache = update.UpdateCache(2, 0)
+        cache.set('foo', 'bar')
+        eq_(cache.get('foo'), None)
+
+    def test_since(self):
+        cache = update.UpdateCache(2, 60)
+        cache.set('foo', 'bar')
+        eq_(cache.get('foo', since=time.time() + 1), None)
+
+
+class TestBulkUpdate(test_utils.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
+        self.data = {
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        self.guid = '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}'
+        self.items = [(self.guid, '2.0.58'), ('garbage', '1.0')]
+
+    def get(self, items, engine='sql'):
+        bulk = update.BulkUpdate(self.data, items, engine=engine)
+        bulk.cursor = connection.cursor()
+        bulk.resolve()
+        return bulk
+
+    def single(self):
+        up = update.Update(dict(self.data, id=self.guid, version='2.0.58'))
+        up.cursor = connection.cursor()
+        return up.get_rdf()
+
+    def test_rdf(self):
+        eq_(''.join(self.get(self.items).get_rdf()), self.single())
+
+    def test_rdf_index(self):
+        update_candidates([3615])
+        bulk = self.get(self.items, engine='index')
+        eq_(''.join(bulk.get_rdf()), self.single())
+
+    def test_no_updates(self):
+        self.data['appVersion'] = '5.0.1'
+        up = update.Update(dict(self.data, id=self.guid, version='2.0.58'))
+        up.cursor = connection.cursor()
+        eq_(''.join(self.get(self.items).get_rdf()), up.get_rdf())
+
+    def test_json(self):
+        data = json.loads(''.join(self.get(self.items).get_json()))
+        eq_([d['guid'] for d in data], [self.guid, 'garbage'])
+        eq_(data[0]['update']['version'], '2.0.58')
+        assert data[0]['update']['hash'].startswith('sha256:3808b13e')
+        eq_(data[1]['update'], None)
+
+    def test_bad_app(self):
+        self.data['appID'] = 'garbage'
+        eq_(''.join(self.get(self.items).get_rdf()), update.bad_rdf)
+
+
+class TestConditional(test_utils.TestCase):
+    fixtures = ['base/addon_3615',
+                'base/platforms']
+
+    def setUp(self):
+        update.update_cache.clear()
+        update.rdf_cache.clear()
+        self.good_data = {
+            'id': '{2fa4ed95-0317-4c6a-a74c-5f3e3912c1f9}',
+            'version': '2.0.58',
+            'reqVersion': 1,
+            'appID': '{ec8030f7-c20a-464f-9b0e-13a3a9e97384}',
+            'appVersion': '3.7a1pre',
+        }
+        self.old_mirror_url = settings_local.MIRROR_URL
+        settings_local.MIRROR_URL = 'http://releases.m.o/'
+
+    def tearDown(self):
+        settings_local.MIRROR_URL = self.old_mirror_url
+
+    def get(self, data):
+        up = update.Update(data)
+        up.cursor = connection.cursor()
+        up.get_rdf()
+        return up
+
+    def test_etag(self):
+        up = self.get(self.good_data)
+        etag = dict(up.get_headers(1))['ETag']
+        assert up.is_not_modified({'HTTP_IF_NONE_MATCH': etag})
+        assert not up.is_not_modified({'HTTP_IF_NONE_MATCH': '"foo"'})
+
+    def test_etag_changes(self):
+        etag = dict(self.get(self.good_data).get_headers(1))['ETag']
+        File.objects.get(pk=67442).update(hash='')
+        up = self.get(self.good_data)
+        assert not up.is_not_modified({'HTTP_IF_NONE_MATCH': etag})
+
+    def test_last_modified(self):
+        up = self.get(self.good_data)
+        modified = dict(up.get_headers(1))['Last-Modified']
+        assert modified
+        # Falling back to an older file makes the date go back, so it
+        # can't tell us the client is up to date.
+        assert not up.is_not_modified({'HTTP_IF_MODIFIED_SINCE': modified})
+
+    def test_no_updates(self):
+        data = self.good_data.copy()
+        data['appVersion'] = '5.0.1'
+        up = self.get(data)
+        assert not up.is_not_modified({'HTTP_IF_NONE_MATCH': '*'})
+        assert 'ETag' not in dict(up.get_headers(1))
+
+    def test_rendered_once(self):
+        rdf = self.get(self.good_data).get_good_rdf()
+        eq_(update.rdf_cache.stats()['misses'], 1)
+        eq_(self.get(self.good_data).get_good_rdf(), rdf)
+        eq_(update.rdf_cache.stats()['misses'], 1)
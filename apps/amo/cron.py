@@ -13,6 +13,7 @@ import commonware.log
 import phpserialize
 
 import amo
+from amo.decorators import batch_log
 from amo.utils import chunked
 from addons.models import Addon, AddonCategory
 from addons.utils import AdminActivityLogMigrationTracker, MigrationTracker
@@ -189,6 +190,7 @@ def migrate_admin_logs():
 
 
 @task
+@batch_log
 def _migrate_admin_logs(items, **kw):
     print 'Processing: %d..%d' % (items[0], items[-1])
     for item in LegacyAddonLog.objects.filter(pk__in=items):
@@ -212,6 +214,7 @@ def migrate_editor_eventlog():
 
 
 @task
+@batch_log
 def _migrate_editor_eventlog(items, **kw):
     log.info('[%s@%s] Migrating eventlog items' %
              (len(items), _migrate_editor_eventlog.rate_limit))
@@ -87,6 +87,20 @@ def write(f):
     return use_master(skip_cache(f))
 
 
+def batch_log(f):
+    """Write all the amo.log() entries of the wrapped function at the end."""
+    @functools.wraps(f)
+    def wrapper(*args, **kw):
+        from .log import flush_batch, start_batch
+        started = start_batch()
+        try:
+            return f(*args, **kw)
+        finally:
+            if started:
+                flush_batch()
+    return wrapper
+
+
 def set_modified_on(f):
     """
     Will update the modified timestamp on the provided objects
@@ -1,4 +1,9 @@
+from collections import defaultdict
+from datetime import datetime
 from inspect import isclass
+import threading
+
+from django.conf import settings
 
 from celery.datastructures import AttributeDict
 from tower import ugettext_lazy as _
@@ -404,10 +409,16 @@ LOG_REVIEW_QUEUE = [l.id for l in LOGS if hasattr(l, 'review_queue')]
 # Is the user emailed the message?
 LOG_REVIEW_EMAIL_USER = [l.id for l in LOGS if hasattr(l, 'review_email_user')]
 
+_batch = threading.local()
+
+
 def log(action, *args, **kw):
     """
     e.g. amo.log(amo.LOG.CREATE_ADDON, []),
          amo.log(amo.LOG.ADD_FILE_TO_VERSION, file, version)
+
+    Inside start_batch() and flush_batch() the entry is only written when the
+    batch is flushed, so the ActivityLog we return isn't saved yet.
     """
     from devhub.models import (ActivityLog, AddonLog, UserLog,
                                CommentLog, VersionLog)
@@ -426,34 +437,113 @@ def log(action, *args, **kw):
     al.arguments = args
     if 'details' in kw:
         al.details = kw['details']
-    al.save()
-
-    if 'details' in kw and 'comments' in al.details:
-        CommentLog(comments=al.details['comments'], activity_log=al).save()
-
     # TODO(davedash): post-remora this may not be necessary.
     if 'created' in kw:
         al.created = kw['created']
-        # Double save necessary since django resets the created date on save.
-        al.save()
+
+    rows = []
+    if 'details' in kw and 'comments' in al.details:
+        rows.append(CommentLog(comments=al.details['comments']))
 
     for arg in args:
         if isinstance(arg, tuple):
             if arg[0] == Addon:
-                AddonLog(addon_id=arg[1], activity_log=al).save()
+                rows.append(AddonLog(addon_id=arg[1]))
             elif arg[0] == Version:
-                VersionLog(version_id=arg[1], activity_log=al).save()
+                rows.append(VersionLog(version_id=arg[1]))
             elif arg[0] == UserProfile:
-                UserLog(user_id=arg[1], activity_log=al).save()
+                rows.append(UserLog(user_id=arg[1]))
 
         if isinstance(arg, Addon):
-            AddonLog(addon=arg, activity_log=al).save()
+            rows.append(AddonLog(addon=arg))
         elif isinstance(arg, Version):
-            VersionLog(version=arg, activity_log=al).save()
+            rows.append(VersionLog(version=arg))
         elif isinstance(arg, UserProfile):
             # Index by any user who is mentioned as an argument.
-            UserLog(activity_log=al, user=arg).save()
+            rows.append(UserLog(user=arg))
 
     # Index by every user
-    UserLog(activity_log=al, user=user).save()
+    rows.append(UserLog(user=user))
+
+    entries = getattr(_batch, 'entries', None)
+    if entries is None:
+        save_entries([(al, rows)])
+    else:
+        entries.append((al, rows))
     return al
+
+
+def start_batch():
+    """
+    Hold on to the log entries made in this thread until flush_batch().
+
+    Returns False if there's already a batch going, which keeps collecting.
+    """
+    if getattr(_batch, 'entries', None) is not None:
+        return False
+    _batch.entries = []
+    return True
+
+
+def flush_batch():
+    """
+    Write the entries held since start_batch(), or have a task write them if
+    settings.ACTIVITY_LOG_ASYNC.
+    """
+    from amo.tasks import save_activity_log
+    entries = getattr(_batch, 'entries', None)
+    _batch.entries = None
+    if not entries:
+        return
+    if settings.ACTIVITY_LOG_ASYNC:
+        save_activity_log.delay(entries)
+    else:
+        save_entries(entries)
+
+
+def save_entries(entries):
+    """
+    Save a list of (ActivityLog, [index rows]) pairs.
+
+    That's an INSERT per ActivityLog, since the index rows need their ids, and
+    one for each kind of index row.
+    """
+    for al, rows in entries:
+        _insert([al])
+    by_model = defaultdict(list)
+    for al, rows in entries:
+        for row in rows:
+            row.activity_log = al
+            by_model[row.__class__].append(row)
+    for model, rows in by_model.items():
+        _insert(rows)
+
+
+def _insert(objs):
+    """Insert new ModelBase objects of one model with a single query."""
+    from django.db import connection, models, transaction
+    model = objs[0].__class__
+    fields = [f for f in model._meta.local_fields
+              if not isinstance(f, models.AutoField)]
+    now = datetime.now()
+    params = []
+    for obj in objs:
+        obj.created = obj.created or now
+        obj.modified = now
+        params.extend(f.get_db_prep_save(getattr(obj, f.attname),
+                                         connection=connection)
+                      for f in fields)
+
+    qn = connection.ops.quote_name
+    row = '(%s)' % ', '.join(['%s'] * len(fields))
+    sql = 'INSERT INTO %s (%s) VALUES %s' % (
+        qn(model._meta.db_table), ', '.join(qn(f.column) for f in fields),
+        ', '.join([row] * len(objs)))
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    if len(objs) == 1:
+        objs[0].pk = connection.ops.last_insert_id(
+            cursor, model._meta.db_table, model._meta.pk.column)
+    transaction.commit_unless_managed()
+    # The sql insert doesn't invalidate anything, do it manually.
+    model.objects.invalidate(*objs)
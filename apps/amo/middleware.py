@@ -165,9 +165,12 @@ timing_log = commonware.log.getLogger('z.timer')
 class TimingMiddleware(object):
 
     def process_request(self, request):
+        from translations import transformer
         request._start = time.time()
+        transformer.start_loader()
 
     def process_response(self, request, response):
+        from translations import transformer
         auth = 'ANON'
         if hasattr(request, 'user') and request.user.is_authenticated():
             auth = 'AUTH'
@@ -175,10 +178,29 @@ class TimingMiddleware(object):
              'code': response.status_code, 'auth': auth,
              'url': smart_str(request.path_info)}
         msg = '{method} "{url}" ({code}) {time:.2f} [{auth}]'.format(**d)
+        loader = transformer.stop_loader()
+        if loader and loader.calls:
+            msg += ' [trans: {0} queries, {1} saved]'.format(
+                loader.queries, loader.calls - loader.queries)
         timing_log.info(msg)
         return response
 
 
+class ActivityLogMiddleware(object):
+    """Write the request's amo.log() entries in one go once we're done."""
+
+    def process_request(self, request):
+        from .log import flush_batch, start_batch
+        # Anything left over is from a request that blew up on the way out.
+        flush_batch()
+        start_batch()
+
+    def process_response(self, request, response):
+        from .log import flush_batch
+        flush_batch()
+        return response
+
+
 class GraphiteMiddleware(object):
 
     def process_response(self, request, response):
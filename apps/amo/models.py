@@ -269,11 +269,13 @@ class OnChangeMixin(object):
 class SearchMixin(object):
 
     @classmethod
-    def index(cls, document, id=None, bulk=False, force_insert=False):
+    def index(cls, document, id=None, bulk=False, force_insert=False,
+              index=None):
         """Wrapper around pyes.ES.index."""
         elasticutils.get_es().index(
-            document, index=settings.ES_INDEX, doc_type=cls._meta.app_label,
-            id=id, bulk=bulk, force_insert=force_insert)
+            document, index=index or settings.ES_INDEX,
+            doc_type=cls._meta.app_label, id=id, bulk=bulk,
+            force_insert=force_insert)
 
     @classmethod
     def unindex(cls, id):
@@ -3,11 +3,35 @@ import logging
 from django.conf import settings
 
 import elasticutils
+import pyes.exceptions as pyes
 from statsd import statsd
 
 log = logging.getLogger('z.es')
 
 
+def swap_alias(alias, index):
+    """
+    Point `alias` at `index` and delete the indexes it pointed to before.
+
+    If `alias` is still a real index it has to be deleted before the alias
+    can be created, so searches fail for a moment the first time around.
+    """
+    es = elasticutils.get_es()
+    try:
+        old = es.get_alias(alias)
+    except pyes.IndexMissingException:
+        old = []
+    if alias in old:
+        es.delete_index(alias)
+        old = []
+    es.change_aliases([('remove', i, alias) for i in old] +
+                      [('add', index, alias)])
+    for i in old:
+        if i != index:
+            es.delete_index(i)
+    log.info('Pointed the %s alias at %s.' % (alias, index))
+
+
 class ES(object):
 
     def __init__(self, type_):
@@ -50,6 +50,14 @@ def set_modified_on_object(obj, **kw):
                   (obj.__class__.__name__, obj.pk, e))
 
 
+@task
+def save_activity_log(entries, **kw):
+    """Saves the activity log entries of a request or task, see amo.log."""
+    from amo.log import save_entries
+    log.info('Saving %s activity log entries.' % len(entries))
+    save_entries(entries)
+
+
 class TaskStats(object):
     prefix = 'celery:tasks:stats'
     pending = prefix + ':pending'
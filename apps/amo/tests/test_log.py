@@ -5,7 +5,9 @@ import test_utils
 from nose.tools import eq_
 
 import amo
+from amo.log import flush_batch, start_batch
 from addons.models import Addon
+from devhub.models import ActivityLog, AddonLog, UserLog
 from users.models import UserProfile
 
 
@@ -34,4 +36,30 @@ class LogTest(test_utils.TestCase):
         al = amo.log(amo.LOG.CUSTOM_TEXT, 'hi', created=datetime(2009, 1, 1))
 
         eq_(al.created, datetime(2009, 1, 1))
+        eq_(ActivityLog.objects.get(id=al.id).created, datetime(2009, 1, 1))
+
+    def test_index_rows(self):
+        a = Addon.objects.create(name='kumar', type=amo.ADDON_EXTENSION)
+        al = amo.log(amo.LOG.EDIT_PROPERTIES, a)
+        rows = AddonLog.objects.no_cache().values_list('activity_log', 'addon')
+        eq_(list(rows), [(al.id, a.id)])
+        rows = UserLog.objects.no_cache().values_list('activity_log', 'user')
+        eq_(list(rows), [(al.id, amo.get_user().id)])
+
+    def test_batch(self):
+        a = Addon.objects.create(name='kumar', type=amo.ADDON_EXTENSION)
+        assert start_batch()
+        assert not start_batch()
+        first = amo.log(amo.LOG.EDIT_PROPERTIES, a)
+        amo.log(amo.LOG.EDIT_DESCRIPTIONS, a)
+        eq_(first.id, None)
+        eq_(ActivityLog.objects.no_cache().count(), 0)
+
+        flush_batch()
+        eq_(ActivityLog.objects.no_cache().count(), 2)
+        eq_(AddonLog.objects.no_cache().filter(addon=a).count(), 2)
+
+        # Nothing is held back after a flush.
+        amo.log(amo.LOG.EDIT_PROPERTIES, a)
+        eq_(ActivityLog.objects.no_cache().count(), 3)
 
@@ -1,3 +1,4 @@
+import contextlib
 import hashlib
 import itertools
 import operator
@@ -188,6 +189,44 @@ def chunked(seq, n):
         yield rv
 
 
+def taskset_succeeded(subtasks):
+    """
+    Run `subtasks` as a TaskSet and wait for them.  Returns True if every one
+    of them succeeded.
+
+    The tasks have to be declared with ignore_result=False.
+    """
+    from celery.task.sets import TaskSet
+    result = TaskSet(subtasks).apply_async()
+    try:
+        result.join()
+    except Exception, e:
+        log.error(u'TaskSet %s failed: %s' % (result.taskset_id, e))
+        return False
+    return result.successful()
+
+
+@contextlib.contextmanager
+def redis_lock(name, timeout):
+    """
+    Hold the redis lock `name` while the block runs, e.g. to keep crons from
+    overlapping.  Yields whether we got it.  The lock goes away after
+    `timeout` seconds in case we die holding it.
+    """
+    import redisutils
+    redis = redisutils.connections['master']
+    key = 'lock:%s' % name
+    locked = redis.setnx(key, 1)
+    if locked or redis.ttl(key) in (None, -1):
+        # Whoever took it before us might have died before the expire.
+        redis.expire(key, timeout)
+    try:
+        yield locked
+    finally:
+        if locked:
+            redis.delete(key)
+
+
 def urlencode(items):
     """A Unicode-safe URLencoder."""
     try:
@@ -0,0 +1,33 @@
+from django.db.models import signals
+
+from addons.models import Addon, AddonUser, Preview
+from files.models import File
+from versions.models import ApplicationsVersions, Version
+
+from api.utils import invalidate_addons
+
+
+def addon_changed(sender, instance, **kw):
+    invalidate_addons([instance.id])
+
+
+def addon_part_changed(sender, instance, **kw):
+    invalidate_addons([instance.addon_id])
+
+
+def version_part_changed(sender, instance, **kw):
+    ids = (Version.objects.filter(id=instance.version_id)
+           .values_list('addon', flat=True))
+    invalidate_addons(list(ids))
+
+
+# Drop the add-on's cached JSON when anything addon_to_dict() shows changes.
+for sender, receiver in [(Addon, addon_changed),
+                         (AddonUser, addon_part_changed),
+                         (Preview, addon_part_changed),
+                         (Version, addon_part_changed),
+                         (File, version_part_changed),
+                         (ApplicationsVersions, version_part_changed)]:
+    for signal in (signals.post_save, signals.post_delete):
+        signal.connect(receiver, sender=sender,
+                       dispatch_uid='api.invalidate.%s' % sender.__name__)
@@ -18,6 +18,7 @@ import api.utils
 from addons.models import Addon, AddonCategory, Category, Feature, Preview
 from amo import helpers
 from amo.urlresolvers import reverse
+from files.models import File
 from search.tests import SphinxTestCase
 from search.utils import stop_sphinx
 
@@ -60,6 +61,27 @@ class UtilsTest(TestCase):
         eq_(d['summary'], 'i &lt;3 amo!')
         eq_(d['description'], 'i &lt;3 amo!')
 
+    def test_json(self):
+        j = api.utils.addons_to_json([self.a])
+        eq_(json.loads(j[0])['name'], unicode(self.a.name))
+        disco = api.utils.addons_to_json([self.a], disco=True)
+        assert disco != j
+
+    def test_json_cached(self):
+        j = api.utils.addons_to_json([self.a])
+        # Nobody said the add-on changed, so we still get the cached version.
+        self.a.guid = 'xxx'
+        eq_(api.utils.addons_to_json([self.a]), j)
+        self.a.save()
+        eq_(json.loads(api.utils.addons_to_json([self.a])[0])['guid'], 'xxx')
+
+    def test_json_invalidate_preview(self):
+        j = api.utils.addons_to_json([self.a])
+        Preview.objects.create(addon=self.a)
+        self.a = Addon.objects.get(id=3615)
+        eq_(len(json.loads(api.utils.addons_to_json([self.a])[0])['previews']),
+            len(json.loads(j[0])['previews']) + 1)
+
 
 class No500ErrorsTest(TestCase):
     """
@@ -550,6 +572,39 @@ class ListTest(TestCase):
         make_call(u'list/featured/all/10/Linux/3.7a2prexec\xb6\u0153\xec\xb2')
 
 
+class CompatIndexTest(TestCase):
+    fixtures = ['base/apps', 'base/addon_3615']
+
+    def compatible(self, platform='all', version=None):
+        return api.views.compatible_ids([3615, 999], amo.FIREFOX, platform,
+                                        version)
+
+    def test_no_filters(self):
+        eq_(self.compatible(), [3615, 999])
+
+    def test_version(self):
+        eq_(self.compatible(version='3.6'), [3615])
+        eq_(self.compatible(version='4.0'), [])
+
+    def test_platform(self):
+        eq_(self.compatible('linux'), [3615])
+        File.objects.filter(version=81551).update(
+            platform=amo.PLATFORM_MAC.id)
+        # update() doesn't send signals, so the index doesn't know yet.
+        eq_(self.compatible('linux'), [3615])
+        File.objects.get(version=81551).save()
+        eq_(self.compatible('linux'), [])
+        eq_(self.compatible('mac'), [3615])
+
+    def test_app(self):
+        eq_(api.views.compatible_ids([3615], amo.THUNDERBIRD, 'all', '3.0'),
+            [])
+
+    def test_persona(self):
+        Addon.objects.get(id=3615).update(type=amo.ADDON_PERSONA)
+        eq_(self.compatible('linux', '4.0'), [3615])
+
+
 class SeamonkeyFeaturedTest(TestCase):
     fixtures = ['base/seamonkey']
 
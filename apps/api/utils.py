@@ -1,9 +1,15 @@
+import hashlib
+import json
+import uuid
+
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
 from django.utils.html import strip_tags
 
 import amo
-from amo.urlresolvers import reverse
-from amo.utils import urlparams, epoch
+from amo.urlresolvers import get_url_prefix, reverse
+from amo.utils import urlparams, epoch, JSONEncoder
 
 
 def addon_to_dict(addon, disco=False):
@@ -68,3 +74,49 @@ def addon_to_dict(addon, disco=False):
         d['previews'] = [p.as_dict(src=src) for p in addon.all_previews]
 
     return d
+
+
+def _gen_key(addon_id):
+    return '%s:api:addon:%s' % (settings.CACHE_PREFIX, addon_id)
+
+
+def addons_to_json(addons, disco=False):
+    """
+    Get the addon_to_dict() JSON for each add-on in `addons`.
+
+    The JSON is cached for each add-on, locale, url prefix and disco flag.
+    Every add-on has a generation in the cache and invalidate_addons()
+    deletes it, which orphans all of the add-on's documents.
+    """
+    if not addons:
+        return []
+    prefixer = get_url_prefix()
+    context = hashlib.md5('%s:%s:%s' % (translation.get_language(),
+                                        prefixer.fix('') if prefixer else '',
+                                        disco)).hexdigest()
+
+    gen_keys = [_gen_key(a.id) for a in addons]
+    gens = cache.get_many(gen_keys)
+    new_gens = {}
+    for key in gen_keys:
+        if key not in gens:
+            new_gens[key] = gens[key] = uuid.uuid4().hex[:8]
+    if new_gens:
+        cache.set_many(new_gens, settings.API_ADDON_CACHE_TIMEOUT)
+
+    keys = ['%s:%s:%s' % (key, gens[key], context) for key in gen_keys]
+    docs = cache.get_many(keys)
+    rv, missing = [], {}
+    for addon, key in zip(addons, keys):
+        if key not in docs:
+            docs[key] = missing[key] = json.dumps(
+                addon_to_dict(addon, disco=disco), cls=JSONEncoder)
+        rv.append(docs[key])
+    if missing:
+        cache.set_many(missing, settings.API_ADDON_CACHE_TIMEOUT)
+    return rv
+
+
+def invalidate_addons(ids):
+    """Drop the cached JSON for the add-ons in `ids`."""
+    cache.delete_many(map(_gen_key, ids))
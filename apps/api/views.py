@@ -18,10 +18,10 @@ from caching.base import cached_with
 
 import amo
 import api
-from api.utils import addon_to_dict
+from api.utils import addons_to_json
 from amo.models import manual_order
 from amo.urlresolvers import get_url_prefix
-from amo.utils import JSONEncoder
+from addons import compat_index
 from addons.models import Addon
 from search.client import (Client as SearchClient, SearchError,
                            extract_from_query, SEARCHABLE_STATUSES)
@@ -81,6 +81,26 @@ def validate_api_version(version):
     return True
 
 
+def compatible_ids(ids, app, platform, version):
+    """
+    Filter add-on ids by application, app version, and platform.
+
+    This uses the compat index, so the add-ons don't have to be fetched.
+    """
+    platform = platform.lower()
+    if platform != 'all' and platform in amo.PLATFORM_DICT:
+        pid = amo.PLATFORM_DICT[platform]
+    else:
+        pid = None
+
+    if version is not None:
+        version = search_utils.convert_version(version)
+
+    if pid or version is not None:
+        return compat_index.index.compatible(ids, app, pid, version)
+    return ids
+
+
 def addon_filter(addons, addon_type, limit, app, platform, version,
                  shuffle=True):
     """
@@ -109,18 +129,8 @@ def addon_filter(addons, addon_type, limit, app, platform, version,
                             lambda x: x.type == amo.ADDON_PERSONA))
     personas, addons = groups.get(True, []), groups.get(False, [])
 
-    platform = platform.lower()
-    if platform != 'all' and platform in amo.PLATFORM_DICT:
-        pid = amo.PLATFORM_DICT[platform]
-        f = lambda ps: pid in ps or amo.PLATFORM_ALL in ps
-        addons = [a for a in addons
-                  if f(a.current_version.supported_platforms)]
-
-    if version is not None:
-        v = search_utils.convert_version(version)
-        f = lambda app: app.min.version_int <= v <= app.max.version_int
-        xs = [(a, a.compatible_apps) for a in addons]
-        addons = [a for a, apps in xs if apps.get(APP) and f(apps[APP])]
+    ok = set(compatible_ids([a.id for a in addons], APP, platform, version))
+    addons = [a for a in addons if a.id in ok]
 
     # Put personas back in.
     addons.extend(personas)
@@ -292,6 +302,8 @@ class ListView(APIView):
                 ids = Addon.new_featured_random(APP, self.request.LANG)
             else:
                 ids = Addon.featured_random(APP, self.request.LANG)
+            # Throw out incompatible add-ons before fetching any of them.
+            ids = compatible_ids(ids, APP, platform, version)
             addons = manual_order(qs, ids[:limit + BUFFER], 'addons.id')
             shuffle = False
 
@@ -304,8 +316,7 @@ class ListView(APIView):
                            {'addons': addon_filter(addons, *args)})
 
     def render_json(self, context):
-        return json.dumps([addon_to_dict(a) for a in context['addons']],
-                          cls=JSONEncoder)
+        return '[%s]' % ', '.join(addons_to_json(context['addons']))
 
 
 # pylint: disable-msg=W0613
@@ -192,11 +192,14 @@ def _drop_collection_recs(**kw):
         _drop_collection_recs.delay()
 
 
+def collection_ids():
+    return (Collection.objects.exclude(type=amo.COLLECTION_SYNCHRONIZED)
+            .values_list('id', flat=True))
+
+
 @cronjobs.register
 def reindex_collections():
     from . import tasks
-    ids = (Collection.objects.exclude(type=amo.COLLECTION_SYNCHRONIZED)
-           .values_list('id', flat=True))
     taskset = [tasks.index_collections.subtask(args=[chunk])
-               for chunk in chunked(sorted(list(ids)), 150)]
+               for chunk in chunked(sorted(list(collection_ids())), 150)]
     TaskSet(taskset).apply_async()
@@ -538,7 +538,11 @@ class RecommendedCollection(Collection):
     @classmethod
     def build_recs(cls, addon_ids):
         """Get the top ranking add-ons according to recommendation scores."""
-        scores = AddonRecommendation.scores(addon_ids)
+        return cls.rank(addon_ids, AddonRecommendation.scores(addon_ids))
+
+    @classmethod
+    def rank(cls, addon_ids, scores):
+        """Add up the {addon: {other_addon: score}} for each other add-on."""
         d = collections.defaultdict(int)
         for others in scores.values():
             for addon, score in others.items():
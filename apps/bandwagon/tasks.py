@@ -106,14 +106,14 @@ def cron_collection_meta(*addons, **kw):
     collection_meta(*addons)
 
 
-@task
-def index_collections(ids, **kw):
+@task(ignore_result=False)
+def index_collections(ids, index=None, **kw):
     if not settings.USE_ELASTIC:
         return
     es = elasticutils.get_es()
     log.info('Indexing collections %s-%s [%s].' % (ids[0], ids[-1], len(ids)))
     for c in Collection.objects.filter(id__in=ids):
-        Collection.index(search.extract(c), bulk=True, id=c.id)
+        Collection.index(search.extract(c), bulk=True, id=c.id, index=index)
     es.flush_bulk(forced=True)
 
 
@@ -0,0 +1,14 @@
+import commonware.log
+from celeryutils import task
+
+from amo.decorators import write
+
+log = commonware.log.getLogger('z.task')
+
+
+@task
+@write
+def rebuild_blocklist(**kw):
+    from .views import rebuild
+    log.info('Rebuilding the blocklist.')
+    rebuild()
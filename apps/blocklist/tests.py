@@ -4,11 +4,13 @@ from xml.dom import minidom
 from django.conf import settings
 from django.core.cache import cache
 
+import mock
 import test_utils
 from nose.tools import eq_
 
 import amo
 from amo.urlresolvers import reverse
+from . import views
 from .models import (BlocklistApp, BlocklistDetail, BlocklistItem,
                      BlocklistGfx, BlocklistPlugin)
 
@@ -54,6 +56,18 @@ class BlocklistItemTest(BlocklistTest):
         response = self.client.get(self.fx4_url)
         eq_(response['Content-Type'], 'text/xml')
 
+    @mock.patch('blocklist.tasks.rebuild_blocklist')
+    def test_change_starts_new_generation(self, rebuild):
+        gen = views.current_generation()
+        BlocklistItem.objects.create(guid='another@addon.com',
+                                     details=self.details)
+        assert views.current_generation() != gen
+        assert rebuild.apply_async.called
+        # The documents are only kept for a bit until the rebuild is done.
+        eq_(views.current_generation().timeout, views.SHORT_TIMEOUT)
+        views.rebuild()
+        eq_(views.current_generation().timeout, views.TIMEOUT)
+
     def test_empty_string_goes_null_on_save(self):
         b = BlocklistItem(guid='guid', min='', max='', os='')
         b.save()
@@ -115,20 +129,48 @@ class BlocklistItemTest(BlocklistTest):
 
     def test_app_guid(self):
         # There's one item for Firefox.
-        r = self.client.get(self.fx4_url)
-        eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 1)
+        items = self.dom(self.fx4_url).getElementsByTagName('emItem')
+        eq_(len(items), 1)
 
         # There are no items for mobile.
-        r = self.client.get(self.mobile_url)
-        eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 0)
+        items = self.dom(self.mobile_url).getElementsByTagName('emItem')
+        eq_(len(items), 0)
 
         # Without the app constraint we see the item.
         self.app.delete()
-        r = self.client.get(self.mobile_url)
+        items = self.dom(self.mobile_url).getElementsByTagName('emItem')
+        eq_(len(items), 1)
+
+    def test_etag(self):
+        r = self.client.get(self.fx4_url)
+        etag = r['ETag']
+        r = self.client.get(self.fx4_url, HTTP_IF_NONE_MATCH=etag)
+        eq_(r.status_code, 304)
+        eq_(r.content, '')
+
+        self.item.update(os='Linux')
+        r = self.client.get(self.fx4_url, HTTP_IF_NONE_MATCH=etag)
+        eq_(r.status_code, 200)
+        assert r['ETag'] != etag
+
+    def test_if_modified_since(self):
+        r = self.client.get(self.fx4_url)
+        r = self.client.get(self.fx4_url,
+                            HTTP_IF_MODIFIED_SINCE=r['Last-Modified'])
+        eq_(r.status_code, 304)
+        r = self.client.get(self.fx4_url, HTTP_IF_MODIFIED_SINCE='Sat, 01 '
+                            'Jan 2000 00:00:00 GMT')
+        eq_(r.status_code, 200)
+
+    def test_if_modified_since_after_delete(self):
+        newest = BlocklistItem.objects.create(guid='newest@addon.com',
+                                              details=self.details)
+        r = self.client.get(self.fx4_url)
+        # The blocklist changed, even though nothing in it is newer.
+        newest.delete()
+        r = self.client.get(self.fx4_url,
+                            HTTP_IF_MODIFIED_SINCE=r['Last-Modified'])
         eq_(r.status_code, 200)
-        eq_(len(r.context['items']), 1)
 
     def test_item_guid(self):
         items = self.dom(self.fx4_url).getElementsByTagName('emItem')
@@ -1,18 +1,21 @@
 import collections
 import hashlib
 from datetime import datetime, timedelta
+from email.Utils import mktime_tz, parsedate_tz
 from operator import attrgetter
 import time
 import uuid
 
+from django import http
 from django.core.cache import cache
 from django.conf import settings
 from django.db.models import Q, signals as db_signals
 from django.shortcuts import get_object_or_404
+from django.utils.http import http_date
 
 import jingo
-import redisutils
 
+import amo
 from amo.utils import sorted_groupby
 from versions.compare import version_int
 from .models import (BlocklistItem, BlocklistPlugin, BlocklistGfx,
@@ -23,16 +26,27 @@ App = collections.namedtuple('App', 'guid min max')
 BlItem = collections.namedtuple('BlItem', 'rows os modified block_id')
 
 
+# The blocklist is cached under a generation that's replaced whenever the
+# blocklist changes, so nothing has to be deleted.  `modified` is when the
+# blocklist changed, for Last-Modified.  Generations rebuild() makes last
+# until the next change; the documents of the ones that are started before a
+# change is committed, or before rebuild() is done, only live for
+# SHORT_TIMEOUT.
+Generation = collections.namedtuple('Generation', 'id modified timeout')
+GENERATION_KEY = 'blocklist:gen'
+TIMEOUT = 60 * 60 * 24 * 7
+SHORT_TIMEOUT = 60 * 5
+
+
 def blocklist(request, apiver, app, appver):
-    key = 'blocklist:%s:%s:%s' % (apiver, app, appver)
-    # Use md5 to make sure the memcached key is clean.
-    key = hashlib.md5(key).hexdigest()
-    response = cache.get(key)
-    if response is None:
-        response = _blocklist(request, apiver, app, appver)
-        cache.set(key, response, 60 * 60)
-        # This gets cleared with the clear_blocklist signal handler.
-        redisutils.connections['master'].sadd('blocklist:keys', key)
+    body, etag, modified = get_document(current_generation(), int(apiver),
+                                        app, appver)
+    if is_not_modified(request, etag, modified):
+        response = http.HttpResponseNotModified()
+    else:
+        response = http.HttpResponse(body, content_type='text/xml')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
     if settings.BLOCKLIST_COOKIE not in request.COOKIES:
         response.set_cookie(settings.BLOCKLIST_COOKIE, uuid.uuid4(),
                             expires=datetime.now() + timedelta(days=5 * 365),
@@ -40,27 +54,113 @@ def blocklist(request, apiver, app, appver):
     return response
 
 
-def _blocklist(request, apiver, app, appver):
-    apiver = int(apiver)
-    items = get_items(apiver, app, appver)[0]
-    plugins = get_plugins(apiver, app, appver)
-    gfxs = BlocklistGfx.objects.filter(Q(guid__isnull=True) | Q(guid=app))
+def is_not_modified(request, etag, modified):
+    """Can we answer a conditional GET with a 304?"""
+    etags = request.META.get('HTTP_IF_NONE_MATCH')
+    if etags:
+        etags = [e.strip() for e in etags.split(',')]
+        return '*' in etags or etag in etags
+    since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if since:
+        since = parsedate_tz(since)
+        return bool(since) and int(modified) <= mktime_tz(since)
+    return False
+
+
+def current_generation():
+    gen = cache.get(GENERATION_KEY)
+    if gen is None:
+        # Whoever gets here first picks the generation for everyone, and
+        # has the real one built in the background.
+        from . import tasks
+        if cache.add(GENERATION_KEY, new_generation(SHORT_TIMEOUT), TIMEOUT):
+            tasks.rebuild_blocklist.delay()
+        gen = cache.get(GENERATION_KEY)
+    return gen
+
+
+def new_generation(timeout=TIMEOUT):
+    """
+    A generation modified after the current one.  Last-Modified only has
+    seconds, so make sure it's at least a second later.
+    """
+    current = cache.get(GENERATION_KEY)
+    modified = int(time.time())
+    if current:
+        modified = max(modified, current.modified + 1)
+    return Generation(uuid.uuid4().hex, modified, timeout)
+
+
+def _key(gen, *args):
+    # Use md5 to make sure the memcached key is clean.
+    return 'blocklist:%s:%s' % (gen.id, hashlib.md5(repr(args)).hexdigest())
+
+
+def get_app_data(gen, app):
+    """The items, plugins and gfx entries for `app`, built once per gen."""
+    key = _key(gen, app)
+    data = cache.get(key)
+    if data is None:
+        gfxs = BlocklistGfx.objects.filter(Q(guid__isnull=True) | Q(guid=app))
+        data = dict(items=get_items(3, app)[0], plugins=get_plugins(3, app),
+                    gfxs=list(gfxs))
+        cache.set(key, data, gen.timeout)
+    return data
+
+
+def get_document(gen, apiver, app, appver):
+    """
+    Returns the blocklist xml, its ETag and when it was last modified (as a
+    timestamp).  Only the old apivers look at appver.
+    """
+    if apiver > 2:
+        appver = None
+    key = _key(gen, apiver, app, appver)
+    doc = cache.get(key)
+    if doc is None:
+        doc = render_document(get_app_data(gen, app), apiver, app, appver)
+        cache.set(key, doc, gen.timeout)
+    body, etag = doc
+    # The rows' dates don't go up when one is deleted or only its apps
+    # change, so they can't be the Last-Modified.
+    return body, etag, gen.modified
+
+
+def render_document(data, apiver, app, appver):
+    items, gfxs = data['items'], data['gfxs']
+    plugins = filter_plugins(data['plugins'], apiver, appver)
     # Find the latest created/modified date across all sections.
     all_ = list(items.values()) + list(plugins) + list(gfxs)
     last_update = max(x.modified for x in all_) if all_ else datetime.now()
+    modified = time.mktime(last_update.timetuple())
+    t = jingo.env.get_template('blocklist/blocklist.xml')
     # The client expects milliseconds, Python's time returns seconds.
-    last_update = int(time.mktime(last_update.timetuple()) * 1000)
-    return jingo.render(request, 'blocklist/blocklist.xml',
-                        dict(items=items, plugins=plugins, gfxs=gfxs,
-                             apiver=apiver, appguid=app, appver=appver,
-                             last_update=last_update),
-                        content_type='text/xml')
+    body = t.render(items=items, plugins=plugins, gfxs=gfxs, apiver=apiver,
+                    appguid=app, appver=appver,
+                    last_update=int(modified * 1000))
+    etag = '"%s"' % hashlib.md5(body.encode('utf-8')).hexdigest()
+    return body, etag
+
+
+def rebuild(apps=None):
+    """
+    Build the blocklist of every app into a new generation and switch to it
+    when it's done, so nobody has to wait on the database for it.  Call it
+    on the master.
+    """
+    gen = new_generation()
+    for app in apps or amo.APP_GUIDS:
+        get_document(gen, 3, app, None)
+    cache.set(GENERATION_KEY, gen, TIMEOUT)
 
 
 def clear_blocklist(*args, **kw):
-    # Something in the blocklist changed; invalidate all responses.
-    keys = redisutils.connections['master'].smembers('blocklist:keys')
-    cache.delete_many(keys)
+    # Something in the blocklist changed.  Move to a short-lived generation
+    # right away so nobody gets the old one, and build the real one from the
+    # master once the change has been committed.
+    from . import tasks
+    cache.set(GENERATION_KEY, new_generation(SHORT_TIMEOUT), TIMEOUT)
+    tasks.rebuild_blocklist.apply_async(countdown=settings.MODIFIED_DELAY)
 
 
 for m in BlocklistItem, BlocklistPlugin, BlocklistGfx, BlocklistApp:
@@ -97,10 +197,14 @@ def get_items(apiver, app, appver=None):
 
 
 def get_plugins(apiver, app, appver=None):
-    # API versions < 3 ignore targetApplication entries for plugins so only
-    # block the plugin if the appver is within the block range.
     plugins = (BlocklistPlugin.uncached.select_related('details')
                .filter(Q(guid__isnull=True) | Q(guid=app)))
+    return filter_plugins(plugins, apiver, appver)
+
+
+def filter_plugins(plugins, apiver, appver=None):
+    # API versions < 3 ignore targetApplication entries for plugins so only
+    # block the plugin if the appver is within the block range.
     if apiver < 3 and appver is not None:
         def between(ver, min, max):
             if not (min and max):
@@ -161,6 +161,8 @@ def extensions(request, category=None, template=None):
     if category:
         addons = addons.filter(categories__id=category.id)
 
+    # The listing doesn't show previews or categories.
+    addons = addons.profile('listing')
     addons = amo.utils.paginate(request, addons, count=addons.count())
     return jingo.render(request, template,
                         {'category': category, 'addons': addons,
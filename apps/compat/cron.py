@@ -28,6 +28,9 @@ def compatibility_report():
 
         rv = dict((k, 0) for k in dict(versions))
         rv['other'] = 0
+        previous = vc.version_int(compat['previous'])
+        keys, vs = zip(*versions)
+        vints = dict(zip(keys, vc.version_ints(vs)))
 
         ignore = (amo.STATUS_NULL, amo.STATUS_DISABLED)
         qs = (Addon.objects.exclude(type=amo.ADDON_PERSONA, status__in=ignore)
@@ -45,14 +48,14 @@ def compatibility_report():
         for addon, count, minver, maxver in addons:
             # Don't count add-ons that weren't compatible with the previous
             # release
-            if maxver < vc.version_int(compat['previous']):
+            if maxver < previous:
                 continue
             if adus < .95 * total:
                 adus += count
             else:
                 break
             for key, version in versions:
-                if minver <= vc.version_int(version) <= maxver:
+                if minver <= vints[key] <= maxver:
                     rv[key] += 1
                     break
             else:
@@ -210,3 +210,7 @@ VERSION_SEARCH = re.compile('\.(\d+)$')
 
 # Editor Tools
 EDITOR_VIEWING_INTERVAL = 8  # How often we ping for "who's watching?"
+
+# Update service: memcache key holding the time an add-on's cached update
+# lookups were last invalidated, keyed by the md5 of the add-on's guid.
+UPDATE_FLUSH_KEY = 'update:flush:%s'
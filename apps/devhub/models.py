@@ -131,6 +131,11 @@ class UserLog(amo.models.ModelBase):
 
 
 class ActivityLogManager(amo.models.ManagerBase):
+
+    def get_query_set(self):
+        qs = super(ActivityLogManager, self).get_query_set()
+        return qs.select_related('user').transform(ActivityLog.transformer)
+
     def for_addons(self, addons):
         if isinstance(addons, Addon):
             addons = (addons,)
@@ -201,29 +206,58 @@ class ActivityLog(amo.models.ModelBase):
         # SafeFormatter escapes everything so this is safe.
         return jinja2.Markup(self.formatter.format(*args, **kw))
 
+    @staticmethod
+    def transformer(logs):
+        # The arguments of all the logs are loaded together the first time
+        # one of them asks, so a page of logs is a query per argument model.
+        for al in logs:
+            al._page = logs
+
+    @staticmethod
+    def load_arguments(logs):
+        decoded, pks = [], {}
+        for al in logs:
+            try:
+                # d is a structure:
+                # ``d = [{'addons.addon'=12}, {'addons.addon'=1}, ... ]``
+                d = [item.items()[0] for item in json.loads(al._arguments)]
+            except:
+                log.debug('unserializing data from addon_log failed: %s'
+                          % al.id)
+                d = None
+            decoded.append(d)
+            for model_name, pk in d or []:
+                if model_name not in ('str', 'int'):
+                    pks.setdefault(model_name, set()).add(pk)
+
+        objects = {}
+        for model_name, ids in pks.items():
+            (app_label, name) = model_name.split('.')
+            model = models.loading.get_model(app_label, name)
+            for obj in model.objects.filter(pk__in=ids):
+                objects[model_name, obj.pk] = obj
+
+        for al, d in zip(logs, decoded):
+            if d is None:
+                al._arguments_cache = None
+                continue
+            objs = []
+            for model_name, pk in d:
+                if model_name in ('str', 'int'):
+                    objs.append(pk)
+                elif (model_name, pk) in objects:
+                    objs.append(objects[model_name, pk])
+            al._arguments_cache = objs
+
     @property
     def arguments(self):
-
-        try:
-            # d is a structure:
-            # ``d = [{'addons.addon'=12}, {'addons.addon'=1}, ... ]``
-            d = json.loads(self._arguments)
-        except:
-            log.debug('unserializing data from addon_log failed: %s' % self.id)
+        if not hasattr(self, '_arguments_cache'):
+            page = getattr(self, '_page', [self])
+            ActivityLog.load_arguments([al for al in page if
+                                        not hasattr(al, '_arguments_cache')])
+        if self._arguments_cache is None:
             return None
-
-        objs = []
-        for item in d:
-            # item has only one element.
-            model_name, pk = item.items()[0]
-            if model_name in ('str', 'int'):
-                objs.append(pk)
-            else:
-                (app_label, model_name) = model_name.split('.')
-                model = models.loading.get_model(app_label, model_name)
-                objs.extend(model.objects.filter(pk=pk))
-
-        return objs
+        return list(self._arguments_cache)
 
     @arguments.setter
     def arguments(self, args=[]):
@@ -238,6 +272,7 @@ class ActivityLog(amo.models.ModelBase):
             args = (args,)
 
         serialize_me = []
+        self.__dict__.pop('_arguments_cache', None)
 
         for arg in args:
             if isinstance(arg, basestring):
@@ -39,6 +39,15 @@ class TestActivityLog(test_utils.TestCase):
         for x in ('Delicious Bookmarks', 'was created.'):
             assert x in unicode(entries[0])
 
+    def test_arguments_loaded_together(self):
+        a = Addon.objects.get()
+        for i in range(3):
+            amo.log(amo.LOG.EDIT_PROPERTIES, a, 'hi')
+        entries = list(ActivityLog.objects.for_addons(a))
+        eq_(entries[0].arguments, [a, 'hi'])
+        self.assertNumQueries(0, lambda: [e.arguments for e in entries[1:]])
+        eq_(entries[-1].arguments, [a, 'hi'])
+
     def test_no_user(self):
         amo.set_user(None)
         count = ActivityLog.objects.count()
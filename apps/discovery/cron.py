@@ -1,22 +1,32 @@
+import collections
 import httplib
 import os
 import shutil
 import time
 import urllib2
+import uuid
 from tempfile import NamedTemporaryFile
 
 from django.conf import settings
+from django.db import connection, transaction
 
 import commonware.log
 from pyquery import PyQuery as pq
+import redisutils
 
 import cronjobs
+from amo.utils import chunked, redis_lock
+from bandwagon.models import SyncedCollection
+from zadmin.models import Config
 
 from .models import BlogCacheRyf
+from .utils import SYNCED_ADDONS, SYNCED_COUNTS
 
 log = commonware.log.getLogger('z.cron')
 
 RYF_IMAGE_PATH = os.path.join(settings.NETAPP_STORAGE, 'ryf')
+# The config key of the last batch flush_synced_collections wrote.
+FLUSHED_BATCH = 'synced_collections_batch'
 
 
 @cronjobs.register
@@ -84,3 +94,103 @@ def fetch_ryf_blog():
 
     page.image = image_basename
     page.save()
+
+
+@cronjobs.register
+def flush_synced_collections():
+    """
+    Write the synced collections recorded by the discovery pane since the
+    last run to the db in bulk.
+    """
+    with redis_lock('flush_synced_collections', 60 * 10) as locked:
+        if locked:
+            _flush_synced_collections()
+
+
+def _flush_synced_collections():
+    redis = redisutils.connections['master']
+    counts_key, addons_key = SYNCED_COUNTS + ':flush', SYNCED_ADDONS + ':flush'
+    batch_key = SYNCED_COUNTS + ':batch'
+    # If the last run died we finish what it had first and get the rest on
+    # the next run. Otherwise take what we have so the views start afresh.
+    # The views only ever add keys, so they're still there for the MULTI.
+    if not redis.exists(counts_key):
+        if not redis.exists(SYNCED_COUNTS):
+            return
+        pipe = redis.pipeline()
+        if redis.exists(SYNCED_ADDONS):
+            pipe.rename(SYNCED_ADDONS, addons_key)
+        pipe.rename(SYNCED_COUNTS, counts_key)
+        pipe.execute()
+    redis.setnx(batch_key, uuid.uuid4().hex)
+    batch = redis.get(batch_key)
+    # The batch id is committed with the counts, so a run that died after
+    # the commit doesn't get counted twice.
+    if Config.objects.filter(key=FLUSHED_BATCH, value=batch).exists():
+        redis.delete(counts_key, addons_key, batch_key)
+        return
+    counts = dict((k, int(v)) for k, v in redis.hgetall(counts_key).items())
+    addons = redis.hgetall(addons_key) or {}
+
+    existing = set()
+    for chunk in chunked(list(set(counts) | set(addons)), 500):
+        existing.update(SyncedCollection.objects.no_cache()
+                        .filter(addon_index__in=chunk)
+                        .values_list('addon_index', flat=True))
+
+    # Create the collections we haven't seen before.
+    new = [i for i in addons if i not in existing]
+    cursor = connection.cursor()
+    for chunk in chunked(new, 500):
+        values = [(i, max(counts.get(i, 0), 0)) for i in chunk]
+        # Another run might have beaten us to some of them.
+        cursor.execute("""
+            INSERT INTO synced_collections
+                (addon_index, count, created, modified)
+            VALUES %s
+            ON DUPLICATE KEY UPDATE count=count + VALUES(count)"""
+            % ','.join(['(%s, %s, NOW(), NOW())'] * len(values)),
+            [v for value in values for v in value])
+        ids = (SyncedCollection.objects.no_cache()
+               .filter(addon_index__in=chunk)
+               .values_list('addon_index', 'id'))
+        rows = ['(%s, %s)' % (addon, id) for index, id in ids
+                for addon in addons[index].split(',')]
+        if rows:
+            cursor.execute("""
+                INSERT IGNORE INTO synced_addons_collections
+                    (addon_id, collection_id)
+                VALUES %s""" % ','.join(rows))
+
+    # Bump the counts of the ones we had, one query for each change.
+    changes = collections.defaultdict(list)
+    lost = {}
+    for index, change in counts.items():
+        if index in existing:
+            changes[change].append(index)
+        elif index not in addons and change > 0:
+            # The add-ons went to the views' new hash while we were swapping
+            # the keys out, so wait for them.
+            lost[index] = change
+    for change, indexes in changes.items():
+        if not change:
+            continue
+        elif change > 0:
+            sql = 'count=count + %s' % change
+        else:
+            sql = 'count=IF(count > %s, count - %s, 0)' % (-change, -change)
+        for chunk in chunked(indexes, 500):
+            cursor.execute("""
+                UPDATE synced_collections SET %s, modified=NOW()
+                WHERE addon_index IN (%s)"""
+                % (sql, ','.join(['%s'] * len(chunk))), chunk)
+    cursor.execute("""
+        INSERT INTO config (`key`, value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE value=VALUES(value)""", [FLUSHED_BATCH, batch])
+    transaction.commit_unless_managed()
+
+    for index, change in lost.items():
+        redis.hincrby(SYNCED_COUNTS, index, change)
+    redis.delete(counts_key, addons_key, batch_key)
+    log.info('Flushed %s synced collections, %s of them new.'
+             % (len(counts), len(new)))
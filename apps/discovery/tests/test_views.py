@@ -7,6 +7,7 @@ import mock
 from nose import SkipTest
 from nose.tools import eq_
 from pyquery import PyQuery as pq
+import redisutils
 import test_utils
 
 import amo
@@ -16,7 +17,7 @@ from addons.models import Addon
 from applications.models import Application, AppVersion
 from bandwagon.models import Collection, SyncedCollection
 from bandwagon.tests.test_models import TestRecommendations as Recs
-from discovery import views
+from discovery import cron, views
 from discovery.forms import DiscoveryModuleForm
 from discovery.models import DiscoveryModule
 from discovery.modules import registry
@@ -157,6 +158,45 @@ class TestRecs(test_utils.TestCase):
         # responses should be identical.
         eq_(one, two)
 
+    @mock.patch('waffle.sample_is_active')
+    def test_store_collections(self, sample_is_active):
+        sample_is_active.return_value = True
+        for x in range(2):
+            r = self.client.post(self.url, self.json,
+                                 content_type='application/json')
+        one = json.loads(r.content)
+        # Nothing is written until the cron runs.
+        eq_(SyncedCollection.objects.count(), 0)
+        cron.flush_synced_collections()
+        c = SyncedCollection.objects.get()
+        eq_(c.addon_index, one['token2'])
+        eq_(c.count, 2)
+        eq_(sorted(c.addons.values_list('id', flat=True)),
+            sorted(views.get_addon_ids(self.guids)))
+
+        # Changing add-ons moves the user to another collection.
+        post_data = json.dumps(dict(guids=self.guids[:1],
+                                    token2=one['token2']))
+        r = self.client.post(self.url, post_data,
+                             content_type='application/json')
+        two = json.loads(r.content)
+        cron.flush_synced_collections()
+        eq_(SyncedCollection.objects.get(addon_index=one['token2']).count, 1)
+        eq_(SyncedCollection.objects.get(addon_index=two['token2']).count, 1)
+
+    @mock.patch('waffle.sample_is_active')
+    def test_flush_twice(self, sample_is_active):
+        sample_is_active.return_value = True
+        self.client.post(self.url, self.json, content_type='application/json')
+        redis = redisutils.connections['master']
+        # The cron dies after it committed but before cleaning up redis.
+        with mock.patch.object(redis, 'delete'):
+            cron.flush_synced_collections()
+        redis.delete('lock:flush_synced_collections')
+        cron.flush_synced_collections()
+        eq_(SyncedCollection.objects.get().count, 1)
+        assert not redis.exists(cron.SYNCED_COUNTS + ':flush')
+
     @mock.patch('api.views')
     def test_update_new_index(self, api_mock):
         raise SkipTest()
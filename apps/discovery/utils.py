@@ -0,0 +1,26 @@
+import commonware.log
+import redisutils
+from redis.exceptions import ConnectionError
+
+log = commonware.log.getLogger('z.disco')
+
+# addon_index -> how many more (or fewer) users have that set of add-ons.
+SYNCED_COUNTS = 'disco:synced:counts'
+# addon_index -> comma-separated add-on ids, for creating new collections.
+SYNCED_ADDONS = 'disco:synced:addons'
+
+
+def record_synced_collection(index, addon_ids, old_index=None):
+    """
+    Remember that somebody has the add-ons in `addon_ids` until the
+    flush_synced_collections cron writes it to SyncedCollections, along with
+    everybody else's.  `old_index` is the set they had before, if any.
+    """
+    redis = redisutils.connections['master']
+    try:
+        if old_index:
+            redis.hincrby(SYNCED_COUNTS, old_index, -1)
+        redis.hincrby(SYNCED_COUNTS, index, 1)
+        redis.hsetnx(SYNCED_ADDONS, index, ','.join(map(str, addon_ids)))
+    except ConnectionError:
+        log.error(u'Could not record synced collection "%s".' % index)
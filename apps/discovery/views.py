@@ -6,8 +6,6 @@ import urlparse
 from django import http
 from django.conf import settings
 from django.contrib import admin
-from django.db import IntegrityError
-from django.db.models import F
 from django.forms.models import modelformset_factory
 from django.shortcuts import get_object_or_404, redirect
 from django.views.decorators.csrf import csrf_exempt
@@ -17,7 +15,6 @@ import jingo
 import waffle
 
 import amo
-import amo.utils
 import api.utils
 import api.views
 from amo.decorators import post_required
@@ -25,13 +22,14 @@ from amo.urlresolvers import reverse
 from addons.decorators import addon_view_factory
 from addons.models import Addon, AddonRecommendation
 from browse.views import personas_listing
-from bandwagon.models import Collection, SyncedCollection
+from bandwagon.models import Collection
 from reviews.models import Review
 from stats.models import GlobalStat
 
 from .models import DiscoveryModule
 from .forms import DiscoveryModuleForm
 from .modules import registry as module_registry
+from .utils import record_synced_collection
 
 addon_view = addon_view_factory(Addon.objects.valid)
 
@@ -167,37 +165,22 @@ def recommendations(request, version, platform, limit=9):
     recs = _recommendations(request, version, platform, limit,
                             index, ids, recs)
 
-    # We're only storing a percentage of the collections we see because the db
-    # can't keep up with 100%.
+    # The disco-pane-store-collections sample controls how much traffic we
+    # record. Everything goes through redis and the
+    # flush_synced_collections cron, so it can be 100%.
     if not waffle.sample_is_active('disco-pane-store-collections'):
         return recs
 
     # Users have a token2 if they've been here before. The token matches
     # addon_index in their SyncedCollection.
-    if 'token2' in POST:
-        token = POST['token2']
-        if token == index:
-            # We've seen them before and their add-ons have not changed.
-            return recs
-        elif token != index:
-            # We've seen them before and their add-ons changed. Remove the
-            # reference to their old synced collection.
-            (SyncedCollection.objects.filter(addon_index=index)
-             .update(count=F('count') - 1))
-
-    # Try to create the SyncedCollection. There's a unique constraint on
-    # addon_index so it will fail if this addon_index already exists. If we
-    # checked for existence first and then created a collection there would
-    # be a race condition between multiple users with the same addon_index.
-    try:
-        c = SyncedCollection.objects.create(addon_index=index, count=1)
-        c.set_addons(addon_ids)
-    except IntegrityError:
-        try:
-            (SyncedCollection.objects.filter(addon_index=index)
-             .update(count=F('count') + 1))
-        except Exception, e:
-            log.error(u'Could not count++ "%s" (%s).' % (index, e))
+    token = POST.get('token2')
+    if token == index:
+        # We've seen them before and their add-ons have not changed.
+        return recs
+    elif addon_ids:
+        # If we've seen them before, their add-ons changed and the old synced
+        # collection loses a user.
+        record_synced_collection(index, addon_ids, old_index=token)
     return recs
 
 
@@ -206,10 +189,11 @@ def _recommendations(request, version, platform, limit, token, ids, qs):
     addons = api.views.addon_filter(qs, 'ALL', limit, request.APP,
                                     platform, version, shuffle=False)
     addons = dict((a.id, a) for a in addons)
-    data = {'token2': token,
-            'addons': [api.utils.addon_to_dict(addons[i], disco=True)
-                       for i in ids if i in addons]}
-    content = json.dumps(data, cls=amo.utils.JSONEncoder)
+    addons = [addons[i] for i in ids if i in addons]
+    # Splice the cached add-on JSON into the response.
+    content = '{"token2": %s, "addons": [%s]}' % (
+        json.dumps(token), ', '.join(api.utils.addons_to_json(addons,
+                                                              disco=True)))
     return http.HttpResponse(content, content_type='application/json')
 
 
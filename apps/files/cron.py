@@ -21,4 +21,8 @@ def cleanup_extracted_file():
         age = time.time() - os.stat(path)[stat.ST_ATIME]
         if (age) > (60 * 60):
             log.info('Removing extracted files: %s, %dsecs old.' % (path, age))
-            shutil.rmtree(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                # The file viewer index for the extracted files.
+                os.remove(path)
@@ -1,12 +1,14 @@
 import codecs
+import json
 import mimetypes
 import os
 import shutil
 import stat
+import tempfile
 
 from django.conf import settings
 from django.utils.datastructures import SortedDict
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_str, smart_unicode
 from django.template.defaultfilters import filesizeformat
 
 import jinja2
@@ -28,6 +30,9 @@ blacklisted_extensions = [b for b in list(blacklisted_extensions)
                             if b != 'sh']
 task_log = commonware.log.getLogger('z.task')
 
+# Bump this if what's in the file viewer index changes.
+INDEX_VERSION = 1
+
 
 @register.function
 def file_viewer_class(value, key):
@@ -66,6 +71,7 @@ class FileViewer:
         self.src = file_obj.file_path
         self.dest = os.path.join(settings.TMP_PATH, 'file_viewer',
                                  str(file_obj.pk))
+        self.index = self.dest + '.json'
         self._files, self.selected = None, None
 
     def __str__(self):
@@ -95,9 +101,17 @@ class FileViewer:
                 task_log.error('Error (%s) extracting %s' % (err, self.src))
                 raise
 
+        # get_files() will try again if the files changed under us.
+        try:
+            self.build_index()
+        except (OSError, IOError), err:
+            task_log.error('Error (%s) indexing %s' % (err, self.dest))
+
     def cleanup(self):
         if os.path.exists(self.dest):
             shutil.rmtree(self.dest)
+        if os.path.exists(self.index):
+            os.remove(self.index)
 
     def is_search_engine(self):
         """Is our file for a search engine?"""
@@ -233,9 +247,13 @@ class FileViewer:
                 return short
         return 'plain'
 
-    @memoize(prefix='file-viewer', time=60 * 60)
-    def _get_files(self):
-        all_files, res = [], SortedDict()
+    def build_index(self):
+        """
+        Walks the extracted files and saves the size, mtime, md5, mimetype
+        and binary flag of each one to the index next to them, so nobody
+        has to stat, hash or sniff the files again.
+        """
+        all_files, entries = [], []
         # Not using os.path.walk so we get just the right order.
 
         def iterate(node):
@@ -247,21 +265,52 @@ class FileViewer:
         iterate(self.dest)
 
         for path in all_files:
-            filename = smart_unicode(os.path.basename(path))
-            short = smart_unicode(path[len(self.dest) + 1:])
-            mime, encoding = mimetypes.guess_type(filename)
+            mime, encoding = mimetypes.guess_type(os.path.basename(path))
             directory = os.path.isdir(path)
-            res[short] = {'binary': self._is_binary(mime, path),
+            stats = os.stat(path)
+            entries.append([smart_unicode(path[len(self.dest) + 1:]),
+                            directory,
+                            stats[stat.ST_SIZE],
+                            stats[stat.ST_MTIME],
+                            get_md5(path) if not directory else '',
+                            mime or 'application/octet-stream',
+                            self._is_binary(mime, path)])
+
+        # Write it somewhere else first so readers never see half of it.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.index))
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'version': INDEX_VERSION, 'files': entries}, fp)
+        os.rename(tmp, self.index)
+        return entries
+
+    def read_index(self):
+        """The entries in the index, building it first if need be."""
+        try:
+            with open(self.index, 'r') as fp:
+                index = json.load(fp)
+            if index['version'] == INDEX_VERSION:
+                return index['files']
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+        return self.build_index()
+
+    @memoize(prefix='file-viewer', time=60 * 60)
+    def _get_files(self):
+        res = SortedDict()
+        for (short, directory, size, modified, md5, mimetype,
+             binary) in self.read_index():
+            filename = os.path.basename(short)
+            res[short] = {'binary': binary,
                           'depth': short.count(os.sep),
                           'directory': directory,
                           'filename': filename,
-                          'full': path,
-                          'md5': get_md5(path) if not directory else '',
-                          'mimetype': mime or 'application/octet-stream',
+                          'full': os.path.join(self.dest, smart_str(short)),
+                          'md5': md5,
+                          'mimetype': mimetype,
                           'syntax': self.get_syntax(filename),
-                          'modified': os.stat(path)[stat.ST_MTIME],
+                          'modified': modified,
                           'short': short,
-                          'size': os.stat(path)[stat.ST_SIZE],
+                          'size': size,
                           'truncated': self.truncate(filename),
                           'url': reverse('files.list',
                                          args=[self.file.id, 'file', short]),
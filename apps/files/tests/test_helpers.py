@@ -15,6 +15,7 @@ import test_utils
 from amo.urlresolvers import reverse
 from files.helpers import FileViewer, DiffHelper
 from files.models import File
+from files.utils import get_md5
 
 root = os.path.join(settings.ROOT, 'apps/files/fixtures/files')
 dictionary = '%s/dictionary-test.xpi' % root
@@ -154,6 +155,7 @@ class TestFileHelper(test_utils.TestCase):
         subdir = os.path.join(dest, 'chrome')
         os.mkdir(subdir)
         open(os.path.join(subdir, 'foo'), 'w')
+        self.viewer.build_index()
         cache.clear()
         files = self.viewer.get_files().keys()
         rt = files.index(u'chrome')
@@ -183,6 +185,31 @@ class TestFileHelper(test_utils.TestCase):
         eq_(res, '')
         assert self.viewer.selected['msg'].startswith('That file no')
 
+    def test_index(self):
+        self.viewer.extract()
+        assert os.path.exists(self.viewer.index)
+        files = self.viewer.get_files()
+        eq_(files['install.js']['md5'], get_md5(files['install.js']['full']))
+
+        # Later requests only read the index.
+        cache.clear()
+        with patch('files.helpers.get_md5') as get_md5_:
+            with patch('os.listdir') as listdir:
+                eq_(self.viewer.get_files().keys(), files.keys())
+        assert not get_md5_.called
+        assert not listdir.called
+
+    def test_index_missing(self):
+        self.viewer.extract()
+        os.remove(self.viewer.index)
+        eq_(len(self.viewer.get_files()), 14)
+        assert os.path.exists(self.viewer.index)
+
+    def test_cleanup_index(self):
+        self.viewer.extract()
+        self.viewer.cleanup()
+        assert not os.path.exists(self.viewer.index)
+
     @patch('files.helpers.get_md5')
     def test_delete_mid_tree(self, get_md5):
         get_md5.side_effect = IOError('ow')
@@ -285,6 +312,7 @@ class TestDiffHelper(test_utils.TestCase):
     def test_diffable_deleted_files(self):
         self.helper.extract()
         os.remove(os.path.join(self.helper.left.dest, 'install.js'))
+        self.helper.left.build_index()
         eq_('install.js' in self.helper.get_deleted_files(), True)
 
     def test_diffable_one_binary_same(self):
@@ -322,6 +350,7 @@ class TestDiffHelper(test_utils.TestCase):
         self.helper.extract()
         self.change(self.helper.left.dest, 'asd',
                     filename='__MACOSX/._dictionaries')
+        self.helper.left.build_index()
         cache.clear()
         files = self.helper.get_files()
         eq_(files['__MACOSX/._dictionaries']['diff'], True)
@@ -266,6 +266,7 @@ class TestFileViewer(FilesBase, test_utils.TestCase):
     def add_file(self, name, contents):
         dest = os.path.join(self.file_viewer.dest, name)
         open(dest, 'w').write(contents)
+        self.file_viewer.build_index()
 
     def test_files_xss(self):
         self.file_viewer.extract()
@@ -392,6 +393,7 @@ class TestDiffViewer(FilesBase, test_utils.TestCase):
     def add_file(self, file_obj, name, contents):
         dest = os.path.join(file_obj.dest, name)
         open(dest, 'w').write(contents)
+        file_obj.build_index()
 
     def file_url(self, file=None):
         args = [self.file.pk, self.file_two.pk]
@@ -432,6 +434,7 @@ class TestDiffViewer(FilesBase, test_utils.TestCase):
     def test_view_one_missing(self):
         self.file_viewer.extract()
         os.remove(os.path.join(self.file_viewer.right.dest, 'install.js'))
+        self.file_viewer.right.build_index()
         res = self.client.get(self.file_url(not_binary))
         doc = pq(res.content)
         eq_(len(doc('pre')), 3)
@@ -441,6 +444,7 @@ class TestDiffViewer(FilesBase, test_utils.TestCase):
         self.file_viewer.extract()
         filename = os.path.join(self.file_viewer.left.dest, 'install.js')
         open(filename, 'w').write('MZ')
+        self.file_viewer.left.build_index()
         res = self.client.get(self.file_url(not_binary))
         assert 'This file is not viewable online' in res.content
 
@@ -448,6 +452,7 @@ class TestDiffViewer(FilesBase, test_utils.TestCase):
         self.file_viewer.extract()
         filename = os.path.join(self.file_viewer.right.dest, 'install.js')
         open(filename, 'w').write('MZ')
+        self.file_viewer.right.build_index()
         assert not self.file_viewer.is_diffable()
         res = self.client.get(self.file_url(not_binary))
         assert 'This file is not viewable online' in res.content
@@ -455,6 +460,7 @@ class TestDiffViewer(FilesBase, test_utils.TestCase):
     def test_different_tree(self):
         self.file_viewer.extract()
         os.remove(os.path.join(self.file_viewer.left.dest, not_binary))
+        self.file_viewer.left.build_index()
         res = self.client.get(self.file_url(not_binary))
         doc = pq(res.content)
         eq_(doc('h4:last').text(), 'Deleted files:')
@@ -1,30 +1,75 @@
+from datetime import datetime
 import logging
 
-from celery.task.sets import TaskSet
-
 import cronjobs
-from amo.utils import chunked
+from amo.utils import chunked, taskset_succeeded
 from addons.models import Addon
+from zadmin.models import get_config, set_config
 
 from . import tasks
 from .models import Review
 
 log = logging.getLogger('z.cron')
 
+# Deleted reviews fix themselves up through Review.post_delete, so the crons
+# only have to look at the reviews created or edited since their last run.
+MARK_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def changed_reviews(key, full=False):
+    """
+    Returns the reviews changed since the last run of the job named `key`, or
+    all of them if `full` or the job never ran, and the mark to save once the
+    run succeeded.
+    """
+    mark, now = get_config(key), datetime.now()
+    qs = Review.objects.no_cache()
+    if mark and not full:
+        qs = qs.filter(modified__gte=datetime.strptime(mark, MARK_FORMAT))
+    return qs, now.strftime(MARK_FORMAT)
+
+
+def run_and_mark(key, mark, subtasks):
+    """Run the subtasks and only move the mark of `key` if all of them worked,
+    so the next run picks up whatever failed."""
+    if taskset_succeeded(subtasks):
+        set_config(key, mark)
+    else:
+        log.error('%s failed, keeping the old mark.' % key)
+
 
 @cronjobs.register
-def reviews_denorm():
-    """Set is_latest and previous_count for all reviews."""
-    pairs = list(set(Review.objects.values_list('addon', 'user')))
+def reviews_denorm(full=False):
+    """Set is_latest and previous_count for recently changed reviews."""
+    reviews, mark = changed_reviews('reviews_denorm_mark', full)
+    pairs = list(set(reviews.values_list('addon', 'user')))
+    log.info('Updating review denorms for %s pairs.' % len(pairs))
     ts = [tasks.update_denorm.subtask(args=chunk)
           for chunk in chunked(pairs, 50)]
-    TaskSet(ts).apply_async()
+    run_and_mark('reviews_denorm_mark', mark, ts)
 
 
 @cronjobs.register
-def addon_reviews_ratings():
-    """Update all add-on total_reviews and average/bayesian ratings."""
-    addons = Addon.objects.values_list('id', flat=True)
+def addon_reviews_ratings(full=False):
+    """
+    Update total_reviews and average/bayesian ratings of the add-ons with
+    recently changed reviews.  Pass `full` to do every add-on.
+    """
+    reviews, mark = changed_reviews('reviews_ratings_mark', full)
+    if full:
+        addons = list(Addon.objects.values_list('id', flat=True))
+    else:
+        addons = sorted(set(reviews.values_list('addon', flat=True)))
+    log.info('Updating review aggregates for %s add-ons.' % len(addons))
     ts = [tasks.cron_review_aggregate.subtask(args=chunk)
           for chunk in chunked(addons, 100)]
-    TaskSet(ts).apply_async()
+    run_and_mark('reviews_ratings_mark', mark, ts)
+
+
+@cronjobs.register
+def addon_reviews_ratings_full():
+    """
+    Bayesian ratings lean on the site-wide averages, which move even for
+    add-ons without new reviews, so every once in a while do all of them.
+    """
+    addon_reviews_ratings(full=True)
@@ -144,12 +144,20 @@ class GroupedRating(object):
 
     @classmethod
     def set(cls, addon, using=None):
-        q = (Review.objects.latest().filter(addon=addon).using(using)
-             .values_list('rating').annotate(models.Count('rating')))
-        counts = dict(q)
-        ratings = [(rating, counts.get(rating, 0)) for rating in range(1, 6)]
+        cls.set_many([addon], using=using)
+
+    @classmethod
+    def set_many(cls, addons, using=None):
+        q = (Review.objects.latest().filter(addon__in=addons).using(using)
+             .order_by().values_list('addon', 'rating')
+             .annotate(models.Count('rating')))
+        counts = dict(((addon, rating), n) for addon, rating, n in q)
+        ratings = dict((cls.key(addon),
+                        [(rating, counts.get((addon, rating), 0))
+                         for rating in range(1, 6)])
+                       for addon in addons)
         two_days = 60 * 60 * 24 * 2
-        cache.set(cls.key(addon), ratings, two_days)
+        cache.set_many(ratings, two_days)
 
 
 class Spam(object):
@@ -1,6 +1,9 @@
+from collections import defaultdict
+import itertools
 import logging
 
-from django.db.models import Count, Avg, F
+from django.db import connection, transaction
+from django.db.models import Avg
 
 import caching.base as caching
 from celeryutils import task
@@ -11,7 +14,7 @@ from .models import Review, GroupedRating
 log = logging.getLogger('z.task')
 
 
-@task(rate_limit='50/m')
+@task(rate_limit='50/m', ignore_result=False)
 def update_denorm(*pairs, **kw):
     """
     Takes a bunch of (addon, user) pairs and sets the denormalized fields for
@@ -20,62 +23,86 @@ def update_denorm(*pairs, **kw):
     log.info('[%s@%s] Updating review denorms.' %
              (len(pairs), update_denorm.rate_limit))
     using = kw.get('using')
-    for addon, user in pairs:
-        reviews = list(Review.objects.valid().no_cache().using(using)
-                       .filter(addon=addon, user=user)
-                       .filter(reply_to=None).order_by('created'))
-        if not reviews:
+    pairs = set(pairs)
+    addons, users = zip(*pairs) if pairs else ((), ())
+    qs = (Review.objects.valid().no_cache().using(using)
+          .filter(addon__in=set(addons), user__in=set(users))
+          .order_by('addon', 'user', 'created')
+          .values_list('id', 'addon', 'user', 'version', 'previous_count',
+                       'is_latest'))
+    # Only write the reviews whose numbers change, grouped by their new
+    # values so it's one UPDATE per group instead of a save() per review.
+    changed = defaultdict(list)
+    for pair, reviews in itertools.groupby(qs, lambda r: r[1:3]):
+        if pair not in pairs:
             continue
-
+        reviews = list(reviews)
         for idx, review in enumerate(reviews):
-            review.previous_count = idx
-            review.is_latest = False
-        reviews[-1].is_latest = True
+            new = (idx, review is reviews[-1])
+            if review[4:] != new:
+                changed[new].append(review)
 
-        for review in reviews:
-            review.save()
+    for (previous_count, is_latest), reviews in changed.items():
+        Review.objects.filter(id__in=[r[0] for r in reviews]).update(
+            previous_count=previous_count, is_latest=is_latest)
+        # The sql update doesn't invalidate anything, do it manually.
+        Review.objects.invalidate(*[Review(id=id, addon_id=addon,
+                                           user_id=user, version_id=version)
+                                    for id, addon, user, version, _, _
+                                    in reviews])
 
 
 @task
 def addon_review_aggregates(*addons, **kw):
-    log.info('[%s@%s] Updating total reviews.' %
-             (len(addons), addon_review_aggregates.rate_limit))
-    using = kw.get('using')
-    stats = dict(Review.objects.latest().filter(addon__in=addons)
-                 .using(using).values_list('addon').annotate(Count('addon')))
-    for addon in addons:
-        count = stats.get(addon, 0)
-        Addon.objects.filter(id=addon).update(total_reviews=count)
-
-    log.info('[%s@%s] Updating average ratings.' %
+    log.info('[%s@%s] Updating total reviews and average ratings.' %
              (len(addons), addon_review_aggregates.rate_limit))
-    stats = dict(Review.objects.valid().filter(addon__in=addons)
-                 .using(using).values_list('addon').annotate(Avg('rating')))
-    for addon in addons:
-        avg = stats.get(addon, 0)
-        Addon.objects.filter(id=addon).update(average_rating=avg)
+    if addons:
+        # Add-ons without valid reviews go back to 0.
+        ids = ','.join(map(str, map(int, addons)))
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE addons LEFT JOIN (
+                SELECT addon_id, SUM(is_latest) AS total,
+                       AVG(rating) AS average
+                FROM reviews
+                WHERE addon_id IN (%s) AND reply_to IS NULL AND rating > 0
+                GROUP BY addon_id) AS r ON addons.id = r.addon_id
+            SET addons.totalreviews = COALESCE(r.total, 0),
+                addons.averagerating = COALESCE(r.average, 0)
+            WHERE addons.id IN (%s)""" % (ids, ids))
+        transaction.commit_unless_managed()
+        _invalidate_addons(addons)
 
     # Delay bayesian calculations to avoid slave lag.
     addon_bayesian_rating.apply_async(args=addons, countdown=5)
-    addon_grouped_rating.apply_async(args=addons, kwargs={'using': using})
+    addon_grouped_rating.apply_async(args=addons,
+                                     kwargs={'using': kw.get('using')})
 
 
 @task
 def addon_bayesian_rating(*addons, **kw):
     log.info('[%s@%s] Updating bayesian ratings.' %
              (len(addons), addon_bayesian_rating.rate_limit))
+    if not addons:
+        return
     f = lambda: Addon.objects.aggregate(rating=Avg('average_rating'),
                                         reviews=Avg('total_reviews'))
     avg = caching.cached(f, 'task.bayes.avg', 60 * 60 * 60)
     mc = avg['reviews'] * avg['rating']
-    for addon in Addon.uncached.filter(id__in=addons):
-        q = Addon.objects.filter(id=addon.id)
-        if addon.total_reviews:
-            num = mc + F('total_reviews') * F('average_rating')
-            denom = avg['reviews'] + F('total_reviews')
-            q.update(bayesian_rating=num / denom)
-        else:
-            q.update(bayesian_rating=0)
+    cursor = connection.cursor()
+    cursor.execute("""
+        UPDATE addons
+        SET bayesianrating = IF(totalreviews > 0,
+            (%%s + totalreviews * averagerating) / (%%s + totalreviews), 0)
+        WHERE id IN (%s)""" % ','.join(map(str, map(int, addons))),
+        [mc, avg['reviews']])
+    transaction.commit_unless_managed()
+    _invalidate_addons(addons)
+
+
+def _invalidate_addons(ids):
+    # All our updates were sql, so invalidate manually.
+    Addon.objects.invalidate(*[Addon(id=id) for id in ids])
 
 
 @task
@@ -84,12 +111,10 @@ def addon_grouped_rating(*addons, **kw):
     # We stick this all in memcached since it's not critical.
     log.info('[%s@%s] Updating addon grouped ratings.' %
              (len(addons), addon_grouped_rating.rate_limit))
-    using = kw.get('using')
-    for addon in addons:
-        GroupedRating.set(addon, using=using)
+    GroupedRating.set_many(addons, using=kw.get('using'))
 
 
-@task(rate_limit='10/m')
+@task(rate_limit='10/m', ignore_result=False)
 def cron_review_aggregate(*addons, **kw):
     log.info('[%s@%s] Updating addon review aggregates.' %
              (len(addons), cron_review_aggregate.rate_limit))
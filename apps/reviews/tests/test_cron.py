@@ -52,6 +52,33 @@ class TestDenormalization(test_utils.TestCase):
         cron.addon_reviews_ratings()
         self._check_addon()
 
+    def test_cron_review_aggregate_incremental(self):
+        cron.addon_reviews_ratings()
+        self._check_addon()
+
+        # Only add-ons with changed reviews are looked at.
+        Addon.objects.update(total_reviews=0)
+        cron.addon_reviews_ratings()
+        eq_(Addon.uncached.get(id=72).total_reviews, 0)
+
+        Review.objects.all()[0].save()
+        cron.addon_reviews_ratings()
+        self._check_addon()
+
+        Addon.objects.update(total_reviews=0)
+        cron.addon_reviews_ratings(full=True)
+        self._check_addon()
+
+    @mock.patch('reviews.cron.taskset_succeeded')
+    def test_failed_run_keeps_mark(self, succeeded):
+        succeeded.return_value = False
+        cron.addon_reviews_ratings()
+
+        # Nothing changed, but the last run didn't make it so look again.
+        succeeded.side_effect = lambda ts: [t.apply() for t in ts]
+        cron.addon_reviews_ratings()
+        self._check_addon()
+
     def test_deleted_reviews(self):
         "If all reviews are deleted, reviews and ratings should be cleared."
         tasks.addon_review_aggregates(72, 3)
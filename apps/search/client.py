@@ -1,16 +1,22 @@
 from collections import defaultdict
+import hashlib
 import os
 import random
 import re
 import socket
+import threading
+import time
+import weakref
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from django.utils import translation
 from django.utils.encoding import smart_unicode
 
 import commonware.log
 import sphinxapi as sphinx
+from statsd import statsd
 
 import amo
 from amo.models import manual_order
@@ -20,7 +26,7 @@ from translations.query import order_by_translation
 from tags.models import Tag
 from versions.models import AppVersion
 
-from .utils import convert_version, crc32
+from .utils import convert_version, crc32, GENERATION_KEY
 
 m_dot_n_re = re.compile(r'^\d+\.\d+$')
 
@@ -39,6 +45,8 @@ log = commonware.log.getLogger('z.sphinx')
 SEARCHABLE_STATUSES = (amo.STATUS_PUBLIC, amo.STATUS_LITE,
                        amo.STATUS_LITE_AND_NOMINATED)
 
+_pool = threading.local()
+
 
 def extract_filters(term, kwargs):
     """
@@ -145,6 +153,88 @@ def extract_filters(term, kwargs):
     return (term, filters, excludes)
 
 
+def query_key(kind, term, limit, offset, kwargs):
+    """
+    Build a cache key for a query from everything that changes its results:
+    the term, options like filters, sort, app and version, the page and the
+    current locale.
+    """
+    opts = []
+    for k, v in sorted(kwargs.items()):
+        if isinstance(v, (list, tuple, set)):
+            v = tuple(sorted(v))
+        opts.append((k, v))
+    parts = (kind, u' '.join(term.split()), limit, offset, opts,
+             translation.get_language(), cache.get(GENERATION_KEY, 0))
+    return 'search:%s' % hashlib.md5(repr(parts)).hexdigest()
+
+
+def coalesce(key, fn):
+    """
+    Return the cached value for `key`, or call `fn` to get and cache it.
+
+    Only one caller at a time runs `fn` for a key.  The others wait for its
+    result for up to SEARCH_LOCK_TIMEOUT seconds instead of sending sphinx
+    the same query.
+    """
+    if not settings.SEARCH_CACHE_TIMEOUT:
+        return fn()
+
+    rv = cache.get(key)
+    if rv is not None:
+        return rv
+
+    lock, waited, step = key + ':lock', 0, .05
+    locked = cache.add(lock, 1, settings.SEARCH_LOCK_TIMEOUT)
+    while not locked and waited < settings.SEARCH_LOCK_TIMEOUT:
+        time.sleep(step)
+        waited += step
+        rv = cache.get(key)
+        if rv is not None:
+            return rv
+        # The other query failed or finished without caching anything.
+        locked = cache.add(lock, 1, settings.SEARCH_LOCK_TIMEOUT)
+
+    try:
+        rv = fn()
+        cache.set(key, rv, settings.SEARCH_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return rv
+
+
+def get_sphinx(owner, host, port):
+    """
+    Return a SphinxClient for `owner` to search searchd at host:port with.
+
+    With settings.SPHINX_PERSISTENT each thread keeps its clients and their
+    open connections between searches, so we don't pay for a connect and
+    handshake every time.  A client is handed out again, with its settings
+    reset, once the owner it was lent to has gone away.
+    """
+    if not settings.SPHINX_PERSISTENT:
+        sc = sphinx.SphinxClient()
+        sc.SetServer(host, port)
+        return sc
+
+    if not hasattr(_pool, 'clients'):
+        _pool.clients = {}
+    # {(class, host, port): [(client, weakref to owner)]}
+    clients = _pool.clients.setdefault((sphinx.SphinxClient, host, port), [])
+    for i, (sc, ref) in enumerate(clients):
+        if ref() is None:
+            sc.Reset()
+            clients[i] = (sc, weakref.ref(owner))
+            return sc
+
+    sc = sphinx.SphinxClient()
+    sc.SetServer(host, port)
+    sc.Open()
+    clients.append((sc, weakref.ref(owner)))
+    return sc
+
+
 def get_locale_ord():
     return crc32(settings.LANGUAGE_URL_MAP.get(translation.get_language())
                  or translation.get_language())
@@ -227,13 +317,11 @@ class SearchError(Exception):
 class Client(object):
     """A search client that queries sphinx for addons."""
     def __init__(self):
-        self.sphinx = sphinx.SphinxClient()
-
         if os.environ.get('DJANGO_ENVIRONMENT') == 'test':
-            self.sphinx.SetServer(settings.SPHINX_HOST,
-                                  settings.TEST_SPHINX_PORT)
+            port = settings.TEST_SPHINX_PORT
         else:
-            self.sphinx.SetServer(settings.SPHINX_HOST, settings.SPHINX_PORT)
+            port = settings.SPHINX_PORT
+        self.sphinx = get_sphinx(self, settings.SPHINX_HOST, port)
 
         self.weight_field = ('@weight + IF(addon_status=%d, 3500, 0) + '
                              'IF(locale_ord=%d, 29, 0) + '
@@ -283,6 +371,18 @@ class Client(object):
         debug('Limit: %d' % self.sphinx._limit)
         debug('Offset: %d' % self.sphinx._offset)
 
+    def log_timing(self):
+        """Logs how much of the last search was spent in searchd."""
+        timing = self.sphinx.GetLastTiming()
+        if not timing:
+            return
+        roundtrip, server = timing
+        network = max(roundtrip - server, 0)
+        statsd.timing('sphinx.searchd', int(server * 1000))
+        statsd.timing('sphinx.network', int(network * 1000))
+        log.debug('%d Time: %.3fs searchd, %.3fs network'
+                  % (self.id, server, network))
+
     def restrict_version(self, version):
         """
         Restrict a search to a specific version.
@@ -350,6 +450,26 @@ class Client(object):
         """
         Queries sphinx for a term, and parses specific options.
 
+        The add-on ids and meta data found are cached for a short while, see
+        `_query` for the options.
+        """
+        key = query_key('addons', term, limit, offset, kwargs)
+        rv = coalesce(key, lambda: self._query(term, limit, offset, **kwargs))
+        self.total_found = rv['total_found']
+        self.meta.update(rv['meta'])
+
+        if not rv['addon_ids']:
+            return []
+        addons = manual_order(Addon.objects.all(), rv['addon_ids'])
+        return ResultSet(addons, min(self.total_found, SPHINX_HARD_LIMIT),
+                         offset)
+
+    def _query(self, term, limit=10, offset=0, **kwargs):
+        """
+        Queries sphinx for a term, and parses specific options.
+
+        Returns a dict of the add-on ids found, total_found and meta data.
+
         The following kwargs will do things:
 
         limit: limits the number of results.
@@ -464,32 +584,37 @@ class Client(object):
 
         if sc.GetLastError():
             raise SearchError(sc.GetLastError())
+        self.log_timing()
 
-        # Handle any meta data we have.
+        # Handle any meta data we have.  Querysets are evaluated so they can
+        # be cached.
+        meta = {}
         if 'meta' in kwargs:
             if 'versions' in kwargs['meta']:
-                self.meta['versions'] = self._versions_meta(results, **kwargs)
+                meta['versions'] = self._versions_meta(results, **kwargs)
             if 'categories' in kwargs['meta']:
-                self.meta['categories'] = self._categories_meta(results,
-                                                                **kwargs)
+                meta['categories'] = list(self._categories_meta(results,
+                                                                **kwargs))
             if 'tags' in kwargs['meta']:
-                self.meta['tags'] = self._tags_meta(results, **kwargs)
+                meta['tags'] = list(self._tags_meta(results, **kwargs))
 
             if 'platforms' in kwargs['meta']:
-                self.meta['platforms'] = self._platforms_meta(results,
-                                                              **kwargs)
+                meta['platforms'] = self._platforms_meta(results, **kwargs)
 
         result = results[self.queries['primary']]
-        self.total_found = result.get('total_found', 0) if result else 0
+        rv = {'addon_ids': [], 'meta': meta,
+              'total_found': result.get('total_found', 0) if result else 0}
 
         if result.get('error'):
             log.warning(result['error'])
-            return []  # Fail silently.
+            return rv  # Fail silently.
 
         if result and result['total']:
-            return self.get_result_set(term, result, offset, limit)
-        else:
-            return []
+            rv['addon_ids'] = [m['attrs']['addon_id']
+                               for m in result['matches']]
+            log.debug([(m['attrs']['addon_id'], m['attrs'].get('myweight'))
+                       for m in result['matches']])
+        return rv
 
     def _versions_meta(self, results, **kwargs):
         # We don't care about the first 10 digits, since
@@ -603,6 +728,7 @@ class PersonasClient(Client):
 
         if sc.GetLastError():
             raise SearchError(sc.GetLastError())
+        self.log_timing()
 
         self.total_found = result['total_found'] if result else 0
 
@@ -658,6 +784,7 @@ class CollectionsClient(Client):
 
         if sc.GetLastError():
             raise SearchError(sc.GetLastError())
+        self.log_timing()
 
         self.total_found = result['total_found'] if result else 0
 
@@ -17,6 +17,8 @@ import sys
 import select
 import socket
 import re
+import struct
+import time
 from struct import *
 
 
@@ -108,6 +110,15 @@ class SphinxClient:
         self._port          = 9312                          # searchd port (default is 9312)
         self._path          = None                          # searchd unix-domain socket path
         self._socket        = None
+        self._persistent    = False                         # reopen the connection with Open() if it drops
+        self._timing        = None                          # (round trip, searchd time) of the last RunQueries()
+        self.Reset()
+
+
+    def Reset (self):
+        """
+        Restore the query settings to their defaults, keeping the server and connection.
+        """
         self._offset        = 0                             # how much records to seek from result-set start (default is 0)
         self._limit         = 20                            # how much records to return from result-set starting at offset (default is 20)
         self._mode          = SPH_MATCH_ALL                 # query matching mode (default is SPH_MATCH_ALL)
@@ -137,6 +148,7 @@ class SphinxClient:
         self._warning       = ''                            # last warning message
         self._reqs          = []                            # requests array for multi-query
 
+
     def __del__ (self):
         if self._socket:
             self._socket.close()
@@ -156,6 +168,13 @@ class SphinxClient:
         return self._warning
 
 
+    def GetLastTiming (self):
+        """
+        Get (round trip, searchd time) in seconds for the last RunQueries(), or None.
+        """
+        return self._timing
+
+
     def SetServer (self, host, port = None):
         """
         Set searchd server host and port.
@@ -189,6 +208,19 @@ class SphinxClient:
             self._socket.close()
             self._socket = None
 
+        sock = self._NewSocket()
+        if sock and self._persistent:
+            # command, command version = 0, body length = 4, body = 1
+            sock.send ( pack ( '>hhII', SEARCHD_COMMAND_PERSIST, 0, 4, 1 ) )
+            self._socket = sock
+        return sock
+
+
+    def _NewSocket (self):
+        """
+        INTERNAL METHOD, DO NOT CALL. Opens a connection and does the handshake.
+        """
+        sock = None
         try:
             if self._path:
                 af = socket.AF_UNIX
@@ -600,17 +632,35 @@ class SphinxClient:
             self._error = 'no queries defined, issue AddQuery() first'
             return None
 
-        sock = self._Connect()
-        if not sock:
-            return None
-
         req = ''.join(self._reqs)
         length = len(req)+4
         req = pack('>HHLL', SEARCHD_COMMAND_SEARCH, VER_COMMAND_SEARCH, length, len(self._reqs))+req
-        sock.send(req)
 
-        response = self._GetResponse(sock, VER_COMMAND_SEARCH)
+        # a persistent connection can die between the health check and the
+        # request (searchd restarts, idle timeouts), so reconnect once
+        for retry in (False, True):
+            sock = self._Connect()
+            if not sock:
+                return None
+
+            start = time.time()
+            try:
+                sock.send(req)
+                response = self._GetResponse(sock, VER_COMMAND_SEARCH)
+            except socket.timeout:
+                self._Drop()
+                raise
+            except (socket.error, struct.error):
+                self._Drop()
+                if retry or not self._persistent:
+                    raise
+                continue
+            break
+
+        roundtrip = time.time() - start
         if not response:
+            # a short reply leaves the stream out of step, so start over
+            self._Drop()
             return None
 
         nreqs = len(self._reqs)
@@ -726,6 +776,8 @@ class SphinxClient:
                 result['words'].append({'word':word, 'docs':docs, 'hits':hits})
 
         self._reqs = []
+        server = sum(float(r.get('time', 0)) for r in results)
+        self._timing = (roundtrip, server)
         return results
 
 
@@ -948,27 +1000,33 @@ class SphinxClient:
     ### persistent connections
 
     def Open(self):
+        """
+        Keep one connection to searchd open for all the following requests.
+        If it drops it's reopened on the next request.
+        """
         if self._socket:
             self._error = 'already connected'
             return
 
-        server = self._Connect()
-        if not server:
-            return
-
-        # command, command version = 0, body length = 4, body = 1
-        request = pack ( '>hhII', SEARCHD_COMMAND_PERSIST, 0, 4, 1 )
-        server.send ( request )
-
-        self._socket = server
+        self._persistent = True
+        return self._Connect()
 
     def Close(self):
+        self._persistent = False
         if not self._socket:
             self._error = 'not connected'
             return
         self._socket.close()
         self._socket = None
 
+    def _Drop(self):
+        """
+        INTERNAL METHOD, DO NOT CALL. Forgets a broken persistent connection.
+        """
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
     def EscapeString(self, string):
         return re.sub(r"([=\(\)|\-!@~\"&/\\\^\$\=])", r"\\\1", string)
 
@@ -67,6 +67,55 @@ def test_sphinx_timeout(sphinx_mock):
     assert_raises(SearchError, cquery, 'xxx')
 
 
+@mock.patch('search.client.sphinx.SphinxClient')
+def test_query_cached(sphinx_mock):
+    sphinx_mock._filters = []
+    sphinx_mock._limit = 10
+    sphinx_mock._offset = 0
+    sphinx_mock.return_value = sphinx_mock
+    sphinx_mock.GetLastError.return_value = ''
+    sphinx_mock.GetLastTiming.return_value = (.01, .004)
+    sphinx_mock.RunQueries.return_value = [{'total': 0, 'total_found': 0}]
+
+    c = SearchClient()
+    eq_(c.query('cached  term', app=1, status=[4, 1]), [])
+    eq_(sphinx_mock.RunQueries.call_count, 1)
+    # Same query, different whitespace and option order.
+    eq_(SearchClient().query('cached term', status=[1, 4], app=1), [])
+    eq_(sphinx_mock.RunQueries.call_count, 1)
+
+    SearchClient().query('cached term', app=1, sort='newest')
+    eq_(sphinx_mock.RunQueries.call_count, 2)
+
+    translation.activate('de')
+    try:
+        SearchClient().query('cached term', app=1, status=[1, 4])
+        eq_(sphinx_mock.RunQueries.call_count, 3)
+    finally:
+        translation.deactivate()
+
+
+@mock.patch.object(settings, 'SPHINX_PERSISTENT', True)
+@mock.patch('search.client.sphinx.SphinxClient')
+def test_sphinx_pool(sphinx_mock):
+    sphinx_mock.side_effect = lambda: mock.Mock()
+
+    c = SearchClient()
+    eq_(c.sphinx.Open.call_count, 1)
+    # The first client is still using its connection.
+    other = SearchClient()
+    assert other.sphinx is not c.sphinx
+    eq_(sphinx_mock.call_count, 2)
+
+    sc = c.sphinx
+    del c
+    c = SearchClient()
+    assert c.sphinx is sc
+    eq_(sc.Reset.call_count, 1)
+    eq_(sc.Open.call_count, 1)
+    eq_(sphinx_mock.call_count, 2)
+
+
 class CollectionsSearchTest(SphinxTestCase):
     fixtures = ('base/collection_57181', 'base/apps',)
 
@@ -3,12 +3,16 @@ import zlib
 import re
 
 from django.conf import settings
+from django.core.cache import cache
 
 import amo
 from versions.compare import version_re
 
 call = lambda x: subprocess.Popen(x, stdout=subprocess.PIPE).communicate()
 
+# Bumped on every reindex so cached search results are dropped.
+GENERATION_KEY = 'search:generation'
+
 
 def reindex(rotate=False):
     """
@@ -22,6 +26,10 @@ def reindex(rotate=False):
         calls.append('--rotate')
 
     call(calls)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1)
 
 
 def start_sphinx():
@@ -6,10 +6,11 @@ import commonware.log
 from celery.task.sets import TaskSet
 
 import cronjobs
-from amo.utils import chunked
+from amo.utils import chunked, taskset_succeeded
 from addons.models import Addon
+from .db import ROLLUP_PERIODS, rollup_mark, set_rollup_mark
 from .models import (AddonCollectionCount, CollectionCount,
-                     UpdateCount)
+                     DownloadCount, UpdateCount)
 from . import tasks
 
 task_log = commonware.log.getLogger('z.task')
@@ -62,3 +63,36 @@ def addon_total_contributions():
     ts = [tasks.cron_total_contributions.subtask(args=chunk)
           for chunk in chunked(addons, 100)]
     TaskSet(ts).apply_async()
+
+
+@cronjobs.register
+def update_stats_rollups():
+    """Roll new daily download and update counts into weekly/monthly sums.
+
+    Periods with daily rows newer than the model's rollup mark are
+    recomputed, and the mark only moves once every chunk has succeeded, so
+    run this after the daily counts are imported.  Until the first run
+    finishes there is no mark and the stats pages sum daily rows; that
+    first run rolls up everything and is the backfill.
+    """
+    for model in (DownloadCount, UpdateCount):
+        name = model._meta.object_name
+        mark = rollup_mark(model)
+        seen = mark[0] if mark else 0
+        top = model.objects.aggregate(id=Max('id'), date=Max('date'))
+        if not top['id'] or top['id'] <= seen:
+            continue
+        days = (model.objects.filter(id__gt=seen, id__lte=top['id'])
+                .values_list('addon', 'date').distinct())
+        keys = set()
+        for addon, day in days:
+            for period, (current_period, _) in ROLLUP_PERIODS.items():
+                keys.add((addon, period, current_period(day)[0]))
+        task_log.info('Rolling up %s periods of %s.' % (len(keys), name))
+        ts = [tasks.update_rollups.subtask(args=[name, chunk])
+              for chunk in chunked(sorted(keys), 100)]
+        if taskset_succeeded(ts):
+            set_rollup_mark(model, top['id'], top['date'])
+        else:
+            task_log.error('Rolling up %s failed, keeping the mark at %s.'
+                           % (name, seen))
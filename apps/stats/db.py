@@ -1,8 +1,9 @@
 import calendar
 from datetime import date, timedelta
 from decimal import Decimal, DivisionByZero
+from itertools import chain
 
-from django.db import models
+from django.db import connection, models
 
 import phpserialize as php
 try:
@@ -12,6 +13,8 @@ except ImportError:
 
 import caching.base
 
+from amo.fields import DecimalCharField
+
 
 # Common date helpers
 # These all take a date or datetime and return a date.
@@ -51,6 +54,59 @@ def period_of_day(d):
     return date(d.year, d.month, d.day), date(d.year, d.month, d.day)
 
 
+# SQL for the first day of the period containing a date or datetime column,
+# matching the period_of_* functions above.
+PERIOD_SQL = {
+    period_of_day: 'DATE(%(col)s)',
+    period_of_week: 'DATE_SUB(DATE(%(col)s), INTERVAL WEEKDAY(%(col)s) DAY)',
+    period_of_month: ('DATE_SUB(DATE(%(col)s), '
+                      'INTERVAL DAYOFMONTH(%(col)s) - 1 DAY)'),
+}
+
+# Periods kept in rollup tables, with their current and previous periods.
+ROLLUP_PERIODS = {
+    'week': (period_of_week, prev_week_period),
+    'month': (period_of_month, prev_month_period),
+}
+
+# Rollup tables can stand in for querysets filtered on nothing but these.
+ROLLUP_FILTERS = ('addon', 'addon_id', 'date__range')
+
+# Rollup table columns that aren't sums of the daily table's columns.
+ROLLUP_KEYS = ('id', 'addon', 'period', 'date', 'n_rows', 'max_id')
+
+
+# Config key for the daily row id and date a model's rollups are complete
+# through.
+ROLLUP_MARK = 'stats_rollup_mark:%s'
+
+
+def rollup_fields(rollup):
+    """Names of the daily fields summed up in a rollup model."""
+    return [f.name for f in rollup._meta.fields if f.name not in ROLLUP_KEYS]
+
+
+def rollup_mark(model):
+    """
+    The (daily row id, date) that update_stats_rollups finished rolling
+    `model` up through, or None if it hasn't yet.
+    """
+    # get_config() is memoized forever, but the cron moves the mark.
+    from zadmin.models import Config
+    try:
+        mark = json.loads(Config.objects.get(
+            key=ROLLUP_MARK % model._meta.object_name).value)
+    except Config.DoesNotExist:
+        return None
+    return mark['id'], date(*map(int, mark['date'].split('-')))
+
+
+def set_rollup_mark(model, id, day):
+    from zadmin.models import set_config
+    set_config(ROLLUP_MARK % model._meta.object_name,
+               json.dumps({'id': id, 'date': day.isoformat()}))
+
+
 class StatsAggregate(object):
     """Base class for StatsQuerySet aggregation. """
 
@@ -165,6 +221,23 @@ class StatsQuerySet(caching.base.CachingQuerySet):
     def __init__(self, *args, **kwargs):
         super(StatsQuerySet, self).__init__(*args, **kwargs)
         self._stats_date_field = kwargs['model'].stats_date_field
+        # The filters applied so far, while rollups could answer them.
+        self._rollup_filters = {}
+
+    def _clone(self, *args, **kwargs):
+        c = super(StatsQuerySet, self)._clone(*args, **kwargs)
+        c._rollup_filters = self._rollup_filters
+        return c
+
+    def filter(self, *args, **kwargs):
+        qs = super(StatsQuerySet, self).filter(*args, **kwargs)
+        filters = self._rollup_filters
+        if (filters is None or args or set(kwargs) - set(ROLLUP_FILTERS)
+            or set(kwargs) & set(filters)):
+            qs._rollup_filters = None
+        else:
+            qs._rollup_filters = dict(filters, **kwargs)
+        return qs
 
     def summary(self, *fields, **kwargs):
         """Summarizes the entire queryset.
@@ -186,12 +259,25 @@ class StatsQuerySet(caching.base.CachingQuerySet):
         fields = self._map_fields(*fields, **kwargs)
         summary = self.zero_summary(**fields)
         self._reset_aggregates(summary, **fields)
-        for obj in self:
-            self._accumulate_aggregates(obj, **fields)
 
-        # Replace start/end with our computed First/Last values.
-        summary[self._start_key] = fields['_tricky_start'].final_result()
-        summary[self._end_key] = fields['_tricky_end'].final_result()
+        # Let the db do the adding up if it can.
+        aggregates = self._db_aggregates(
+            dict((k, f) for k, f in fields.items()
+                 if k not in ('_tricky_start', '_tricky_end')))
+        if aggregates is not None:
+            aggregates['_tricky_start'] = models.Min(self._stats_date_field)
+            aggregates['_tricky_end'] = models.Max(self._stats_date_field)
+            row = self._db_aggregate_row(aggregates)
+            self._load_aggregates(row, **fields)
+            summary[self._start_key] = row['_tricky_start']
+            summary[self._end_key] = row['_tricky_end']
+        else:
+            for row in self._rows(fields):
+                self._accumulate_aggregates(row, **fields)
+
+            # Replace start/end with our computed First/Last values.
+            summary[self._start_key] = fields['_tricky_start'].final_result()
+            summary[self._end_key] = fields['_tricky_end'].final_result()
 
         # Now other aggregates will be able to use day count.
         self._finalize_aggregates(summary, **fields)
@@ -210,7 +296,12 @@ class StatsQuerySet(caching.base.CachingQuerySet):
         """
         summaries = {'day': self.daily_summary, 'week': self.weekly_summary,
                      'month': self.monthly_summary}
-        return summaries[period](*fields, **kwargs)
+        summarize = summaries[period]
+        if period in ROLLUP_PERIODS:
+            rolled = self._rollup_summary(period, *fields, **kwargs)
+            if rolled is not None:
+                return rolled
+        return summarize(*fields, **kwargs)
 
     def daily_summary(self, *fields, **kwargs):
         """Generate daily/weekly/monthly summaries on the queryset.
@@ -222,6 +313,9 @@ class StatsQuerySet(caching.base.CachingQuerySet):
                 If True, create zero count summaries for periods in the
                 middle of the queryset that contain no records
 
+            oldest_first
+                If True, generate the summaries in chronological order
+
         All other arguments should be the names of summable fields found
         in the queryset. Fields may be renamed in the results by using
         named arguments, for example:
@@ -233,22 +327,28 @@ class StatsQuerySet(caching.base.CachingQuerySet):
           'swallows': 10, 'dead_parrots': 5}]
         """
         fill_holes = kwargs.pop('fill_holes', False)
+        oldest_first = kwargs.pop('oldest_first', False)
         fields = self._map_fields(*fields, **kwargs)
-        return self._summary_iter(fields, fill_holes=fill_holes)
+        return self._summary_iter(fields, fill_holes=fill_holes,
+                                  oldest_first=oldest_first)
 
     def weekly_summary(self, *fields, **kwargs):
         fill_holes = kwargs.pop('fill_holes', False)
+        oldest_first = kwargs.pop('oldest_first', False)
         fields = self._map_fields(*fields, **kwargs)
         return self._summary_iter(fields, fill_holes=fill_holes,
-            previous_period=prev_week_period, current_period=period_of_week)
+            previous_period=prev_week_period, current_period=period_of_week,
+            oldest_first=oldest_first)
 
     weekly_summary.__doc__ = daily_summary.__doc__
 
     def monthly_summary(self, *fields, **kwargs):
         fill_holes = kwargs.pop('fill_holes', False)
+        oldest_first = kwargs.pop('oldest_first', False)
         fields = self._map_fields(*fields, **kwargs)
         return self._summary_iter(fields, fill_holes=fill_holes,
-            previous_period=prev_month_period, current_period=period_of_month)
+            previous_period=prev_month_period, current_period=period_of_month,
+            oldest_first=oldest_first)
 
     monthly_summary.__doc__ = daily_summary.__doc__
 
@@ -289,11 +389,69 @@ class StatsQuerySet(caching.base.CachingQuerySet):
             if isinstance(f, StatsAggregate):
                 f.reset(zero_sum[k])
 
-    def _accumulate_aggregates(self, obj, **fields):
-        """Accumulate object falues for all aggregate fields."""
+    def _accumulate_aggregates(self, row, **fields):
+        """Accumulate row values for all aggregate fields."""
         for field in fields.values():
             if isinstance(field, StatsAggregate):
-                field.accumulate(getattr(obj, field.field_name))
+                field.accumulate(row[field.field_name])
+
+    def _db_aggregates(self, fields):
+        """Map result keys to db aggregates for the aggregate fields.
+
+        Returns None unless every aggregate can be worked out by the db:
+        row counts, and sums or averages of plain number fields.
+        """
+        aggregates = {}
+        for k, f in fields.items():
+            if not isinstance(f, StatsAggregate):
+                continue
+            if type(f) is Count:
+                aggregates[k] = models.Count('pk')
+            elif type(f) in (Sum, Avg, DayAvg):
+                field = self.model._meta.get_field_by_name(f.field_name)[0]
+                if (not isinstance(field, (models.IntegerField,
+                                           models.DecimalField))
+                    or isinstance(field, DecimalCharField)):
+                    return None
+                aggregates[k] = models.Sum(f.field_name)
+            else:
+                return None
+        return aggregates
+
+    def _db_aggregate_row(self, aggregates):
+        """Run `aggregates` over the whole queryset."""
+        # Aliases that can't clash with model fields.
+        aliases = dict(('_agg_%s' % k, v) for k, v in aggregates.items())
+        row = self.order_by().aggregate(**aliases)
+        return dict((k[5:], v) for k, v in row.items())
+
+    def _load_aggregates(self, row, **fields):
+        """Set aggregate fields from results worked out by the db."""
+        for k, f in fields.items():
+            if k not in row or not isinstance(f, StatsAggregate):
+                continue
+            if isinstance(f, Count):
+                f.count = row[k]
+            elif row[k] is not None:
+                # The db sums integers as decimals, convert them back.
+                field = self.model._meta.get_field_by_name(f.field_name)[0]
+                f.sum = field.to_python(row[k])
+
+    def _rows(self, fields):
+        """Yield a dict of field values for each row in the queryset.
+
+        Only the date and fields used by the aggregates are fetched, so we
+        skip building model instances and unserializing unused breakdowns.
+        """
+        names = set(f.field_name for f in fields.values()
+                    if isinstance(f, StatsAggregate))
+        names.discard(self._stats_date_field)
+        names = [self._stats_date_field] + sorted(names)
+        model_fields = [self.model._meta.get_field_by_name(n)[0]
+                        for n in names]
+        for values in self.values_list(*names):
+            yield dict((name, field.to_python(value)) for name, field, value
+                       in zip(names, model_fields, values))
 
     def _finalize_aggregates(self, summary, **fields):
         """Record final aggregate results into summary.
@@ -364,7 +522,7 @@ class StatsQuerySet(caching.base.CachingQuerySet):
 
     def _summary_iter(self, fields, fill_holes=False,
                       previous_period=prev_day_period,
-                      current_period=period_of_day):
+                      current_period=period_of_day, oldest_first=False):
         """Generates generic date period summaries of fields in the queryset.
 
         The fields argument should be a dictionary that maps result keys
@@ -385,38 +543,98 @@ class StatsQuerySet(caching.base.CachingQuerySet):
             current_period
                 A function that calculates the range of the period
                 containing a date or datetime
+
+            oldest_first
+                If True, generate summaries in chronological order
         """
+        summaries = self._period_iter(fields, current_period, oldest_first)
+        return self._fill_holes(summaries, fields, fill_holes,
+                                previous_period, current_period, oldest_first)
+
+    def _period_iter(self, fields, current_period, oldest_first=False):
+        """Generates summaries for periods with rows."""
+        aggregates = self._db_aggregates(fields)
+        if aggregates is not None and current_period in PERIOD_SQL:
+            return self._db_summary_iter(fields, aggregates, current_period,
+                                         oldest_first)
+        else:
+            return self._row_summary_iter(fields, current_period,
+                                          oldest_first)
+
+    def _fill_holes(self, summaries, fields, fill_holes, previous_period,
+                    current_period, oldest_first=False):
+        """Passes summaries through, filling holes if asked to."""
+
+        def next_period(d):
+            if oldest_first:
+                return current_period(current_period(d)[1] + timedelta(1))
+            return previous_period(d)
+
+        def before(start, summary):
+            if oldest_first:
+                return start < summary[self._start_key]
+            return start > summary[self._start_key]
+
         summary_zero = self.zero_summary(**fields)
-        summary = None
+        last = None
+        for summary in summaries:
+            # option: fill holes in middle of timeseries
+            if fill_holes and last is not None:
+                next_start, next_end = next_period(last[self._start_key])
+                while before(next_start, summary):
+                    filler = summary_zero.copy()
+                    filler[self._start_key] = next_start
+                    filler[self._end_key] = next_end
+                    self._reset_aggregates(filler, **fields)
+                    self._finalize_aggregates(filler, **fields)
+                    yield filler
+                    next_start, next_end = next_period(next_start)
+            yield summary
+            last = summary
 
-        for obj in self:
-            start, end = current_period(getattr(obj, self._stats_date_field))
+        # XXX: add option to fill in holes at start of timeseries?
+        # XXX: add option to fill in holes at end of timeseries?
+        return
 
-            if summary is None:
-                # XXX: add option to fill in holes at end of timeseries?
-                # prep first non-zero result
-                summary = summary_zero.copy()
-                summary[self._start_key] = start
-                summary[self._end_key] = end
-                self._reset_aggregates(summary, **fields)
+    def _db_summary_iter(self, fields, aggregates, current_period,
+                         oldest_first=False):
+        """Generates summaries for periods with rows, grouped by the db."""
+        summary_zero = self.zero_summary(**fields)
+        field = self.model._meta.get_field_by_name(self._stats_date_field)[0]
+        qn = connection.ops.quote_name
+        col = '%s.%s' % (qn(self.model._meta.db_table), qn(field.column))
+        aliases = dict(('_agg_%s' % k, v) for k, v in aggregates.items())
+        qs = (self.extra(select={'_period': PERIOD_SQL[current_period] %
+                                            {'col': col}})
+              .values('_period').annotate(**aliases)
+              .order_by('_period' if oldest_first else '-_period'))
+
+        for values in qs:
+            row = dict((k[5:], v) for k, v in values.items()
+                       if k.startswith('_agg_'))
+            summary = summary_zero.copy()
+            summary[self._start_key], summary[self._end_key] = (
+                current_period(values['_period']))
+            self._reset_aggregates(summary, **fields)
+            self._load_aggregates(row, **fields)
+            self._finalize_aggregates(summary, **fields)
+            yield summary
+
+    def _row_summary_iter(self, fields, current_period, oldest_first=False):
+        """Generates summaries for periods with rows, one row at a time."""
+        summary_zero = self.zero_summary(**fields)
+        summary = None
 
-            if summary[self._start_key] != start:
+        qs = self.reverse() if oldest_first else self
+        for row in qs._rows(fields):
+            start, end = current_period(row[self._stats_date_field])
+
+            if summary is not None and summary[self._start_key] != start:
                 self._finalize_aggregates(summary, **fields)
                 yield summary
+                summary = None
 
-                # option: fill holes in middle of timeseries
-                if fill_holes:
-                    prev_start, prev_end = previous_period(
-                        summary[self._start_key])
-                    while prev_start > start:
-                        filler = summary_zero.copy()
-                        filler[self._start_key] = prev_start
-                        filler[self._end_key] = prev_end
-                        self._reset_aggregates(filler, **fields)
-                        self._finalize_aggregates(filler, **fields)
-                        yield filler
-                        prev_start, prev_end = previous_period(prev_start)
-
+            if summary is None:
                 # prep next non-zero result
                 summary = summary_zero.copy()
                 summary[self._start_key] = start
@@ -424,27 +642,123 @@ class StatsQuerySet(caching.base.CachingQuerySet):
                 self._reset_aggregates(summary, **fields)
 
             # accumulate
-            self._accumulate_aggregates(obj, **fields)
+            self._accumulate_aggregates(row, **fields)
 
         if summary:
             self._finalize_aggregates(summary, **fields)
             yield summary
 
-        # XXX: add option to fill in holes at start of timeseries?
-        return
+    def _rollup_model(self):
+        name = getattr(self.model, 'stats_rollup', None)
+        if name:
+            return models.get_model(self.model._meta.app_label, name)
+
+    def _rollup_summary(self, period, *fields, **kwargs):
+        """Generate weekly or monthly summaries from the rollup table.
+
+        Periods that lie wholly inside the date range and end before the
+        rollup mark are read from the rollup table.  Partial periods at
+        either end and periods the cron hasn't rolled up yet are summed from
+        daily rows as usual.
+
+        Returns None if the rollups can't give the same results, e.g. for
+        querysets with other filters or First/Last aggregates.
+        """
+        rollup = self._rollup_model()
+        filters = self._rollup_filters
+        if rollup is None or not filters or 'date__range' not in filters:
+            return None
+        mark = rollup_mark(self.model)
+        if mark is None:
+            return None
+        # Make sure nothing but the filters was applied, like an exclude().
+        plain = StatsQuerySet(model=self.model).filter(**filters)
+        if str(plain.order_by().query) != str(self.order_by().query):
+            return None
+
+        start, end = filters['date__range']
+        if not (isinstance(start, date) and isinstance(end, date)):
+            return None
+        start, end = period_of_day(start)[0], period_of_day(end)[0]
+
+        kwargs = dict(kwargs)
+        fill_holes = kwargs.pop('fill_holes', False)
+        oldest_first = kwargs.pop('oldest_first', False)
+        mapped = self._map_fields(*fields, **kwargs)
+        summed = rollup_fields(rollup)
+        for f in mapped.values():
+            if not isinstance(f, StatsAggregate):
+                continue
+            if type(f) not in (Count, Sum, Avg, DayAvg):
+                return None
+            if type(f) is not Count and f.field_name not in summed:
+                return None
+
+        # The first and last whole periods in the range.
+        current_period, previous_period = ROLLUP_PERIODS[period]
+        first_start, first_end = current_period(start)
+        if first_start != start:
+            first_start = first_end + timedelta(1)
+        # Periods after the mark may be missing rows, so stop before them.
+        end = min(end, mark[1])
+        last_start, last_end = current_period(end)
+        if last_end != end:
+            last_end = last_start - timedelta(1)
+        if first_start > last_end:
+            return None
+
+        def daily(**kw):
+            qs = self.filter(**kw)
+            return qs._period_iter(qs._map_fields(*fields, **kwargs),
+                                   current_period, oldest_first)
+
+        rows = dict((k, v) for k, v in filters.items() if k != 'date__range')
+        rows = rollup.objects.filter(period=period,
+                                     date__range=(first_start, last_end),
+                                     **rows)
+        rows = rows.order_by('date' if oldest_first else '-date')
+        summaries = [daily(date__gt=last_end),
+                     self._rollup_iter(rows, mapped, current_period),
+                     daily(date__lt=first_start)]
+        if oldest_first:
+            summaries.reverse()
+        return self._fill_holes(chain(*summaries), mapped, fill_holes,
+                                previous_period, current_period, oldest_first)
+
+    def _rollup_iter(self, rollups, fields, current_period):
+        """Generates summaries from rows of a rollup table."""
+        summary_zero = self.zero_summary(**fields)
+        for rollup in rollups:
+            summary = summary_zero.copy()
+            summary[self._start_key], summary[self._end_key] = (
+                current_period(rollup.date))
+            self._reset_aggregates(summary, **fields)
+            row = dict((f.field_name, getattr(rollup, f.field_name, None))
+                       for f in fields.values()
+                       if isinstance(f, StatsAggregate))
+            self._accumulate_aggregates(row, **fields)
+            # Each rollup stands for all the daily rows in its period.
+            for f in fields.values():
+                if isinstance(f, Count):
+                    f.count = rollup.n_rows
+            self._finalize_aggregates(summary, **fields)
+            yield summary
 
 
 class StatsManager(caching.base.CachingManager):
 
-    def __init__(self, date_field='date'):
+    def __init__(self, date_field='date', rollup=None):
         super(StatsManager, self).__init__()
         self.date_field = date_field
+        self.rollup = rollup
 
     def contribute_to_class(self, cls, name):
         super(StatsManager, self).contribute_to_class(cls, name)
 
         # StatsQuerySet looks for our date field on the model
         cls.add_to_class('stats_date_field', self.date_field)
+        # and for the name of the model holding weekly and monthly sums.
+        cls.add_to_class('stats_rollup', self.rollup)
 
     def get_query_set(self):
         # The summary methods of StatsQuerySet require `date desc` ordering
@@ -58,7 +58,7 @@ class DownloadCount(caching.base.CachingMixin, models.Model):
     sources = StatsDictField(db_column='src', null=True)
 
     objects = models.Manager()
-    stats = StatsManager('date')
+    stats = StatsManager('date', rollup='DownloadCountRollup')
 
     class Meta:
         db_table = 'download_counts'
@@ -67,6 +67,22 @@ class DownloadCount(caching.base.CachingMixin, models.Model):
         return ['*/addon/%d/statistics/downloads*' % self.addon_id, ]
 
 
+class DownloadCountRollup(caching.base.CachingMixin, models.Model):
+    """Weekly and monthly sums of DownloadCount, kept by a cron."""
+    addon = models.ForeignKey('addons.Addon')
+    period = models.CharField(max_length=5)  # 'week' or 'month'
+    date = models.DateField()  # The first day of the period.
+    n_rows = models.PositiveIntegerField(default=0)
+    max_id = models.PositiveIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    sources = StatsDictField(db_column='src', null=True)
+
+    objects = caching.base.CachingManager()
+
+    class Meta:
+        db_table = 'download_counts_rollup'
+
+
 class UpdateCount(caching.base.CachingMixin, models.Model):
     addon = models.ForeignKey('addons.Addon')
     count = models.PositiveIntegerField()
@@ -80,7 +96,7 @@ class UpdateCount(caching.base.CachingMixin, models.Model):
     locales = StatsDictField(db_column='locale', null=True)
 
     objects = models.Manager()
-    stats = StatsManager('date')
+    stats = StatsManager('date', rollup='UpdateCountRollup')
 
     class Meta:
         db_table = 'update_counts'
@@ -89,6 +105,26 @@ class UpdateCount(caching.base.CachingMixin, models.Model):
         return ['*/addon/%d/statistics/usage*' % self.addon_id, ]
 
 
+class UpdateCountRollup(caching.base.CachingMixin, models.Model):
+    """Weekly and monthly sums of UpdateCount, kept by a cron."""
+    addon = models.ForeignKey('addons.Addon')
+    period = models.CharField(max_length=5)  # 'week' or 'month'
+    date = models.DateField()  # The first day of the period.
+    n_rows = models.PositiveIntegerField(default=0)
+    max_id = models.PositiveIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    versions = StatsDictField(db_column='version', null=True)
+    statuses = StatsDictField(db_column='status', null=True)
+    applications = StatsDictField(db_column='application', null=True)
+    oses = StatsDictField(db_column='os', null=True)
+    locales = StatsDictField(db_column='locale', null=True)
+
+    objects = caching.base.CachingManager()
+
+    class Meta:
+        db_table = 'update_counts_rollup'
+
+
 class AddonShareCount(caching.base.CachingMixin, models.Model):
     addon = models.ForeignKey('addons.Addon')
     count = models.PositiveIntegerField()
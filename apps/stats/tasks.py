@@ -1,6 +1,6 @@
 import datetime
 
-from django.db import connection, transaction
+from django.db import connection, models, transaction
 from django.db.models import Sum, Max
 
 import commonware.log
@@ -13,6 +13,7 @@ from stats.models import Contribution
 from reviews.models import Review
 from users.models import UserProfile
 from versions.models import Version
+from .db import ROLLUP_PERIODS, rollup_fields
 from .models import UpdateCount, DownloadCount, AddonCollectionCount
 
 log = commonware.log.getLogger('z.task')
@@ -184,6 +185,37 @@ def _get_metrics_jobs(date=None):
     return stats
 
 
+@task(rate_limit='10/s', ignore_result=False)
+def update_rollups(model, keys, **kw):
+    """Recompute weekly and monthly rollups from daily rows.
+
+    `model` is the name of the daily stats model and `keys` is a list of
+    (addon_id, period, date) for the periods to recompute.
+    """
+    model = models.get_model('stats', model)
+    rollup = models.get_model('stats', model.stats_rollup)
+    fields = rollup_fields(rollup)
+    log.info('[%s@%s] Updating %s.' % (len(keys), update_rollups.rate_limit,
+                                        rollup._meta.db_table))
+    for addon, period, date in keys:
+        start, end = ROLLUP_PERIODS[period][0](date)
+        qs = model.stats.filter(addon=addon, date__range=(start, end))
+        summary = qs.summary(*fields)
+        existing = list(rollup.objects.no_cache().filter(
+            addon=addon, period=period, date=start))
+        if not summary['row_count']:
+            for obj in existing:
+                obj.delete()
+            continue
+        obj = existing[0] if existing else rollup(addon_id=addon,
+                                                  period=period, date=start)
+        for name in fields:
+            setattr(obj, name, summary[name])
+        obj.n_rows = summary['row_count']
+        obj.max_id = qs.aggregate(max=Max('id'))['max']
+        obj.save()
+
+
 @task(rate_limit='100/m')
 def update_to_json(max_objs=None, classes=(), ids=(), **kw):
     """Updates database objects to use JSON instead of phpserialized
@@ -7,7 +7,9 @@ from nose.tools import eq_
 
 from stats.db import StatsDict, Count, Sum, First, Last, Avg, DayAvg
 from stats.db import prev_month_period, prev_week_period, prev_day_period
-from stats.models import DownloadCount
+from stats import cron, tasks
+from stats.db import rollup_mark, set_rollup_mark
+from stats.models import DownloadCount, DownloadCountRollup
 
 
 class TestStatsDict(test.TestCase):
@@ -147,3 +149,90 @@ class TestDbSummaries(test.TestCase):
 
         s = list(qs.period_summary('month'))
         eq_(len(s), 2)
+
+    def test_db_matches_rows(self):
+        qs = DownloadCount.stats.filter(addon=4,
+                date__range=(date(2009, 6, 1), date(2009, 7, 3)))
+        assert qs._db_aggregates(qs._map_fields('count')) is not None
+
+        # Summing in the db has to agree with summing row by row.
+        db = [list(qs.period_summary(p, 'count', fill_holes=True))
+              for p in ('day', 'week', 'month')]
+        db.append(qs.summary('count', avg=Avg('count')))
+        qs._db_aggregates = lambda fields: None
+        rows = [list(qs.period_summary(p, 'count', fill_holes=True))
+                for p in ('day', 'week', 'month')]
+        rows.append(qs.summary('count', avg=Avg('count')))
+        eq_(db, rows)
+
+    def test_rows_for_breakdowns(self):
+        qs = DownloadCount.stats.filter(addon=4)
+        eq_(qs._db_aggregates(qs._map_fields('count', 'sources')), None)
+        s = qs.summary('count', 'sources')
+        eq_(s['sources'].sum_reduce() > 0, True)
+
+
+class TestRollups(test.TestCase):
+    fixtures = ['stats/test_models.json']
+
+    def setUp(self):
+        self.qs = DownloadCount.stats.filter(addon=4,
+                date__range=(date(2009, 6, 3), date(2009, 7, 3)))
+
+    def summaries(self, qs):
+        return [list(qs.period_summary(p, 'count', 'sources',
+                                       avg=DayAvg('count'), fill_holes=True))
+                for p in ('week', 'month')]
+
+    def roll_up(self):
+        keys = [(4, 'week', date(2009, 6, d)) for d in (1, 8, 15, 22, 29)]
+        keys += [(4, 'month', date(2009, 6, 1)), (4, 'month', date(2009, 7, 1))]
+        tasks.update_rollups('DownloadCount', keys)
+        set_rollup_mark(DownloadCount, 10 ** 9, date(2009, 7, 31))
+
+    def test_update_rollups(self):
+        self.roll_up()
+        r = DownloadCountRollup.objects.get(addon=4, period='month',
+                                            date=date(2009, 6, 1))
+        s = DownloadCount.stats.filter(addon=4, date__range=(
+            date(2009, 6, 1), date(2009, 6, 30))).summary('count', 'sources')
+        eq_(r.count, s['count'])
+        eq_(r.n_rows, s['row_count'])
+        eq_(r.sources, s['sources'])
+
+    def test_rollups_match_daily(self):
+        daily = self.summaries(self.qs)
+        eq_(DownloadCountRollup.objects.count(), 0)
+        self.roll_up()
+        assert self.qs._rollup_summary('week', 'count') is not None
+        eq_(self.summaries(self.qs), daily)
+
+    def test_other_filters_skip_rollups(self):
+        self.roll_up()
+        eq_(self.qs.exclude(count=0)._rollup_summary('week', 'count'), None)
+        eq_(self.qs.filter(count__gt=0)._rollup_summary('week', 'count'),
+            None)
+        eq_(self.qs._rollup_summary('week', first=First('date')), None)
+
+    def test_no_mark_skips_rollups(self):
+        tasks.update_rollups('DownloadCount',
+                             [(4, 'week', date(2009, 6, 8))])
+        eq_(rollup_mark(DownloadCount), None)
+        eq_(self.qs._rollup_summary('week', 'count'), None)
+
+    def test_daily_rows_after_mark(self):
+        daily = self.summaries(self.qs)
+        self.roll_up()
+        set_rollup_mark(DownloadCount, 10 ** 9, date(2009, 6, 20))
+        # Whatever the rollups say after the mark is ignored.
+        DownloadCountRollup.objects.filter(date__gte=date(2009, 6, 15)).update(
+            count=0)
+        eq_(self.summaries(self.qs), daily)
+
+    def test_cron_sets_mark(self):
+        daily = self.summaries(self.qs)
+        cron.update_stats_rollups()
+        top = DownloadCount.objects.order_by('-id')[0]
+        eq_(rollup_mark(DownloadCount)[0], top.id)
+        assert DownloadCountRollup.objects.filter(addon=4).exists()
+        eq_(self.summaries(self.qs), daily)
@@ -2,6 +2,8 @@ from datetime import date
 from decimal import Decimal
 
 from django import test
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import simplejson
 
 from nose.tools import eq_
 
@@ -37,3 +39,28 @@ class TestUnknownGen(test.TestCase):
         eq_(row['applications/ff/3.0.9'], Decimal('5'))
         eq_(row['applications/unknown/1.0.1'], Decimal('1'))
         eq_(row['applications/unknown'], Decimal('4'))
+
+
+class TestOutputGen(test.TestCase):
+    fixtures = ['stats/test_models.json']
+
+    def test_json_gen(self):
+        stats = list(UpdateCount.stats.filter(addon=4).daily_summary(
+            'count', avg=DayAvg('count')))
+        eq_(''.join(utils.json_gen(iter(stats))),
+            simplejson.dumps(stats, cls=DjangoJSONEncoder))
+        eq_(''.join(utils.json_gen([])), '[]')
+
+    def test_csv_gen(self):
+        rows = list(utils.csv_gen([[1, u'\xe9'], [2, 'b']], ['n', 's']))
+        eq_(rows, ['n,s\r\n', '1,\xc3\xa9\r\n', '2,b\r\n'])
+
+    def test_oldest_first(self):
+        qs = UpdateCount.stats.filter(addon=4)
+        for period in ('day', 'week', 'month'):
+            newest = list(qs.period_summary(period, 'count', 'versions',
+                                            fill_holes=True))
+            oldest = list(qs.period_summary(period, 'count', 'versions',
+                                            fill_holes=True,
+                                            oldest_first=True))
+            eq_(oldest, newest[::-1])
@@ -1,5 +1,10 @@
+import cStringIO
+import itertools
 from decimal import Decimal
 
+from django.core.serializers.json import DjangoJSONEncoder
+
+import unicode_csv
 from .db import StatsDict
 
 
@@ -40,7 +45,7 @@ def csv_dynamic_prep(stats, queryset, field_list, total_key, dynamic_key):
     Returns a tuple containing a row generator and a list of field
     names suitable for the CSV header.
     """
-    if not queryset:
+    if not queryset.exists():
         return ([], [])
 
     # Summarize entire queryset to get all dynamic field names and
@@ -209,3 +214,35 @@ def values_gen(stats, ordered_keys=[], zero_val=0):
     """
     for s in stats:
         yield [s.get(k, zero_val) for k in ordered_keys]
+
+
+# Output generators
+#
+# These take rows or stats and yield chunks of encoded output, so a
+# response can send each row as soon as it's made.
+
+
+def csv_gen(rows, headings=None):
+    """Generate CSV lines for ``rows``, preceded by ``headings``."""
+    buf = cStringIO.StringIO()
+    writer = unicode_csv.UnicodeWriter(buf)
+    if headings is not None:
+        rows = itertools.chain([headings], rows)
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.truncate(0)
+
+
+def json_gen(stats, cls=DjangoJSONEncoder):
+    """Generate a JSON list of ``stats`` one item at a time.
+
+    The output is the same as ``simplejson.dumps(list(stats))``.
+    """
+    encoder = cls()
+    yield '['
+    for i, s in enumerate(stats):
+        if i:
+            yield ', '
+        yield encoder.encode(s)
+    yield ']'
@@ -1,11 +1,9 @@
+import itertools
 import time
-from types import GeneratorType
 from datetime import date, datetime
 
 from django import http
-from django.utils import simplejson
 from django.utils.cache import add_never_cache_headers, patch_cache_control
-from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import PermissionDenied
 
 import jingo
@@ -15,11 +13,10 @@ from addons.decorators import addon_view, addon_view_factory
 from addons.models import Addon
 from amo.urlresolvers import reverse
 
-import unicode_csv
 from .db import DayAvg, Avg
 from .decorators import allow_cross_site_request
 from .models import DownloadCount, UpdateCount, Contribution
-from .utils import csv_prep, csv_dynamic_prep
+from .utils import csv_prep, csv_dynamic_prep, csv_gen, json_gen
 
 
 SERIES_GROUPS = ('day', 'week', 'month')
@@ -37,7 +34,8 @@ def downloads_series(request, addon, group, start, end, format):
     # resultkey to fieldname map - stored as a list to maintain order for csv
     fields = [('date', 'start'), ('count', 'count')]
     qs = DownloadCount.stats.filter(addon=addon, date__range=date_range)
-    gen = qs.period_summary(group, **dict(fields))
+    gen = qs.period_summary(group, oldest_first=(format == 'csv'),
+                            **dict(fields))
 
     if format == 'csv':
         gen, headings = csv_prep(gen, fields)
@@ -55,7 +53,8 @@ def usage_series(request, addon, group, start, end, format):
     # resultkey to fieldname map - stored as a list to maintain order for csv
     fields = [('date', 'start'), ('count', DayAvg('count'))]
     qs = UpdateCount.stats.filter(addon=addon, date__range=date_range)
-    gen = qs.period_summary(group, **dict(fields))
+    gen = qs.period_summary(group, oldest_first=(format == 'csv'),
+                            **dict(fields))
 
     if format == 'csv':
         gen, headings = csv_prep(gen, fields)
@@ -75,7 +74,8 @@ def contributions_series(request, addon, group, start, end, format):
     # Note that average is per contribution and not per day
     fields = [('date', 'start'), ('total', 'amount'), ('count', 'row_count'),
               ('average', Avg('amount'))]
-    gen = qs.period_summary(group, **dict(fields))
+    gen = qs.period_summary(group, oldest_first=(format == 'csv'),
+                            **dict(fields))
 
     if format == 'csv':
         gen, headings = csv_prep(gen, fields, precision='0.01')
@@ -101,6 +101,8 @@ def contributions_detail(request, addon, start, end, format):
               ('requested', 'suggested_amount'),
               ('contributor', 'contributor'),
               ('email', 'email'), ('comment', 'comment')]
+    if format == 'csv':
+        qs = qs.reverse()
     gen = property_lookup_gen(qs, fields)
 
     if format == 'csv':
@@ -119,7 +121,8 @@ def sources_series(request, addon, group, start, end, format):
     # resultkey to fieldname map - stored as a list to maintain order for csv
     fields = [('date', 'start'), ('count', 'count'), ('sources', 'sources')]
     qs = DownloadCount.stats.filter(addon=addon, date__range=date_range)
-    gen = qs.period_summary(group, **dict(fields))
+    gen = qs.period_summary(group, oldest_first=(format == 'csv'),
+                            **dict(fields))
 
     if format == 'csv':
         gen, headings = csv_dynamic_prep(gen, qs, fields, 'count', 'sources')
@@ -140,7 +143,8 @@ def usage_breakdown_series(request, addon, group,
     fields = [('date', 'start'), ('count', DayAvg('count')),
               (field, DayAvg(field))]
     qs = UpdateCount.stats.filter(addon=addon, date__range=date_range)
-    gen = qs.period_summary(group, **dict(fields))
+    gen = qs.period_summary(group, oldest_first=(format == 'csv'),
+                            **dict(fields))
 
     if format == 'csv':
         gen, headings = csv_dynamic_prep(gen, qs, fields,
@@ -267,39 +271,39 @@ def fudge_headers(response, stats):
         patch_cache_control(response, max_age=seven_days)
 
 
+def peek(stats):
+    """Return the first item of ``stats`` (in a list) and all the items."""
+    stats = iter(stats)
+    first = list(itertools.islice(stats, 1))
+    return first, itertools.chain(first, stats)
+
+
 @allow_cross_site_request
 def render_csv(request, addon, stats, fields):
-    """Render a stats series in CSV."""
+    """Render a stats series in CSV.
+
+    For remora compatibility the oldest data should come first, so get
+    ``stats`` with oldest_first. Rows are sent as they are made.
+    """
     # Start with a header from the template.
     ts = time.strftime('%c %z')
-    response = jingo.render(request, 'stats/csv_header.txt',
-                            {'addon': addon, 'timestamp': ts})
-
-    # For remora compatibility, reverse the output so oldest data
-    # is first.
-    # XXX: The list() performance penalty here might be big enough to
-    # consider changing the sort order at lower levels.
-    writer = unicode_csv.UnicodeWriter(response)
-    writer.writerow(fields)
-    stats_list = list(stats)
-    for row in reversed(stats_list):
-        writer.writerow(row)
-
-    fudge_headers(response, stats_list)
+    header = jingo.render_to_string(request, 'stats/csv_header.txt',
+                                    {'addon': addon, 'timestamp': ts})
+
+    first, stats = peek(stats)
+    content = itertools.chain([header.encode('utf-8')],
+                              csv_gen(stats, fields))
+    response = http.HttpResponse(content)
+    fudge_headers(response, first)
     response['Content-Type'] = 'text/plain; charset=utf-8'
     return response
 
 
 @allow_cross_site_request
 def render_json(request, addon, stats):
-    """Render a stats series in JSON."""
-    response = http.HttpResponse(mimetype='text/json')
-
-    # XXX: Subclass DjangoJSONEncoder to handle generators.
-    if isinstance(stats, GeneratorType):
-        stats = list(stats)
-
+    """Render a stats series in JSON, sending items as they are made."""
+    first, stats = peek(stats)
     # Django's encoder supports date and datetime.
-    fudge_headers(response, stats)
-    simplejson.dump(stats, response, cls=DjangoJSONEncoder)
+    response = http.HttpResponse(json_gen(stats), mimetype='text/json')
+    fudge_headers(response, first)
     return response
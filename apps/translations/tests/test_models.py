@@ -11,7 +11,7 @@ from test_utils import ExtraAppTestCase, trans_eq
 from testapp.models import TranslatedModel, UntranslatedModel, FancyModel
 from translations.models import (Translation, PurifiedTranslation,
                                  TranslationSequence)
-from translations import widgets
+from translations import transformer, widgets
 from translations.query import order_by_translation
 
 
@@ -334,6 +334,38 @@ class TranslationTestCase(ExtraAppTestCase):
         eq_(unicode(obj.no_locale), 'blammo')
         eq_(obj.no_locale.locale, 'fr')
 
+    def test_loader_shared(self):
+        transformer.start_loader()
+        try:
+            o = TranslatedModel.objects.no_cache().get(id=1)
+            o = TranslatedModel.objects.no_cache().get(id=1)
+            trans_eq(o.name, 'some name', 'en-US')
+            eq_(unicode(o.no_locale), 'blammo')
+            loader = transformer.stop_loader()
+            eq_(loader.calls, 2)
+            eq_(loader.queries, 2)  # One by locale and one for no_locale.
+        finally:
+            transformer.stop_loader()
+
+    def test_loader_forgets_saved(self):
+        transformer.start_loader()
+        try:
+            o = TranslatedModel.objects.no_cache().get(id=1)
+            o.name.localized_string = 'new name'
+            o.name.save()
+            o = TranslatedModel.objects.no_cache().get(id=1)
+            trans_eq(o.name, 'new name', 'en-US')
+        finally:
+            transformer.stop_loader()
+
+    def test_loader_lru(self):
+        loader = transformer.TranslationLoader(size=2)
+        loader.load({'en-us': set([1, 2, 3])})
+        loader.get('en-us', 1)
+        loader.load({'en-us': set([4])})
+        eq_(sorted(loader.cache['en-us']), [1, 4])
+        eq_(loader.queries, 2)
+
 
 def test_translation_bool():
     t = lambda s: Translation(localized_string=s)
@@ -1,3 +1,6 @@
+import heapq
+import threading
+
 from django.conf import settings
 from django.db import connections, models
 from django.utils import translation
@@ -7,19 +10,162 @@ import multidb
 from translations.models import Translation
 from translations.fields import TranslatedField
 
-isnull = """IF(!ISNULL({t1}.localized_string), {t1}.{col}, {t2}.{col})
-            AS {name}_{col}"""
-join = """LEFT OUTER JOIN translations {t}
-          ON ({t}.id={model}.{name} AND {t}.locale={locale})"""
-no_locale_join = """LEFT OUTER JOIN translations {t}
-                    ON {t}.id={model}.{name}"""
-
 trans_fields = [f.name for f in Translation._meta.fields]
+trans_columns = [f.column for f in Translation._meta.fields]
+ID, LOCALE, STRING = (trans_fields.index('id'), trans_fields.index('locale'),
+                      trans_fields.index('localized_string'))
+
+# Cache key for all the translations of an id, whatever the locale.
+ANY_LOCALE = '*'
+
+_local = threading.local()
+
+
+class TranslationLoader(object):
+    """
+    Caches translation rows by locale and id.
+
+    During a request every get_trans() shares a loader, so translations
+    already fetched for one queryset aren't fetched again for the next, and
+    each call only asks the db for the ids it's missing.  The least recently
+    used ids are dropped from a locale once it holds more than `size`.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or settings.TRANSLATIONS_CACHE_SIZE
+        # {locale: {id: [last used, row or None]}}, or a list of rows for
+        # ANY_LOCALE.
+        self.cache = {}
+        self.tick = 0
+        # get_trans() used to do one query per call.
+        self.calls = self.queries = 0
+
+    def get(self, locale, id):
+        self.tick += 1
+        entry = self.cache[locale][id]
+        entry[0] = self.tick
+        return entry[1]
+
+    def _set(self, locale, id, value):
+        self.cache.setdefault(locale, {})[id] = [self.tick, value]
+
+    def forget(self, id):
+        for cache in self.cache.values():
+            cache.pop(id, None)
+
+    def evict(self):
+        for cache in self.cache.values():
+            if len(cache) > self.size:
+                n = len(cache) - self.size * 3 / 4
+                for id in heapq.nsmallest(n, cache,
+                                          key=lambda k: cache[k][0]):
+                    del cache[id]
+
+    def load(self, wanted):
+        """
+        Fetch the translations we don't have yet.
+
+        `wanted` is a dict of {locale: set(ids)}.  Locales should be lower
+        case; ANY_LOCALE gets every translation of the ids.
+        """
+        self.calls += 1
+        # Make room first so nothing goes away before the caller reads it.
+        self.evict()
+        missing, any_ids = {}, set()
+        for locale, ids in wanted.items():
+            cache = self.cache.get(locale, {})
+            ids = set(id for id in ids if id not in cache)
+            if not ids:
+                continue
+            elif locale == ANY_LOCALE:
+                any_ids = ids
+            else:
+                missing[locale] = ids
+
+        if missing:
+            ids = set().union(*missing.values())
+            rows = self.query(ids, missing.keys())
+            for row in rows:
+                self._set(row[LOCALE].lower(), row[ID], row)
+            for locale, ids in missing.items():
+                cache = self.cache.setdefault(locale, {})
+                for id in ids:
+                    if id not in cache:
+                        self._set(locale, id, None)
+
+        if any_ids:
+            found = dict((id, []) for id in any_ids)
+            for row in self.query(any_ids):
+                found[row[ID]].append(row)
+                self._set(row[LOCALE].lower(), row[ID], row)
+            for id, rows in found.items():
+                self._set(ANY_LOCALE, id, rows)
+
+    def query(self, ids, locales=None):
+        self.queries += 1
+        connection = connections[multidb.get_slave()]
+        qn = connection.ops.quote_name
+        sql = 'SELECT %s FROM translations WHERE id IN (%s)' % (
+            ','.join(map(qn, trans_columns)), ','.join(map(str, ids)))
+        if locales:
+            sql += ' AND locale IN (%s)' % ','.join(['%s'] * len(locales))
+        cursor = connection.cursor()
+        cursor.execute(sql + ' ORDER BY autoid', tuple(locales or ()))
+        return cursor.fetchall()
+
+    def pick(self, id, locale, fallback):
+        """
+        Return the row for `id` in `locale`, or else in `fallback`.
+
+        A fallback of ANY_LOCALE picks the first translation there is.
+        """
+        row = self.get(locale, id)
+        if row is None or row[STRING] is None:
+            if fallback == ANY_LOCALE:
+                rows = [r for r in self.get(ANY_LOCALE, id)
+                        if r[STRING] is not None]
+                row = rows[0] if rows else None
+            elif fallback:
+                row = self.get(fallback, id)
+        if row is not None and row[STRING] is not None:
+            return row
+
+
+def start_loader():
+    """Share a TranslationLoader between get_trans() calls in this thread."""
+    _local.loader = TranslationLoader()
+
+
+def stop_loader():
+    """Stop sharing the thread's TranslationLoader and return it."""
+    loader = getattr(_local, 'loader', None)
+    _local.loader = None
+    return loader
+
+
+def get_loader():
+    """The thread's shared loader, or a new one if nobody started one."""
+    return getattr(_local, 'loader', None) or TranslationLoader()
+
+
+def forget_translation(sender, instance, **kw):
+    loader = getattr(_local, 'loader', None)
+    if loader:
+        loader.forget(instance.id)
+
+
+# Proxies like PurifiedTranslation send signals as themselves.
+for sender in [Translation] + Translation.__subclasses__():
+    for signal in (models.signals.post_save, models.signals.post_delete):
+        signal.connect(forget_translation, sender=sender,
+                       dispatch_uid='translations.forget_translation')
 
 
-def build_query(model, connection):
-    qn = connection.ops.quote_name
-    selects, joins, params = [], [], []
+def get_trans(items):
+    if not items:
+        return
+
+    model = items[0].__class__
 
     # The model can define a fallback locale (which may be a Field).
     if hasattr(model, 'get_fallback'):
@@ -31,57 +177,28 @@ def build_query(model, connection):
         model._meta.translated_fields = [f for f in model._meta.fields
                                          if isinstance(f, TranslatedField)]
 
-    # Add the selects and joins for each translated field on the model.
-    for field in model._meta.translated_fields:
+    lang = translation.get_language().lower()
+    wanted, todo = {lang: set()}, []
+    for item in items:
         if isinstance(fallback, models.Field):
-            fallback_str = '%s.%s' % (qn(model._meta.db_table),
-                                      qn(fallback.column))
+            item_fallback = getattr(item, fallback.attname)
         else:
-            fallback_str = '%s'
-
-        name = field.column
-        d = {'t1': 't1_' + name, 't2': 't2_' + name,
-             'model': qn(model._meta.db_table), 'name': name}
-
-        selects.extend(isnull.format(col=f, **d) for f in trans_fields)
-
-        joins.append(join.format(t=d['t1'], locale='%s', **d))
-        params.append(translation.get_language())
-
-        if field.require_locale:
-            joins.append(join.format(t=d['t2'], locale=fallback_str, **d))
-            if not isinstance(fallback, models.Field):
-                params.append(fallback)
-        else:
-            joins.append(no_locale_join.format(t=d['t2'], **d))
-
-    # ids will be added later on.
-    sql = """SELECT {model}.{pk}, {selects} FROM {model} {joins}
-             WHERE {model}.{pk} IN {{ids}}"""
-    s = sql.format(selects=','.join(selects), joins='\n'.join(joins),
-                   model=qn(model._meta.db_table), pk=model._meta.pk.column)
-    return s, params
-
-
-def get_trans(items):
-    if not items:
-        return
-
-    connection = connections[multidb.get_slave()]
-    cursor = connection.cursor()
-
-    model = items[0].__class__
-    sql, params = build_query(model, connection)
-    item_dict = dict((item.pk, item) for item in items)
-    ids = ','.join(map(str, item_dict.keys()))
-
-    cursor.execute(sql.format(ids='(%s)' % ids), tuple(params))
-    step = len(trans_fields)
-    for row in cursor.fetchall():
-        # We put the item's pk as the first selected field.
-        item = item_dict[row[0]]
-        for index, field in enumerate(model._meta.translated_fields):
-            start = 1 + step * index
-            t = Translation(*row[start:start+step])
-            if t.id is not None and t.localized_string is not None:
-                setattr(item, field.name, t)
+            item_fallback = fallback
+        item_fallback = item_fallback.lower() if item_fallback else None
+
+        for field in model._meta.translated_fields:
+            id = getattr(item, field.attname)
+            if id is None:
+                continue
+            locale = item_fallback if field.require_locale else ANY_LOCALE
+            wanted[lang].add(id)
+            if locale:
+                wanted.setdefault(locale, set()).add(id)
+            todo.append((item, field, id, locale))
+
+    loader = get_loader()
+    loader.load(wanted)
+    for item, field, id, locale in todo:
+        row = loader.pick(id, lang, locale)
+        if row is not None:
+            setattr(item, field.name, Translation(*row))
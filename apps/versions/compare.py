@@ -55,17 +55,57 @@ def version_dict(version):
     return d
 
 
+# version_int() remembers this many versions before starting over.
+VERSION_INT_CACHE_SIZE = 10000
+_version_ints = {}
+_numbers = dict((str(i), i) for i in range(100))
+_numbers.update({'*': 99, '': 0, None: 0})
+
+
 def version_int(version):
-    d = version_dict(str(version))
-    for key in ['alpha_ver', 'major', 'minor1', 'minor2', 'minor3',
-                'pre_ver']:
-        if not d[key]:
-            d[key] = 0
-    atrans = {'a': 0, 'b': 1}
-    d['alpha'] = atrans.get(d['alpha'], 2)
-    d['pre'] = 0 if d['pre'] else 1
-
-    v = "%d%02d%02d%02d%d%02d%d%02d" % (d['major'], d['minor1'],
-            d['minor2'], d['minor3'], d['alpha'], d['alpha_ver'], d['pre'],
-            d['pre_ver'])
+    version = str(version)
+    try:
+        return _version_ints[version]
+    except KeyError:
+        if len(_version_ints) >= VERSION_INT_CACHE_SIZE:
+            _version_ints.clear()
+        rv = _version_ints[version] = _version_int(version)
+        return rv
+
+
+def version_ints(versions):
+    """
+    Return version_int() for each of `versions`, in order.
+
+    Meant for big batches like a whole appversions table: every distinct
+    version is parsed once and the batch doesn't push everything else out
+    of version_int()'s memo.
+    """
+    seen, rv = {}, []
+    for version in versions:
+        version = str(version)
+        if version not in seen:
+            seen[version] = (_version_ints.get(version)
+                             or _version_int(version))
+        rv.append(seen[version])
+    return rv
+
+
+def _number(s):
+    try:
+        return _numbers[s]
+    except KeyError:
+        return int(s)
+
+
+def _version_int(version):
+    """The same encoding as formatting version_dict(), without the dicts."""
+    match = version_re.match(version)
+    if not match:
+        return 200100
+    (major, minor1, minor2, minor3, alpha, alpha_ver,
+     pre, pre_ver) = match.groups()
+    v = "%d%02d%02d%02d%d%02d%d%02d" % (_number(major), _number(minor1),
+            _number(minor2), _number(minor3), {'a': 0, 'b': 1}.get(alpha, 2),
+            _number(alpha_ver), 0 if pre else 1, _number(pre_ver))
     return int(v)
@@ -20,7 +20,8 @@ from files.tests.test_models import UploadTest
 from users.models import UserProfile
 from versions import views
 from versions.models import Version, ApplicationsVersions
-from versions.compare import version_int, dict_from_int
+from versions import compare
+from versions.compare import version_int, version_ints, dict_from_int
 
 
 def test_version_int():
@@ -39,6 +40,32 @@ def test_version_asterix_compare():
     assert version_int('5.*') > version_int('5.0.*')
 
 
+def test_version_int_memo():
+    compare._version_ints.clear()
+    eq_(version_int(u'3.6.*'), 3069900200100)
+    eq_(compare._version_ints, {'3.6.*': 3069900200100})
+    with mock.patch('versions.compare.VERSION_INT_CACHE_SIZE', 1):
+        eq_(version_int('4.0b2'), 4000000102100)
+    eq_(compare._version_ints, {'4.0b2': 4000000102100})
+
+
+def test_version_int_matches_version_dict():
+    for v in ['', None, 'junk', '3', '3.6.*', '5.*', '3.5.0a1pre2', '4.0b12',
+              '100.0', '3.007', '2.0.0.20pre', '1.a|2']:
+        d = compare.version_dict(str(v))
+        ints = [d[k] or 0 for k in ('major', 'minor1', 'minor2', 'minor3')]
+        expected = '%d%02d%02d%02d%d%02d%d%02d' % tuple(ints + [
+            {'a': 0, 'b': 1}.get(d['alpha'], 2), d['alpha_ver'] or 0,
+            0 if d['pre'] else 1, d['pre_ver'] or 0])
+        eq_(version_int(v), int(expected))
+
+
+def test_version_ints():
+    vs = ['3.6.*', '', '3.6.*', '4.0b2', 3]
+    eq_(version_ints(vs), map(version_int, vs))
+    eq_(version_ints([]), [])
+
+
 def test_dict_from_int():
     d = dict_from_int(3050000001002)
     eq_(d['major'], 3)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import multiprocessing
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+import commonware.log
+import cronjobs
+
+from amo.utils import redis_lock
+from zadmin import tasks
+from zadmin.models import ValidationJob
+
+log = commonware.log.getLogger('z.cron')
+
+
+@cronjobs.register
+def resume_validation_jobs(processes=None):
+    """
+    Validate the files that unfinished bulk validation jobs lost along the
+    way, e.g. when the workers restarted, using a local process pool.
+    """
+    with redis_lock('resume_validation_jobs',
+                    settings.BULK_VALIDATION_STALE) as locked:
+        if not locked:
+            log.info('resume_validation_jobs is already running.')
+            return
+        _resume(int(processes or settings.BULK_VALIDATION_PROCESSES))
+
+
+def _resume(processes):
+    stale = datetime.now() - timedelta(
+        seconds=settings.BULK_VALIDATION_STALE)
+    for job in ValidationJob.objects.no_cache().filter(completed=None):
+        newest = job.result_set.aggregate(created=Max('created'))['created']
+        if newest is None:
+            # add_validation_jobs hasn't got to it yet.
+            continue
+        if newest < stale:
+            # Put the counts right first, they can be off if a worker died.
+            # Jobs that are still getting files would count them twice.
+            tasks.tally_job_results(job.id)
+        ids = list(job.result_set.filter(completed=None, modified__lt=stale)
+                   .values_list('id', flat=True))
+        if not ids:
+            continue
+        log.info('Validating %s files left over from job %s.'
+                 % (len(ids), job.id))
+        if processes > 1:
+            # Don't share the db connection with the workers.
+            connection.close()
+            pool = multiprocessing.Pool(processes)
+            pool.map(_validate, ids)
+            pool.close()
+            pool.join()
+        else:
+            map(_validate, ids)
+
+
+def _validate(result_id):
+    try:
+        tasks.validate_file(result_id)
+    except Exception:
+        log.error('Could not validate result %s.' % result_id, exc_info=True)
@@ -53,6 +53,9 @@ class ValidationJob(amo.models.ModelBase):
     finish_email = models.EmailField(null=True)
     completed = models.DateTimeField(null=True, db_index=True)
     creator = models.ForeignKey('users.UserProfile', null=True)
+    # Kept up to date by the tasks so they don't have to count results.
+    num_files = models.IntegerField(default=0)
+    num_completed = models.IntegerField(default=0)
 
     def result_passing(self):
         return self.result_set.exclude(completed=None).filter(errors=0,
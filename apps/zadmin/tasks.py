@@ -8,6 +8,7 @@ import traceback
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection
+from django.db.models import F
 from django.template import Context, Template
 
 from celeryutils import task
@@ -15,7 +16,7 @@ from celeryutils import task
 from addons.models import Addon
 import amo
 from amo import set_user
-from amo.decorators import write
+from amo.decorators import batch_log, write
 from amo.helpers import absolutify
 from amo.urlresolvers import reverse
 from amo.utils import send_mail
@@ -28,6 +29,12 @@ log = logging.getLogger('z.task')
 
 
 def tally_job_results(job_id, **kw):
+    """
+    Recount a job's results from scratch and finish it if they're all done.
+
+    bulk_validate_file() keeps the counts on the job as it goes, this is for
+    putting them right after workers died halfway through a file.
+    """
     sql = """select sum(1),
                     sum(case when completed IS NOT NULL then 1 else 0 end)
              from validation_result
@@ -35,39 +42,91 @@ def tally_job_results(job_id, **kw):
     cursor = connection.cursor()
     cursor.execute(sql, [job_id])
     total, completed = cursor.fetchone()
-    if completed == total:
-        # The job has finished.
-        job = ValidationJob.objects.get(pk=job_id)
-        job.update(completed=datetime.now())
-        if job.finish_email:
-            send_mail(u'Behold! Validation results for %s %s->%s'
-                      % (amo.APP_IDS[job.application.id].pretty,
-                         job.curr_max_version.version,
-                         job.target_version.version),
-                      textwrap.dedent("""
-                          Aww yeah
-                          %s
-                          """ % absolutify(reverse('zadmin.validation'))),
-                      from_email=settings.DEFAULT_FROM_EMAIL,
-                      recipient_list=[job.finish_email])
+    (ValidationJob.objects.filter(pk=job_id)
+     .update(num_files=total or 0, num_completed=completed or 0))
+    finish_job(job_id)
+
+
+def count_result(job_id):
+    ValidationJob.objects.filter(pk=job_id).update(
+        num_completed=F('num_completed') + 1)
+    finish_job(job_id)
+
+
+def finish_job(job_id):
+    # Only one of the results finishing at the same time gets to do this.  A
+    # job without files is one whose files haven't been added yet.
+    finished = (ValidationJob.objects
+                .filter(pk=job_id, completed=None, num_files__gt=0,
+                        num_completed__gte=F('num_files'))
+                .update(completed=datetime.now()))
+    job = ValidationJob.objects.no_cache().get(pk=job_id)
+    ValidationJob.objects.invalidate(job)
+    if finished and job.finish_email:
+        send_mail(u'Behold! Validation results for %s %s->%s'
+                  % (amo.APP_IDS[job.application.id].pretty,
+                     job.curr_max_version.version,
+                     job.target_version.version),
+                  textwrap.dedent("""
+                      Aww yeah
+                      %s
+                      """ % absolutify(reverse('zadmin.validation'))),
+                  from_email=settings.DEFAULT_FROM_EMAIL,
+                  recipient_list=[job.finish_email])
+
+
+def find_validation(res):
+    """
+    The validation of a file with the same hash against the same target
+    version, if we already have one.
+    """
+    if not res.file.hash:
+        return
+    target = res.validation_job.target_version_id
+    qs = (ValidationResult.objects.no_cache()
+          .filter(file__hash=res.file.hash,
+                  validation_job__target_version=target,
+                  completed__isnull=False, task_error=None)
+          .exclude(pk=res.pk).exclude(validation=None)
+          .values_list('validation', flat=True))[:1]
+    return qs[0] if qs else None
 
 
 @task(rate_limit='6/s')
 @write
 def bulk_validate_file(result_id, **kw):
+    task_error = validate_file(result_id)
+    if task_error:
+        etype, val, tb = task_error
+        raise etype, val, tb
+
+
+def validate_file(result_id):
+    """
+    Validate the file of a ValidationResult and count it towards its job.
+
+    Returns the exc_info of anything that went wrong with the validator.
+    """
     res = ValidationResult.objects.get(pk=result_id)
     task_error = None
     validation = None
     try:
         file_base = os.path.basename(res.file.file_path)
-        log.info('[1@None] Validating file %s (%s) for result_id %s'
-                 % (res.file, file_base, res.id))
-        target = res.validation_job.target_version
-        ver = {target.application.guid: [target.version]}
-        overrides = {"targetapp_maxVersion":
-                                {target.application.guid: target.version}}
-        validation = run_validator(res.file.file_path, for_appversions=ver,
-                                   test_all_tiers=True, overrides=overrides)
+        validation = find_validation(res)
+        if validation is not None:
+            log.info('[1@None] Reusing validation of file %s (%s) for '
+                     'result_id %s' % (res.file, file_base, res.id))
+        else:
+            log.info('[1@None] Validating file %s (%s) for result_id %s'
+                     % (res.file, file_base, res.id))
+            target = res.validation_job.target_version
+            ver = {target.application.guid: [target.version]}
+            overrides = {"targetapp_maxVersion":
+                                    {target.application.guid: target.version}}
+            validation = run_validator(res.file.file_path,
+                                       for_appversions=ver,
+                                       test_all_tiers=True,
+                                       overrides=overrides)
     except:
         task_error = sys.exc_info()
         log.error(u"bulk_validate_file exception: %s: %s"
@@ -80,12 +139,14 @@ def bulk_validate_file(result_id, **kw):
         res.apply_validation(validation)
         log.info('[1@None] File %s (%s) errors=%s'
                  % (res.file, file_base, res.errors))
+    # A file can be validated twice if it was queued again after a worker
+    # restart, but it only counts the first time.
+    counted = (ValidationResult.objects.filter(pk=res.pk, completed=None)
+               .update(completed=res.completed))
     res.save()
-    tally_job_results(res.validation_job.id)
-
-    if task_error:
-        etype, val, tb = task_error
-        raise etype, val, tb
+    if counted:
+        count_result(res.validation_job_id)
+    return task_error
 
 
 @task
@@ -147,9 +208,13 @@ def add_validation_jobs(pks, job_pk, **kw):
         ids = set(ids)  # Just in case.
         log.info('Adding %s files for validation for '
                  'addon: %s for job: %s' % (len(ids), addon.pk, job_pk))
-        for id in set(ids):
-            result = ValidationResult.objects.create(validation_job_id=job_pk,
-                                                     file_id=id)
+        results = [ValidationResult.objects.create(validation_job_id=job_pk,
+                                                   file_id=id)
+                   for id in ids]
+        # Count them before any of them can finish.
+        ValidationJob.objects.filter(pk=job_pk).update(
+            num_files=F('num_files') + len(results))
+        for result in results:
             bulk_validate_file.delay(result.pk)
 
 
@@ -173,6 +238,7 @@ def get_context(addon, version, job, results, fileob=None):
 
 @task
 @write
+@batch_log
 def notify_success(version_pks, job_pk, data, **kw):
     log.info('[%s@None] Updating max version for job %s.'
              % (len(version_pks), job_pk))
@@ -239,6 +305,7 @@ def notify_success(version_pks, job_pk, data, **kw):
 
 @task
 @write
+@batch_log
 def notify_failed(file_pks, job_pk, data, **kw):
     log.info('[%s@None] Notifying failed for job %s.'
              % (len(file_pks), job_pk))
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
+import contextlib
 import csv
 from cStringIO import StringIO
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
 from django import test
@@ -29,7 +30,7 @@ from versions.models import ApplicationsVersions, Version
 from zadmin.forms import NotifyForm, FeaturedCollectionForm
 from zadmin.models import ValidationJob, ValidationResult, EmailPreviewTopic
 from zadmin.views import completed_versions_dirty, find_files
-from zadmin import tasks
+from zadmin import cron, tasks
 
 
 no_op_validation = dict(errors=0, warnings=0, notices=0,
@@ -721,6 +722,102 @@ class TestBulkValidationTask(BulkValidationTest):
         eq_(validate.call_args[1]['overrides'],
             {"targetapp_maxVersion": {amo.FIREFOX.guid: '3.7a4'}})
 
+    @mock.patch('zadmin.tasks.run_validator')
+    def test_job_counts(self, run_validator):
+        run_validator.return_value = json.dumps(no_op_validation)
+        self.start_validation()
+        job = ValidationJob.objects.get()
+        eq_(job.num_files, 1)
+        eq_(job.num_completed, 1)
+        assert close_to_now(job.completed)
+        eq_(len(mail.outbox), 1)
+
+    @mock.patch('zadmin.tasks.run_validator')
+    def test_validate_twice(self, run_validator):
+        run_validator.return_value = json.dumps(no_op_validation)
+        job = self.create_job(num_files=2)
+        res = self.create_result(job, self.create_file(), completed=None)
+        tasks.bulk_validate_file(res.id)
+        tasks.bulk_validate_file(res.id)
+        eq_(run_validator.call_count, 2)
+        job = ValidationJob.objects.get(pk=job.pk)
+        eq_(job.num_completed, 1)
+        eq_(job.completed, None)
+
+    @mock.patch('zadmin.tasks.run_validator')
+    def test_reuse_same_hash(self, run_validator):
+        run_validator.return_value = json.dumps(no_op_validation)
+        done = self.create_file()
+        done.update(hash='sha256:abc')
+        self.create_result(self.create_job(), done,
+                           validation=json.dumps(dict(no_op_validation,
+                                                      errors=3)))
+        f = self.create_file()
+        f.update(hash='sha256:abc')
+        res = self.create_result(self.create_job(num_files=1), f,
+                                 completed=None, validation=None)
+        tasks.bulk_validate_file(res.id)
+        assert not run_validator.called
+        res = ValidationResult.objects.get(pk=res.pk)
+        eq_(res.errors, 3)
+        assert close_to_now(res.validation_job.completed)
+
+        # A different target version needs its own validation.
+        res = self.create_result(
+            self.create_job(target_version=self.appversion('3.7a4')), f,
+            completed=None, validation=None)
+        tasks.bulk_validate_file(res.id)
+        assert run_validator.called
+
+    @mock.patch('zadmin.tasks.run_validator')
+    def test_resume(self, run_validator):
+        run_validator.return_value = json.dumps(no_op_validation)
+        job = self.create_job()
+        self.create_result(job, self.create_file())
+        res = self.create_result(job, self.create_file(), completed=None)
+        # The worker handling this one died.
+        day_ago = datetime.now() - timedelta(days=1)
+        ValidationResult.objects.filter(validation_job=job).update(
+            created=day_ago)
+        ValidationResult.objects.filter(pk=res.pk).update(modified=day_ago)
+        cron.resume_validation_jobs(processes=1)
+        assert run_validator.called
+        job = ValidationJob.objects.get(pk=job.pk)
+        eq_((job.num_files, job.num_completed), (2, 2))
+        assert close_to_now(job.completed)
+
+    def test_resume_no_results(self):
+        # The files haven't been added yet, so there's nothing to finish.
+        job = self.create_job()
+        cron.resume_validation_jobs(processes=1)
+        job = ValidationJob.objects.get(pk=job.pk)
+        eq_(job.completed, None)
+        eq_(len(mail.outbox), 0)
+
+    def test_resume_adding_results(self):
+        # add_validation_jobs is still adding files, don't recount.
+        job = self.create_job(num_files=2)
+        self.create_result(job, self.create_file())
+        cron.resume_validation_jobs(processes=1)
+        job = ValidationJob.objects.get(pk=job.pk)
+        eq_(job.num_files, 2)
+        eq_(job.completed, None)
+
+    @mock.patch('zadmin.cron.redis_lock')
+    @mock.patch('zadmin.tasks.run_validator')
+    def test_resume_locked(self, run_validator, redis_lock):
+        @contextlib.contextmanager
+        def taken(*args):
+            # Somebody else is resuming jobs.
+            yield False
+        redis_lock.side_effect = taken
+        res = self.create_result(self.create_job(), self.create_file(),
+                                 completed=None)
+        ValidationResult.objects.filter(pk=res.pk).update(
+            modified=datetime.now() - timedelta(days=1))
+        cron.resume_validation_jobs(processes=1)
+        assert not run_validator.called
+
     def create_version(self, addon, statuses, version_str=None):
         max = self.max
         if version_str:
@@ -0,0 +1,149 @@
+"""
+A read-only index of add-on recommendations.
+
+write() saves {addon: [(other_addon, score)]} as flat arrays: the sorted add-on
+ids, where each add-on's recommendations start, then the other add-on ids and
+scores.  RecsIndex mmaps the file, so looking up a few add-ons only touches a
+few pages and every process on a box shares them.  The web heads mmap a local
+copy, see load().
+"""
+from array import array
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+
+MAGIC = 'RECS'
+VERSION = 1
+HEADER = struct.Struct('<4sII')  # Magic, version, number of add-ons.
+INT = struct.Struct('<I')
+
+
+def write(path, recs):
+    """Write {addon: [(other_addon, score)]} to path, replacing it atomically."""
+    addons = sorted(recs)
+    offsets, others, scores = array('I', [0]), array('I'), array('d')
+    for addon in addons:
+        for other, score in recs[addon]:
+            others.append(other)
+            scores.append(score)
+        offsets.append(len(others))
+
+    tmp = '%s.%s' % (path, os.getpid())
+    with open(tmp, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(addons)))
+        for xs in array('I', addons), offsets, others, scores:
+            if sys.byteorder == 'big':
+                xs.byteswap()
+            xs.tofile(fp)
+    os.rename(tmp, path)
+
+
+class RecsIndex(object):
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self.map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size = HEADER.unpack_from(self.map)
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError('%s is not a version %s recs index.'
+                             % (path, VERSION))
+        self._addons = HEADER.size
+        self._offsets = self._addons + INT.size * self.size
+        self._others = self._offsets + INT.size * (self.size + 1)
+        total = self._offset(self.size)
+        self._scores = self._others + INT.size * total
+
+    def __len__(self):
+        return self.size
+
+    def _offset(self, i):
+        return INT.unpack_from(self.map, self._offsets + INT.size * i)[0]
+
+    def _find(self, addon):
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INT.unpack_from(self.map,
+                               self._addons + INT.size * mid)[0] < addon:
+                lo = mid + 1
+            else:
+                hi = mid
+        if (lo < self.size and
+            INT.unpack_from(self.map, self._addons + INT.size * lo)[0]
+            == addon):
+            return lo
+
+    def get(self, addon):
+        """The [(other_addon, score)] recommended for addon."""
+        i = self._find(addon)
+        if i is None:
+            return []
+        start, end = self._offset(i), self._offset(i + 1)
+        n = end - start
+        others = struct.unpack_from('<%sI' % n, self.map,
+                                    self._others + INT.size * start)
+        scores = struct.unpack_from('<%sd' % n, self.map,
+                                    self._scores + 8 * start)
+        return zip(others, scores)
+
+    def scores(self, addon_ids):
+        """Get a mapping of {addon: {other_addon: score}} for each add-on."""
+        d = {}
+        for addon in addon_ids:
+            recs = self.get(addon)
+            if recs:
+                d[addon] = dict(recs)
+        return d
+
+    def close(self):
+        self.map.close()
+
+
+# {path: (when we last looked at the file, its stat key, RecsIndex)}
+_loaded = {}
+
+
+def load(path, copy_to=None, interval=0):
+    """
+    The RecsIndex at path, or None if there isn't one.
+
+    Indexes stay open between calls and are opened again when the file is
+    replaced, which we only look for every `interval` seconds.  With
+    `copy_to` the index is copied there first and that's what gets mmapped,
+    for when path is on NFS: a mmapped NFS file that gets replaced under us
+    can SIGBUS.
+    """
+    now = time.time()
+    if path in _loaded and now - _loaded[path][0] < interval:
+        return _loaded[path][2]
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _loaded[path] = now, None, None
+        return None
+    key = stat.st_ino, stat.st_mtime, stat.st_size
+    if path in _loaded and _loaded[path][1] == key:
+        ix = _loaded[path][2]
+    elif copy_to:
+        ix = RecsIndex(_copy(path, copy_to, stat))
+    else:
+        ix = RecsIndex(path)
+    _loaded[path] = now, key, ix
+    return ix
+
+
+def _copy(path, dest, stat):
+    """Copy path to dest, unless another process on this box already did."""
+    try:
+        local = os.stat(dest)
+        if (local.st_mtime, local.st_size) == (stat.st_mtime, stat.st_size):
+            return dest
+    except OSError:
+        pass
+    tmp = '%s.%s' % (dest, os.getpid())
+    shutil.copy2(path, tmp)
+    os.rename(tmp, dest)
+    return dest
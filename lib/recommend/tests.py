@@ -1,7 +1,11 @@
 from array import array
+import os
+import tempfile
+
 from nose.tools import eq_
 
 import recommend
+from recommend import index
 
 
 def test_symmetric_diff_count():
@@ -31,3 +35,39 @@ def test_symmetric_diff_count():
 # The algorithm is in flux so this is minimal coverage.
 def test_similarity():
     eq_(1/2., recommend.similarity([1], [1, 2]))
+
+
+def test_index():
+    recs = {3: [(7, .5), (1, .25)], 1: [(3, .25)], 9: []}
+    path = os.path.join(tempfile.mkdtemp(), 'recs.idx')
+    eq_(index.load(path), None)
+    index.write(path, recs)
+    ix = index.load(path)
+    eq_(len(ix), 3)
+    for addon, others in recs.items():
+        eq_(ix.get(addon), others)
+    eq_(ix.get(2), [])
+    eq_(ix.get(10), [])
+    eq_(ix.scores([1, 2, 3, 9]), {1: {3: .25}, 3: {7: .5, 1: .25}})
+    eq_(index.load(path), ix)
+
+    # A new index is picked up once it's written.
+    index.write(path, {4: [(5, 1.)]})
+    ix = index.load(path)
+    eq_(ix.get(4), [(5, 1.)])
+    eq_(ix.get(3), [])
+
+
+def test_index_copy():
+    tmp = tempfile.mkdtemp()
+    path, local = os.path.join(tmp, 'recs.idx'), os.path.join(tmp, 'local.idx')
+    index.write(path, {3: [(7, .5)]})
+    ix = index.load(path, copy_to=local, interval=60)
+    eq_(ix.get(3), [(7, .5)])
+    assert os.path.exists(local)
+
+    # We don't look for a new index until the interval is up.
+    index.write(path, {4: [(5, 1.)]})
+    eq_(index.load(path, copy_to=local, interval=60), ix)
+    ix = index.load(path, copy_to=local, interval=0)
+    eq_(ix.get(4), [(5, 1.)])
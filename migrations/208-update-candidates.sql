@@ -0,0 +1,29 @@
+DROP TABLE IF EXISTS `update_candidates`;
+CREATE TABLE `update_candidates` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `addon_id` int(11) unsigned NOT NULL,
+    `application_id` int(11) unsigned NOT NULL,
+    `platform_id` int(11) unsigned NOT NULL,
+    `file_status` smallint(5) unsigned NOT NULL,
+    `version_id` int(11) unsigned NOT NULL,
+    `version` varchar(255) NOT NULL DEFAULT '',
+    `releasenotes` int(11) unsigned,
+    `file_id` int(11) unsigned NOT NULL,
+    `filename` varchar(255) NOT NULL DEFAULT '',
+    `hash` varchar(255) NOT NULL DEFAULT '',
+    `datestatuschanged` datetime,
+    `min` varchar(255) NOT NULL,
+    `max` varchar(255) NOT NULL,
+    `min_int` bigint NOT NULL,
+    `max_int` bigint NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+ALTER TABLE `update_candidates`
+    ADD CONSTRAINT FOREIGN KEY (`addon_id`) REFERENCES `addons` (`id`)
+    ON DELETE CASCADE;
+ALTER TABLE `update_candidates`
+    ADD CONSTRAINT FOREIGN KEY (`application_id`)
+    REFERENCES `applications` (`id`);
+
+CREATE INDEX `addon_app_idx` ON `update_candidates`
+    (`addon_id`, `application_id`, `min_int`);
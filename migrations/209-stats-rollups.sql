@@ -0,0 +1,32 @@
+DROP TABLE IF EXISTS `download_counts_rollup`;
+CREATE TABLE `download_counts_rollup` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `addon_id` int(11) unsigned NOT NULL,
+    `period` varchar(5) NOT NULL,
+    `date` date NOT NULL,
+    `n_rows` int(11) unsigned NOT NULL DEFAULT 0,
+    `max_id` int(11) unsigned NOT NULL DEFAULT 0,
+    `count` int(11) unsigned NOT NULL DEFAULT 0,
+    `src` text,
+    UNIQUE KEY `addon_period_date` (`addon_id`, `period`, `date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+DROP TABLE IF EXISTS `update_counts_rollup`;
+CREATE TABLE `update_counts_rollup` (
+    `id` int(11) unsigned AUTO_INCREMENT NOT NULL PRIMARY KEY,
+    `addon_id` int(11) unsigned NOT NULL,
+    `period` varchar(5) NOT NULL,
+    `date` date NOT NULL,
+    `n_rows` int(11) unsigned NOT NULL DEFAULT 0,
+    `max_id` int(11) unsigned NOT NULL DEFAULT 0,
+    `count` int(11) unsigned NOT NULL DEFAULT 0,
+    `version` text,
+    `status` text,
+    `application` text,
+    `os` text,
+    `locale` text,
+    UNIQUE KEY `addon_period_date` (`addon_id`, `period`, `date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE INDEX `max_id_idx` ON `download_counts_rollup` (`max_id`);
+CREATE INDEX `max_id_idx` ON `update_counts_rollup` (`max_id`);
@@ -0,0 +1,13 @@
+ALTER TABLE `validation_job`
+    ADD COLUMN `num_files` int(11) unsigned NOT NULL DEFAULT 0,
+    ADD COLUMN `num_completed` int(11) unsigned NOT NULL DEFAULT 0;
+
+UPDATE `validation_job` SET
+    `num_files` = (SELECT COUNT(*) FROM `validation_result`
+                   WHERE `validation_job_id` = `validation_job`.`id`),
+    `num_completed` = (SELECT COUNT(*) FROM `validation_result`
+                       WHERE `validation_job_id` = `validation_job`.`id`
+                       AND `completed` IS NOT NULL);
+
+-- Bulk validation reuses results for files with the same hash.
+CREATE INDEX `hash_idx` ON `files` (`hash`);
@@ -0,0 +1,98 @@
+"""
+Benchmark versions.compare.version_int.
+
+Times the old parse-format-reparse version_int against the memoized one and
+version_ints() over a made-up appversions table, and checks that every
+version gets exactly the same integer from all three.
+
+    python scripts/bench_versions.py --versions=5000 --loops=20
+"""
+import os
+import random
+import sys
+from optparse import OptionParser
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'apps'))
+
+from versions import compare
+
+
+def old_version_int(version):
+    """version_int as it was: version_dict() turned into a string."""
+    d = compare.version_dict(str(version))
+    for key in ['alpha_ver', 'major', 'minor1', 'minor2', 'minor3',
+                'pre_ver']:
+        if not d[key]:
+            d[key] = 0
+    atrans = {'a': 0, 'b': 1}
+    d['alpha'] = atrans.get(d['alpha'], 2)
+    d['pre'] = 0 if d['pre'] else 1
+
+    v = "%d%02d%02d%02d%d%02d%d%02d" % (d['major'], d['minor1'],
+            d['minor2'], d['minor3'], d['alpha'], d['alpha_ver'], d['pre'],
+            d['pre_ver'])
+    return int(v)
+
+
+def make_versions(n):
+    """Versions shaped like the ones in appversions and update pings."""
+    suffixes = ['', '', '', 'a1', 'b2', 'pre', 'a1pre', 'b3pre2', '.*', '*']
+    rv = ['', 'junk', '3', '3.6.*', '100.0', '3.5.0a1pre2', '4.0b12pre']
+    while len(rv) < n:
+        parts = [random.randint(0, 20)]
+        for i in range(random.randint(0, 3)):
+            parts.append(random.choice([0, 0, 1, 5, 9, 10, 99, 123]))
+        rv.append('.'.join(map(str, parts)) + random.choice(suffixes))
+    return rv
+
+
+def timeit(fn, loops):
+    start = time()
+    for i in range(loops):
+        fn()
+    return (time() - start) / loops
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--versions', type='int', default=5000,
+                      help='distinct versions in the table')
+    parser.add_option('--loops', type='int', default=20,
+                      help='passes over the table')
+    options, args = parser.parse_args()
+
+    random.seed(0)
+    versions = make_versions(options.versions)
+    # Pings and appversion joins repeat the same handful of versions a lot.
+    pings = [random.choice(versions[:50]) for i in range(len(versions) * 4)]
+
+    expected = map(old_version_int, versions + pings)
+    compare._version_ints.clear()
+    got = [compare.version_int(v) for v in versions + pings]
+    batch = compare.version_ints(versions + pings)
+    bad = [v for v, e, g, b in zip(versions + pings, expected, got, batch)
+           if not e == g == b]
+    if bad:
+        print 'MISMATCH for %s versions, e.g. %r' % (len(bad), bad[:5])
+        sys.exit(1)
+    print 'parity: %s versions identical' % len(expected)
+
+    data = versions + pings
+    old = timeit(lambda: map(old_version_int, data), options.loops)
+    cold = timeit(lambda: (compare._version_ints.clear(),
+                           map(compare.version_int, data)), options.loops)
+    warm = timeit(lambda: map(compare.version_int, data), options.loops)
+    compare._version_ints.clear()
+    batch = timeit(lambda: compare.version_ints(data), options.loops)
+
+    print '%s versions per pass' % len(data)
+    for name, t in [('old version_int', old),
+                    ('version_int, empty memo', cold),
+                    ('version_int, warm memo', warm),
+                    ('version_ints', batch)]:
+        print '%-25s %8.2fms  %5.1fx' % (name, t * 1000, old / t)
+
+
+if __name__ == '__main__':
+    main()
@@ -50,12 +50,14 @@ HOME = /tmp
 # Every minute!
 * * * * * $Z_CRON fast_current_version
 * * * * * $Z_CRON migrate_collection_users
+* * * * * $Z_CRON flush_synced_collections
 
 # Every 30 minutes.
 */30 * * * * $Z_CRON tag_jetpacks
 */30 * * * * $Z_CRON update_addons_current_version
 
 #once per hour
+0 * * * * $Z_CRON resume_validation_jobs
 5 * * * * $Z_CRON update_collections_subscribers
 10 * * * * $Z_CRON update_blog_posts
 15 * * * * $REMORA; php -f update-search-views.php
@@ -97,6 +99,7 @@ HOME = /tmp
 30 8 * * * $REMORA; /usr/bin/python26 maintenance.py personas_adu
 30 9 * * * $REMORA; /usr/bin/python26 maintenance.py share_count_totals
 30 10 * * * $Z_CRON recs
+30 11 * * * $Z_CRON update_all_update_candidates
 30 20 * * * $Z_CRON update_perf
 30 22 * * * $Z_CRON deliver_hotness
 30 23 * * * $Z_CRON collection_meta
@@ -107,10 +110,12 @@ HOME = /tmp
 #Once per day after 2100 PST (after metrics is done)
 35 21 * * * $Z_CRON update_addon_download_totals
 40 21 * * * $REMORA; /usr/bin/python26 maintenance.py weekly
+45 21 * * * $Z_CRON update_stats_rollups
 35 22 * * * $Z_CRON update_global_totals
 40 22 * * * $Z_CRON update_addon_average_daily_users
 
 # Once per week
+30 4 * * 0 $Z_CRON addon_reviews_ratings_full
 45 23 * * 4 $REMORA; php -f maintenance.php unconfirmed
 
 MAILTO=root
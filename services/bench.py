@@ -0,0 +1,337 @@
+"""
+Benchmark the update service.
+
+Seeds a SQLite stand-in for the update tables with made-up add-ons,
+versions and files, then sends pings through update.application() and
+reports latency percentiles, queries per ping and time spent waiting on the
+connection pool for each engine, with and without the per-process cache.
+Pings favour popular add-ons the way real traffic does.
+
+    python services/bench.py --addons=2000 --pings=20000
+    python services/bench.py --mysql   # ping SERVICES_DATABASE as it is
+    python services/bench.py --http    # go through a local wsgiref server
+"""
+import bisect
+import os
+import random
+import re
+import site
+import sqlite3
+import tempfile
+import threading
+from optparse import OptionParser
+from time import time
+from urllib import urlencode
+import urllib2
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+wsgidir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wsgi')
+for path in ['../', '../..',
+             '../../vendor/src',
+             '../../vendor/src/django',
+             '../../vendor/src/nuggets',
+             '../../vendor/src/commonware',
+             '../../vendor/src/tower',
+             '../../lib',
+             '../../vendor/lib/python',
+             '../../apps']:
+    site.addsitedir(os.path.abspath(os.path.join(wsgidir, path)))
+
+import sqlalchemy.pool as pool
+
+import update
+from utils import (APP_GUIDS, PLATFORMS, STATUS_PUBLIC, STATUS_LITE,
+                   STATUS_UNREVIEWED)
+from versions.compare import version_int
+
+
+APP_VERSIONS = ['2.0', '3.0', '3.5', '3.6', '4.0', '5.0', '6.0', '7.0']
+OSES = ['WINNT', 'Darwin', 'Linux']
+
+schema = """
+CREATE TABLE addons (id integer PRIMARY KEY, guid varchar(255),
+    status integer, addontype_id integer, inactive integer);
+CREATE TABLE versions (id integer PRIMARY KEY, addon_id integer,
+    version varchar(255), releasenotes integer);
+CREATE TABLE files (id integer PRIMARY KEY, version_id integer,
+    platform_id integer, status integer, hash varchar(255),
+    filename varchar(255), datestatuschanged timestamp);
+CREATE TABLE applications (id integer PRIMARY KEY, guid varchar(255));
+CREATE TABLE appversions (id integer PRIMARY KEY, application_id integer,
+    version varchar(255), version_int bigint);
+CREATE TABLE applications_versions (id integer PRIMARY KEY,
+    application_id integer, version_id integer, min integer, max integer);
+CREATE TABLE update_candidates (id integer PRIMARY KEY, addon_id integer,
+    application_id integer, platform_id integer, file_status integer,
+    version_id integer, version varchar(255), releasenotes integer,
+    file_id integer, filename varchar(255), hash varchar(255),
+    datestatuschanged timestamp, min varchar(255), max varchar(255),
+    min_int bigint, max_int bigint);
+CREATE INDEX addons_guid ON addons (guid);
+CREATE INDEX versions_addon ON versions (addon_id);
+CREATE INDEX files_version ON files (version_id);
+CREATE INDEX av_version ON applications_versions (version_id);
+CREATE INDEX uc_addon_app ON update_candidates
+    (addon_id, application_id, min_int);
+"""
+
+candidates_sql = """
+INSERT INTO update_candidates
+    (addon_id, application_id, platform_id, file_status, version_id,
+     version, releasenotes, file_id, filename, hash, datestatuschanged,
+     min, max, min_int, max_int)
+SELECT versions.addon_id, applications_versions.application_id,
+    files.platform_id, files.status, versions.id, versions.version,
+    versions.releasenotes, files.id, files.filename, files.hash,
+    files.datestatuschanged, appmin.version, appmax.version,
+    appmin.version_int, appmax.version_int
+FROM versions
+INNER JOIN applications_versions
+    ON applications_versions.version_id = versions.id
+INNER JOIN appversions appmin ON appmin.id = applications_versions.min
+INNER JOIN appversions appmax ON appmax.id = applications_versions.max
+INNER JOIN files ON files.version_id = versions.id"""
+
+
+stats = {'queries': 0, 'wait': 0.0}
+
+
+class Cursor(object):
+    """Counts queries, and turns MySQLdb's params into SQLite's."""
+    param_re = re.compile(r'%\((\w+)\)s')
+
+    def __init__(self, cursor, sqlite):
+        self.cursor, self.sqlite = cursor, sqlite
+
+    def execute(self, sql, params):
+        stats['queries'] += 1
+        if not self.sqlite:
+            return self.cursor.execute(sql, params)
+
+        args = []
+
+        def sub(match):
+            value = params[match.group(1)]
+            if isinstance(value, (list, tuple)):
+                args.extend(value)
+                return '(%s)' % ','.join('?' * len(value))
+            args.append(value)
+            return '?'
+        return self.cursor.execute(self.param_re.sub(sub, sql), args)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+
+class Connection(object):
+
+    def __init__(self, conn, sqlite):
+        self.conn, self.sqlite = conn, sqlite
+
+    def cursor(self):
+        return Cursor(self.conn.cursor(), self.sqlite)
+
+    def __getattr__(self, attr):
+        return getattr(self.conn, attr)
+
+
+class TimedPool(object):
+    """Wraps the service's pool to time how long pings wait on it."""
+
+    def __init__(self, pool, sqlite):
+        self.pool, self.sqlite = pool, sqlite
+
+    def connect(self):
+        start = time()
+        conn = self.pool.connect()
+        stats['wait'] += time() - start
+        return Connection(conn, self.sqlite)
+
+
+def seed(filename, num_addons):
+    """Fill the SQLite db with add-ons and return (guid, [versions])."""
+    db = sqlite3.connect(filename)
+    db.executescript(schema)
+    app_guid = [g for g, id in APP_GUIDS.items() if id == 1][0]
+    db.execute('INSERT INTO applications VALUES (1, ?)', (app_guid,))
+    for idx, v in enumerate(APP_VERSIONS):
+        db.execute('INSERT INTO appversions VALUES (?, 1, ?, ?)',
+                   (idx + 1, v, version_int(v)))
+    # Give every app version a star release as well for the max.
+    stars = len(APP_VERSIONS)
+    for idx, v in enumerate(APP_VERSIONS):
+        db.execute('INSERT INTO appversions VALUES (?, 1, ?, ?)',
+                   (stars + idx + 1, v + '.*', version_int(v + '.*')))
+
+    platforms = [PLATFORMS[os_] for os_ in OSES]
+    version_id = file_id = av_id = 0
+    addons = []
+    for addon_id in range(1, num_addons + 1):
+        guid = 'addon%s@bench.example.com' % addon_id
+        status = STATUS_LITE if random.random() < .1 else STATUS_PUBLIC
+        db.execute('INSERT INTO addons VALUES (?, ?, ?, 1, 0)',
+                   (addon_id, guid, status))
+        versions = []
+        num_versions = min(30, 1 + int(random.expovariate(1 / 3.0)))
+        low = random.randint(0, len(APP_VERSIONS) - 1)
+        for v in range(num_versions):
+            version_id += 1
+            version = '1.%s' % v
+            versions.append(version)
+            notes = version_id if random.random() < .5 else None
+            db.execute('INSERT INTO versions VALUES (?, ?, ?, ?)',
+                       (version_id, addon_id, version, notes))
+            # Later versions support later app versions.
+            low = min(len(APP_VERSIONS) - 1, low + random.randint(0, 1))
+            high = random.randint(low, len(APP_VERSIONS) - 1)
+            av_id += 1
+            db.execute('INSERT INTO applications_versions '
+                       'VALUES (?, 1, ?, ?, ?)',
+                       (av_id, version_id, low + 1, stars + high + 1))
+            if v == num_versions - 1 and random.random() < .2:
+                file_status = STATUS_UNREVIEWED
+            else:
+                file_status = status
+            if random.random() < .1:
+                file_platforms = random.sample(platforms, 2)
+            else:
+                file_platforms = [1]
+            for platform in file_platforms:
+                file_id += 1
+                db.execute('INSERT INTO files VALUES '
+                           "(?, ?, ?, ?, ?, ?, datetime('2011-01-01'))",
+                           (file_id, version_id, platform, file_status,
+                            'sha256:%040x' % random.getrandbits(160),
+                            'addon-%s-%s.xpi' % (addon_id, version)))
+        addons.append((guid, versions))
+    db.execute(candidates_sql)
+    db.commit()
+    db.close()
+    return addons
+
+
+def existing_addons(num_addons):
+    """Pick add-ons to ping from SERVICES_DATABASE."""
+    cursor = update.getconn().cursor()
+    cursor.execute("""
+        SELECT addons.guid, versions.version FROM addons
+        INNER JOIN versions ON versions.addon_id = addons.id
+        WHERE addons.inactive = 0 AND addons.guid IS NOT NULL
+        ORDER BY addons.id DESC LIMIT %s""" % (num_addons * 5))
+    addons = {}
+    for guid, version in cursor.fetchall():
+        addons.setdefault(guid, []).append(version)
+    return addons.items()[:num_addons]
+
+
+def make_pings(addons, num_pings):
+    """Pings for `addons`, most of them for the first few add-ons."""
+    app_guid = [g for g, id in APP_GUIDS.items() if id == 1][0]
+    total, weights = 0, []
+    for rank in range(len(addons)):
+        total += 1 / float(rank + 1) ** 1.1
+        weights.append(total)
+    pings = []
+    for i in range(num_pings):
+        guid, versions = addons[bisect.bisect(weights,
+                                              random.random() * total)]
+        pings.append({'id': guid, 'version': random.choice(versions),
+                      'reqVersion': 2, 'appID': app_guid,
+                      'appVersion': random.choice(APP_VERSIONS),
+                      'appOS': random.choice(OSES)})
+    return pings
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    server = make_server('127.0.0.1', 0, update.application,
+                         handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%s/' % server.server_port
+
+
+def run(pings, url=None):
+    """Send the pings and return the latency of each in seconds."""
+    latencies = []
+    for ping in pings:
+        query = urlencode(ping)
+        start = time()
+        if url:
+            urllib2.urlopen(url + '?' + query).read()
+        else:
+            environ = {'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '',
+                       'QUERY_STRING': query}
+            ''.join(update.application(environ, lambda *args: None))
+        latencies.append(time() - start)
+    return latencies
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--addons', type='int', default=1000,
+                      help='Number of add-ons to ping.')
+    parser.add_option('--pings', type='int', default=10000,
+                      help='Number of pings for each run.')
+    parser.add_option('--mysql', action='store_true', default=False,
+                      help='Use the add-ons in SERVICES_DATABASE.')
+    parser.add_option('--http', action='store_true', default=False,
+                      help='Ping a local WSGI server, not application().')
+    parser.add_option('--engines', default='sql,index',
+                      help='Comma separated engines to run.')
+    parser.add_option('--seed', type='int', default=0,
+                      help='Random seed, so runs can be compared.')
+    options, args = parser.parse_args()
+    random.seed(options.seed)
+
+    if options.mysql:
+        addons = existing_addons(options.addons)
+        real_pool = update.mypool
+    else:
+        filename = tempfile.mkstemp(suffix='.db')[1]
+        addons = seed(filename, options.addons)
+        connect = lambda: sqlite3.connect(
+            filename, detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False)
+        real_pool = pool.QueuePool(connect, max_overflow=10, pool_size=5)
+    update.mypool = TimedPool(real_pool, not options.mysql)
+    url = serve() if options.http else None
+    pings = make_pings(addons, options.pings)
+
+    print ('%-6s %-5s %8s %8s %8s %8s %10s %10s' %
+           ('engine', 'cache', 'pings', 'p50 ms', 'p95 ms', 'p99 ms',
+            'queries', 'wait ms'))
+    size = update.update_cache.size
+    for engine in options.engines.split(','):
+        update.settings.UPDATE_INDEX_RATE = 100 if engine == 'index' else 0
+        for cached in (False, True):
+            update.update_cache.clear()
+            update.rdf_cache.clear()
+            update.update_cache.size = update.rdf_cache.size = (
+                size if cached else 0)
+            stats.update(queries=0, wait=0.0)
+            latencies = sorted(run(pings, url))
+            print ('%-6s %-5s %8s %8.2f %8.2f %8.2f %10.2f %10.3f' %
+                   (engine, cached and 'on' or 'off', len(latencies),
+                    percentile(latencies, 50) * 1000,
+                    percentile(latencies, 95) * 1000,
+                    percentile(latencies, 99) * 1000,
+                    stats['queries'] / float(len(latencies)),
+                    stats['wait'] * 1000 / len(latencies)))
+
+    if not options.mysql:
+        os.unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
+import bisect
 from email.Utils import formatdate
 from email.mime.text import MIMEText
+import hashlib
+import json
+from random import random
 import smtplib
 import sys
-from time import time
+from time import mktime, time
 import traceback
 from urlparse import parse_qsl
 
@@ -16,21 +20,30 @@ import settings_local as settings
 setup_environ(settings)
 import log_settings
 
+from django.core.cache import cache
+
 try:
     from compare import version_int
 except ImportError:
     from apps.versions.compare import version_int
 
-from utils import (get_mirror,
+from constants.platforms import PLATFORM_ALL
+from utils import (get_mirror, update_flush_key, UpdateCache,
                    APP_GUIDS, PLATFORMS, VERSION_BETA,
                    STATUS_PUBLIC, STATUSES_PUBLIC, STATUS_BETA, STATUS_NULL,
                    STATUS_LITE, STATUS_LITE_AND_NOMINATED, ADDON_SLUGS_UPDATE)
 
 
-good_rdf = """<?xml version="1.0"?>
+rdf_header = """<?xml version="1.0"?>
 <RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
          xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
+"""
+
+
+rdf_footer = """</RDF:RDF>"""
+
+
+good_rdf_body = """    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
                 <RDF:li resource="urn:mozilla:%(type)s:%(guid)s:%(version)s"/>
@@ -51,25 +64,21 @@ good_rdf = """<?xml version="1.0"?>
             </RDF:Description>
         </em:targetApplication>
     </RDF:Description>
-</RDF:RDF>"""
+"""
 
 
-bad_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-</RDF:RDF>"""
-
-
-no_updates_rdf = """<?xml version="1.0"?>
-<RDF:RDF xmlns:RDF="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-         xmlns:em="http://www.mozilla.org/2004/em-rdf#">
-    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
+no_updates_rdf_body = """    <RDF:Description about="urn:mozilla:%(type)s:%(guid)s">
         <em:updates>
             <RDF:Seq>
             </RDF:Seq>
         </em:updates>
     </RDF:Description>
-</RDF:RDF>"""
+"""
+
+
+good_rdf = rdf_header + good_rdf_body + rdf_footer
+bad_rdf = rdf_header + rdf_footer
+no_updates_rdf = rdf_header + no_updates_rdf_body + rdf_footer
 
 
 timing_log = commonware.log.getLogger('z.timer')
@@ -84,24 +93,42 @@ def getconn():
 
 mypool = pool.QueuePool(getconn, max_overflow=10, pool_size=5, recycle=300)
 
+# Repeat pings for the same add-on and app are answered from here.
+update_cache = UpdateCache(settings.UPDATE_CACHE_SIZE,
+                           settings.UPDATE_CACHE_TIMEOUT)
+# And the RDF we send back for them.
+rdf_cache = UpdateCache(settings.UPDATE_CACHE_SIZE,
+                        settings.UPDATE_CACHE_TIMEOUT)
+
 
 class Update(object):
 
-    def __init__(self, data):
+    def __init__(self, data, engine='sql'):
+        # The engine is either 'sql', which joins across the live tables, or
+        # 'index', which looks in update_candidates.
+        self.engine = engine
         self.conn, self.cursor = None, None
         self.data = data.copy()
         self.data['row'] = {}
         self.flags = {'use_version': False, 'multiple_status': False}
         self.is_beta_version = False
         self.version_int = 0
+        self.flushed = 0
+        # BulkUpdate looks these up for all its add-ons at once and fills
+        # them in, `addon` is False if the guid wasn't found.
+        self.addon, self.candidates = None, None
 
-    def is_valid(self):
+    def execute(self, sql, params):
         # If you accessing this from unit tests, then before calling
-        # is valid, you can assign your own cursor.
+        # is valid, you can assign your own cursor. Otherwise we only go
+        # to the pool when something isn't in the update cache.
         if not self.cursor:
             self.conn = mypool.connect()
             self.cursor = self.conn.cursor()
+        self.cursor.execute(sql, params)
+        return self.cursor
 
+    def is_valid(self):
         data = self.data
 
         for field in ['reqVersion', 'id', 'version', 'appID', 'appVersion']:
@@ -112,11 +139,10 @@ class Update(object):
         if not data['app_id']:
             return False
 
-        sql = """SELECT id, status, addontype_id, guid FROM addons
-                 WHERE guid = %(guid)s AND inactive = 0 LIMIT 1;"""
-        self.cursor.execute(sql, {'guid': self.data['id']})
-        result = self.cursor.fetchone()
+        result = self.addon
         if result is None:
+            result = self.get_addon()
+        if not result:
             return False
 
         data['id'], data['addon_status'], data['type'], data['guid'] = result
@@ -133,6 +159,22 @@ class Update(object):
         self.is_beta_version = VERSION_BETA.search(data.get('version', ''))
         return True
 
+    def get_addon(self):
+        data = self.data
+        # Anything cached for this add-on before zamboni last flushed it
+        # is stale, see addons.models.flush_update_cache.
+        self.flushed = cache.get(update_flush_key(data['id'])) or 0
+
+        key = ('addon', data['id'])
+        result = update_cache.get(key, self.flushed)
+        if result is None:
+            sql = """SELECT id, status, addontype_id, guid FROM addons
+                     WHERE guid = %(guid)s AND inactive = 0 LIMIT 1;"""
+            result = self.execute(sql, {'guid': data['id']}).fetchone()
+            if result is not None:
+                update_cache.set(key, result)
+        return result
+
     def get_beta(self):
         data = self.data
         data['status'] = STATUS_PUBLIC
@@ -147,8 +189,7 @@ class Update(object):
                     ON files.version_id = versions.id
                     WHERE versions.addon_id = %(id)s
                           AND versions.version = %(version)s LIMIT 1;"""
-                self.cursor.execute(sql, data)
-                result = self.cursor.fetchone()
+                result = self.execute(sql, data).fetchone()
                 # Only change the status if there are files.
                 if result is not None:
                     status = result[1]
@@ -171,6 +212,34 @@ class Update(object):
         self.get_beta()
         data = self.data
 
+        key = ('update', self.engine, data['guid'], data['app_id'],
+               data.get('appOS'),
+               data['status'], self.flags['multiple_status'],
+               self.flags['use_version'] and data['version'],
+               data['version_int'])
+        if self.candidates is not None:
+            row = self.choose(self.candidates)
+        else:
+            row = update_cache.get(key, self.flushed)
+            if row is None:
+                row = self.get_row()
+                update_cache.set(key, row)
+
+        if row:
+            # The mirror depends on how long ago the file was published, so
+            # it's worked out every time.
+            row = row.copy()
+            row['url'] = get_mirror(data['addon_status'], data['id'], row)
+            data['row'] = row
+            return True
+
+        return False
+
+    def get_row(self):
+        if self.engine == 'index':
+            return self.get_indexed_row()
+
+        data = self.data
         sql = """
             SELECT
                 addons.guid as guid, addons.addontype_id as type,
@@ -217,8 +286,7 @@ class Update(object):
             ORDER BY versions.id DESC LIMIT 1;
             """
 
-        self.cursor.execute(sql, data)
-        result = self.cursor.fetchone()
+        result = self.execute(sql, data).fetchone()
         if result:
             row = dict(zip([
                 'guid', 'type', 'disabled_by_user', 'appguid', 'min', 'max',
@@ -226,13 +294,64 @@ class Update(object):
                 'datestatuschanged', 'releasenotes', 'version'],
                 list(result)))
             row['type'] = ADDON_SLUGS_UPDATE[row['type']]
-            row['url'] = get_mirror(self.data['addon_status'],
-                                    self.data['id'], row)
-            data['row'] = row
-            return True
+            return row
 
         return False
 
+    def get_indexed_row(self):
+        """
+        Find the update in the update_candidates rows for this add-on and
+        app, which are kept up to date by addons.tasks.update_candidates.
+        """
+        data = self.data
+        sql = """
+            SELECT min_int, max_int, version_id, platform_id, file_status,
+                version, min, max, file_id, hash, filename,
+                datestatuschanged, releasenotes
+            FROM update_candidates
+            WHERE addon_id = %(id)s AND application_id = %(app_id)s
+            ORDER BY min_int;"""
+        return self.choose(self.execute(sql, data).fetchall())
+
+    def choose(self, candidates):
+        """
+        Pick the update from `candidates`, which are update_candidates rows
+        for this add-on and app ordered by min_int.
+        """
+        data = self.data
+        # Only the candidates with a low enough min can match.
+        mins = [c[0] for c in candidates]
+        end = bisect.bisect_right(mins, data['version_int'])
+
+        platforms = (PLATFORM_ALL.id, data.get('appOS'))
+        if self.flags['use_version']:
+            version = data['version'].lower()
+            status_ok = lambda c: (c[4] > data['status']
+                                   and c[5].lower() == version)
+        elif self.flags['multiple_status']:
+            status_ok = lambda c: c[4] in STATUSES_PUBLIC.values()
+        else:
+            status_ok = lambda c: c[4] == data['status']
+
+        best = None
+        for c in candidates[:end]:
+            if (c[1] >= data['version_int'] and c[3] in platforms
+                and status_ok(c) and (best is None or c[2] > best[2])):
+                best = c
+
+        if best is None:
+            return False
+
+        row = dict(zip([
+            'version_id', 'file_status', 'version', 'min', 'max', 'file_id',
+            'hash', 'filename', 'datestatuschanged', 'releasenotes'],
+            [best[2]] + list(best[4:])))
+        # The add-on was found with inactive = 0 in is_valid().
+        row.update(guid=data['guid'], disabled_by_user=0,
+                   type=ADDON_SLUGS_UPDATE[data['type']],
+                   appguid=data['appID'])
+        return row
+
     def get_bad_rdf(self):
         return bad_rdf
 
@@ -244,16 +363,43 @@ class Update(object):
                 rdf = self.get_no_updates_rdf()
         else:
             rdf = self.get_bad_rdf()
-        self.cursor.close()
+        if self.cursor:
+            self.cursor.close()
         if self.conn:
             self.conn.close()
         return rdf
 
     def get_no_updates_rdf(self):
+        return rdf_header + self.get_no_updates_body() + rdf_footer
+
+    def get_no_updates_body(self):
         name = ADDON_SLUGS_UPDATE[self.data['type']]
-        return no_updates_rdf % ({'guid': self.data['guid'], 'type': name})
+        return no_updates_rdf_body % ({'guid': self.data['guid'],
+                                       'type': name})
 
     def get_good_rdf(self):
+        return self.get_rendered()[1]
+
+    def get_good_body(self):
+        return self.get_rendered()[0]
+
+    def get_rendered(self):
+        """
+        The RDF body and full document for the update, plus its ETag. These
+        only change with the file, the app and the mirror it's served from,
+        so they're rendered once and cached like the lookups.
+        """
+        row = self.data['row']
+        key = ('rdf', row['file_id'], row['appguid'], row['url'])
+        rendered = rdf_cache.get(key, self.flushed)
+        if rendered is None:
+            body = self.render_good_body()
+            doc = rdf_header + body + rdf_footer
+            rendered = (body, doc, '"%s"' % hashlib.md5(doc).hexdigest())
+            rdf_cache.set(key, rendered)
+        return rendered
+
+    def render_good_body(self):
         data = self.data['row']
         data['if_hash'] = ''
         if data['hash']:
@@ -267,17 +413,218 @@ class Update(object):
                                  (settings.SITE_URL, '/versions/updateInfo/',
                                   data['version_id']))
 
-        return good_rdf % data
+        return good_rdf_body % data
+
+    def get_json(self):
+        """The update as a dict for BulkUpdate's JSON output."""
+        row = self.data['row']
+        if not row:
+            return None
+        update_info = None
+        if row['releasenotes']:
+            update_info = '%s/versions/updateInfo/%s/%%APP_LOCALE%%/' % (
+                settings.SITE_URL, row['version_id'])
+        return {'version': row['version'], 'min': row['min'],
+                'max': row['max'], 'url': row['url'],
+                'hash': row['hash'] or None, 'update_info': update_info}
 
     def format_date(self, secs):
-        return '%s GMT' % formatdate(time() + secs)[:25]
+        return format_date(secs)
+
+    def get_last_modified(self):
+        """
+        When the update last changed, in seconds since the epoch, or None if
+        there isn't one. That's when the file's status changed, or when it
+        moved to the mirrors.
+        """
+        row = self.data['row']
+        if not row or not row['datestatuschanged']:
+            return None
+        modified = mktime(row['datestatuschanged'].timetuple())
+        if row['url'].startswith(settings.MIRROR_URL):
+            modified += settings.MIRROR_DELAY * 60
+        return modified
+
+    def is_not_modified(self, environ):
+        """
+        Can we answer a conditional GET with a 304?
+
+        Only the ETag says so.  If-Modified-Since isn't enough: when the
+        newest file goes away the update falls back to an older one, and
+        its last modified time goes back with it.
+        """
+        if not self.data['row']:
+            return False
+        etags = environ.get('HTTP_IF_NONE_MATCH')
+        if etags:
+            etags = [e.strip() for e in etags.split(',')]
+            return '*' in etags or self.get_rendered()[2] in etags
+        return False
 
     def get_headers(self, length):
-        return [('Content-Type', 'text/xml'),
+        modified = self.get_last_modified()
+        if modified:
+            last_modified = '%s GMT' % formatdate(modified)[:25]
+        else:
+            last_modified = self.format_date(0)
+        headers = [('Content-Type', 'text/xml'),
+                   ('Cache-Control', 'public, max-age=3600'),
+                   ('Last-Modified', last_modified),
+                   ('Expires', self.format_date(3600)),
+                   ('Content-Length', str(length))]
+        if self.data['row']:
+            headers.append(('ETag', self.get_rendered()[2]))
+        return headers
+
+
+class BulkUpdate(object):
+    """
+    Updates for many add-ons on one app, for clients and tools checking
+    lots of add-ons at once. The add-ons and their candidates are fetched
+    with one query each, whichever engine is used.
+    """
+
+    def __init__(self, data, items, engine='sql'):
+        self.engine = engine
+        self.conn, self.cursor = None, None
+        self.updates = [Update(dict(data, id=guid, version=version),
+                               engine=engine)
+                        for guid, version in items]
+        self.valid = []
+
+    def execute(self, sql, params):
+        if not self.cursor:
+            self.conn = mypool.connect()
+            self.cursor = self.conn.cursor()
+        self.cursor.execute(sql, params)
+        return self.cursor
+
+    def resolve(self):
+        if not self.updates:
+            return
+
+        data = self.updates[0].data
+        if (data.get('appID') not in APP_GUIDS
+            or 'appVersion' not in data):
+            return
+
+        sql = """SELECT id, status, addontype_id, guid FROM addons
+                 WHERE guid IN %(guids)s AND inactive = 0;"""
+        guids = tuple(set(up.data['id'] for up in self.updates))
+        addons = {}
+        for row in self.execute(sql, {'guids': guids}).fetchall():
+            # MySQL compares guids without case.
+            addons[row[3].lower()] = row
+
+        # The cached RDF is checked against these, as in Update.get_addon.
+        keys = dict((update_flush_key(g), g.lower()) for g in guids)
+        flushed = dict((keys[k], v) for k, v in
+                       cache.get_many(keys.keys()).items())
+
+        for up in self.updates:
+            up.cursor = self.cursor
+            up.flushed = flushed.get(up.data['id'].lower(), 0)
+            up.addon = addons.get(up.data['id'].lower(), False)
+            if up.is_valid():
+                self.valid.append(up)
+        if not self.valid:
+            return
+
+        candidates = dict((up.data['id'], []) for up in self.valid)
+        for row in self.get_candidates(candidates.keys()):
+            candidates[row[0]].append(row[1:])
+        for up in self.valid:
+            up.candidates = candidates[up.data['id']]
+            up.get_update()
+
+    def get_candidates(self, ids):
+        """
+        update_candidates shaped rows, prefixed with the addon id, for every
+        file of `ids` that could suit the app version.
+        """
+        data = self.valid[0].data
+        params = {'ids': tuple(ids), 'app_id': data['app_id'],
+                  'version_int': data['version_int']}
+        if self.engine == 'index':
+            sql = """
+                SELECT addon_id, min_int, max_int, version_id, platform_id,
+                    file_status, version, min, max, file_id, hash, filename,
+                    datestatuschanged, releasenotes
+                FROM update_candidates
+                WHERE addon_id IN %(ids)s AND application_id = %(app_id)s
+                    AND min_int <= %(version_int)s
+                    AND max_int >= %(version_int)s
+                ORDER BY min_int;"""
+        else:
+            sql = """
+                SELECT versions.addon_id, appmin.version_int,
+                    appmax.version_int, versions.id, files.platform_id,
+                    files.status, versions.version, appmin.version,
+                    appmax.version, files.id, files.hash, files.filename,
+                    files.datestatuschanged, versions.releasenotes
+                FROM versions
+                INNER JOIN applications_versions
+                    ON applications_versions.version_id = versions.id
+                    AND applications_versions.application_id = %(app_id)s
+                INNER JOIN appversions appmin
+                    ON appmin.id = applications_versions.min
+                INNER JOIN appversions appmax
+                    ON appmax.id = applications_versions.max
+                INNER JOIN files
+                    ON files.version_id = versions.id
+                WHERE versions.addon_id IN %(ids)s
+                    AND appmin.version_int <= %(version_int)s
+                    AND appmax.version_int >= %(version_int)s
+                ORDER BY appmin.version_int;"""
+        return self.execute(sql, params).fetchall()
+
+    def close(self):
+        if self.cursor:
+            self.cursor.close()
+        if self.conn:
+            self.conn.close()
+
+    def get_rdf(self):
+        """Yield one RDF document covering all the add-ons."""
+        yield rdf_header
+        for up in self.valid:
+            if up.data['row']:
+                yield up.get_good_body()
+            else:
+                yield up.get_no_updates_body()
+        yield rdf_footer
+
+    def get_json(self):
+        """Yield a JSON list with an entry for every requested add-on."""
+        valid = set(self.valid)
+        yield '['
+        for idx, up in enumerate(self.updates):
+            if up in valid:
+                item = {'guid': up.data['guid'], 'update': up.get_json()}
+            else:
+                item = {'guid': up.data['id'], 'update': None}
+            yield (idx and ', ' or '') + json.dumps(item)
+        yield ']'
+
+    def get_headers(self, content_type):
+        return [('Content-Type', content_type),
                 ('Cache-Control', 'public, max-age=3600'),
-                ('Last-Modified', self.format_date(0)),
-                ('Expires', self.format_date(3600)),
-                ('Content-Length', str(length))]
+                ('Last-Modified', format_date(0)),
+                ('Expires', format_date(3600))]
+
+
+_dates = {}
+
+
+def format_date(secs):
+    """The date `secs` from now, worked out at most once a second."""
+    now = int(time())
+    if _dates.get('now') != now:
+        _dates.clear()
+        _dates['now'] = now
+    if secs not in _dates:
+        _dates[secs] = '%s GMT' % formatdate(now + secs)[:25]
+    return _dates[secs]
 
 
 def mail_exception(data):
@@ -307,16 +654,80 @@ def application(environ, start_response):
     timing = (environ['REQUEST_METHOD'], '%s?%s' %
               (environ['SCRIPT_NAME'], environ['QUERY_STRING']))
     data = dict(parse_qsl(environ['QUERY_STRING']))
+    # Send some of the pings to update_candidates so we can compare them.
+    if random() * 100 < settings.UPDATE_INDEX_RATE:
+        engine = 'index'
+    else:
+        engine = 'sql'
     try:
-        update = Update(data)
+        update = Update(data, engine=engine)
         output = update.get_rdf()
-        start_response(status, update.get_headers(len(output)))
+        headers = update.get_headers(len(output))
+        if update.is_not_modified(environ):
+            status, output = '304 Not Modified', ''
+            headers = [h for h in headers
+                       if h[0] not in ('Content-Type', 'Content-Length')]
+        start_response(status, headers)
     except:
         timing_log.info('%s "%s" (500) %.2f [ANON]' %
                         (timing[0], timing[1], time() - start))
         #mail_exception(data)
         log_exception(data)
         raise
+    timing_log.info('%s "%s" (%s) %.2f [ANON]' %
+                    (timing[0], timing[1], status[:3], time() - start))
+    timing_log.debug('update engine: %s %.2f' % (engine, time() - start))
+    timing_log.debug('update cache: %(hits)s hits, %(misses)s misses, '
+                     '%(size)s entries' % update_cache.stats())
+    return [output]
+
+
+def bulk_application(environ, start_response):
+    """
+    Check updates for many add-ons in one request. The query, or a POST
+    body, is the usual update query with repeated `id` and `version`
+    fields, one pair per add-on. Add `format=json` for JSON instead of RDF.
+    """
+    start = time()
+    timing = (environ['REQUEST_METHOD'], '%s?%s' %
+              (environ['SCRIPT_NAME'], environ['QUERY_STRING']))
+    query = environ['QUERY_STRING']
+    if environ['REQUEST_METHOD'] == 'POST':
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        query = environ['wsgi.input'].read(length)
+
+    data, ids, versions = {}, [], []
+    for k, v in parse_qsl(query):
+        if k == 'id':
+            ids.append(v)
+        elif k == 'version':
+            versions.append(v)
+        else:
+            data[k] = v
+
+    if not ids or len(ids) != len(versions) or (
+            len(ids) > settings.UPDATE_BULK_LIMIT):
+        start_response('400 Bad Request', [('Content-Type', 'text/xml')])
+        return [bad_rdf]
+
+    engine = 'index' if random() * 100 < settings.UPDATE_INDEX_RATE else 'sql'
+    bulk = BulkUpdate(data, zip(ids, versions), engine=engine)
+    try:
+        bulk.resolve()
+    except:
+        timing_log.info('%s "%s" (500) %.2f [ANON]' %
+                        (timing[0], timing[1], time() - start))
+        log_exception(data)
+        raise
+    finally:
+        bulk.close()
+
     timing_log.info('%s "%s" (200) %.2f [ANON]' %
                     (timing[0], timing[1], time() - start))
-    return [output]
+    timing_log.debug('bulk update: %s add-ons, engine %s' %
+                     (len(ids), engine))
+    if data.get('format') == 'json':
+        start_response('200 OK', bulk.get_headers('application/json'))
+        return bulk.get_json()
+    start_response('200 OK', bulk.get_headers('text/xml'))
+    return bulk.get_rdf()
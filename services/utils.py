@@ -1,7 +1,10 @@
+from collections import deque
 from datetime import datetime, timedelta
+import hashlib
 import settings_local as settings
 import posixpath
 import re
+from time import time
 
 # Ugh. But this avoids any zamboni or django imports at all.
 # Perhaps we can import these without any problems and we can
@@ -13,7 +16,7 @@ from constants.base import (STATUS_NULL, STATUS_UNREVIEWED, STATUS_PENDING,
                             STATUS_NOMINATED, STATUS_PUBLIC, STATUS_DISABLED,
                             STATUS_LISTED, STATUS_BETA, STATUS_LITE,
                             STATUS_LITE_AND_NOMINATED, STATUS_PURGATORY,
-                            VERSION_BETA)
+                            VERSION_BETA, UPDATE_FLUSH_KEY)
 
 APP_GUIDS = dict([(app.guid, app.id) for app in APPS_ALL.values()])
 PLATFORMS = dict([(plat.api_name, plat.id) for plat in PLATFORMS.values()])
@@ -62,3 +65,49 @@ def get_mirror(status, id, row):
         host = settings.LOCAL_MIRROR_URL
 
     return posixpath.join(host, str(id), row['filename'])
+
+
+def update_flush_key(guid):
+    # MySQL matches guids without case, so the key can't depend on it.
+    return UPDATE_FLUSH_KEY % hashlib.md5(guid.lower()).hexdigest()
+
+
+class UpdateCache(object):
+    """
+    A per-process cache of update lookups.
+
+    Entries live for `timeout` seconds and once there are more than `size`
+    of them the oldest are dropped. An entry stored before `since` is
+    treated as a miss, that's how invalidation from zamboni gets through.
+    """
+
+    def __init__(self, size, timeout):
+        self.size, self.timeout = size, timeout
+        self.clear()
+
+    def clear(self):
+        self.entries, self.order = {}, deque()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key, since=0):
+        entry = self.entries.get(key)
+        if entry:
+            created, value = entry
+            if created > max(since, time() - self.timeout):
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if not self.size:
+            return
+        if key not in self.entries:
+            self.order.append(key)
+        self.entries[key] = (time(), value)
+        while len(self.entries) > self.size:
+            self.entries.pop(self.order.popleft(), None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.entries)}
@@ -246,6 +246,7 @@ def JINJA_CONFIG():
 MIDDLEWARE_CLASSES = (
     # AMO URL middleware comes first so everyone else sees nice URLs.
     'amo.middleware.TimingMiddleware',
+    'amo.middleware.ActivityLogMiddleware',
     'commonware.response.middleware.GraphiteRequestTimingMiddleware',
     'amo.middleware.GraphiteMiddleware',
     'amo.middleware.LocaleAndAppURLMiddleware',
@@ -661,6 +662,18 @@ TEST_SPHINX_CATALOG_PATH = TMP_PATH + '/test/data/sphinx'
 TEST_SPHINX_LOG_PATH = TMP_PATH + '/test/log/searchd'
 
 SPHINX_TIMEOUT = 1
+# Keep a connection to searchd open in each thread instead of connecting for
+# every search.
+SPHINX_PERSISTENT = True
+
+# Seconds to cache the add-on ids and meta data of a search, and to wait for
+# an identical search that's already running.
+SEARCH_CACHE_TIMEOUT = 60
+SEARCH_LOCK_TIMEOUT = 2
+
+# Seconds to keep an add-on's JSON for the API and discovery pane. Saving the
+# add-on or its versions, files, previews or authors drops it sooner.
+API_ADDON_CACHE_TIMEOUT = 60 * 60
 
 JAVA_BIN = '/usr/bin/java'
 
@@ -670,6 +683,20 @@ MIRROR_URL = 'http://releases.mozilla.org/pub/mozilla.org/addons'
 LOCAL_MIRROR_URL = 'https://static.addons.mozilla.net/_files'
 PRIVATE_MIRROR_URL = '/_privatefiles'
 
+# The update service keeps a per-process cache of its lookups. This is the
+# maximum number of entries and how many seconds they live for. Set the size
+# to 0 to disable it.
+UPDATE_CACHE_SIZE = 10000
+UPDATE_CACHE_TIMEOUT = 60
+# Percentage of update pings answered from the update_candidates table
+# rather than the live tables.
+UPDATE_INDEX_RATE = 0
+# Seconds to wait before rebuilding an add-on's update_candidates after a
+# change, so the rebuild reads committed rows.
+UPDATE_CANDIDATES_DELAY = 10
+# Most add-ons a single bulk update check can ask about.
+UPDATE_BULK_LIMIT = 200
+
 # File paths
 ADDON_ICONS_PATH = UPLOADS_PATH + '/addon_icons'
 COLLECTIONS_ICON_PATH = UPLOADS_PATH + '/collection_icons'
@@ -910,6 +937,10 @@ RECAPTCHA_URL = ('https://www.google.com/recaptcha/api/challenge?k=%s' %
 # Send Django signals asynchronously on a background thread.
 ASYNC_SIGNALS = True
 
+# amo.log() entries are written at the end of the request or task.  Set this
+# to hand them to celery instead.
+ACTIVITY_LOG_ASYNC = False
+
 # Performance notes on add-ons
 PERFORMANCE_NOTES = False
 
@@ -950,6 +981,24 @@ DEFAULT_SUGGESTED_CONTRIBUTION = 5
 # Path to `ps`.
 PS_BIN = '/bin/ps'
 
+# Number of translation ids kept per locale while rendering a request.
+TRANSLATIONS_CACHE_SIZE = 5000
+
+# Number of processes and add-ons per batch for the recs cron.
+RECS_PROCESSES = 4
+RECS_CHUNK_SIZE = 500
+# Where the recs cron saves the recommendations.  The web heads copy it to
+# RECS_INDEX_LOCAL_PATH to mmap it, and look for a new one every
+# RECS_INDEX_INTERVAL seconds.
+RECS_INDEX_PATH = NETAPP_STORAGE + '/recs.idx'
+RECS_INDEX_LOCAL_PATH = TMP_PATH + '/recs.idx'
+RECS_INDEX_INTERVAL = 60
+
+# Number of processes for the resume_validation_jobs cron, and how many
+# seconds a bulk validation result can wait before the cron picks it up.
+BULK_VALIDATION_PROCESSES = 4
+BULK_VALIDATION_STALE = 60 * 60 * 6
+
 BLOCKLIST_COOKIE = 'BLOCKLIST_v1'
 
 # Responsys id used for newsletter subscribing
@@ -35,3 +35,6 @@ UPLOADS_PATH = _polite_tmpdir()
 MIRROR_STAGE_PATH = _polite_tmpdir()
 TMP_PATH = _polite_tmpdir()
 COLLECTIONS_ICON_PATH = _polite_tmpdir()
+RECS_INDEX_PATH = _polite_tmpdir() + '/recs.idx'
+RECS_INDEX_LOCAL_PATH = _polite_tmpdir() + '/recs.idx'
+RECS_INDEX_INTERVAL = 0